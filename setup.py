@@ -104,6 +104,7 @@ setup(
     entry_points={
         "console_scripts": [
             "space-stream = spacestream.__main__:main",
+            "space-stream-benchmark = spacestream.benchmark.__main__:main",
         ],
     },
     url="https://github.com/cansik/space-stream",
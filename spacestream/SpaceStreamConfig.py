@@ -3,9 +3,14 @@ from duit.arguments.Argument import Argument
 from duit.model.DataField import DataField
 from duit.settings.Setting import Setting
 from duit.ui.ContainerHelper import ContainerHelper
+from duit_osc.OscDirection import OscDirection
 from duit_osc.OscEndpoint import OscEndpoint
 
 from spacestream.codec.DepthCodecType import DepthCodecType
+from spacestream.io.NDIDepthFormat import NDIDepthFormat
+from spacestream.io.RawDepthCompression import RawDepthCompression
+from spacestream.io.RecordingFormat import RecordingFormat
+from spacestream.pipeline.DropPolicy import DropPolicy
 
 
 class SpaceStreamConfig:
@@ -16,9 +21,39 @@ class SpaceStreamConfig:
         with container.section("Pipeline"):
             self.pipeline_fps = DataField("-") | dui.Text("Pipeline FPS", readonly=True) | Setting(exposed=False)
             self.encoding_time = DataField("-") | dui.Text("Encoding Time", readonly=True) | Setting(exposed=False)
+            self.buffer_pool_usage = DataField("-") | dui.Text("Buffer Pool", readonly=True) | Setting(exposed=False)
+            self.config_updates = DataField("-") | dui.Text("Setting Changes", readonly=True, tooltip="Applied / folded into a newer change") | Setting(exposed=False)
             self.disable_preview = DataField(False) | dui.Boolean("Disable Preview")
             self.record = DataField(False) | dui.Boolean("Record") | Argument(help="Record output into recordings folder.") | OscEndpoint()
 
+        with container.section("Recording"):
+            self.record_format = DataField(RecordingFormat.Video) | dui.Enum("Format", tooltip="Raw records lossless depth and color frames") | Argument(help="Recording format (video: encoded rgb-d mp4, raw: lossless depth and color frames).")
+            self.record_compression = DataField(RawDepthCompression.RVL) | dui.Enum("Raw Depth Compression") | Argument(help="Lossless compression of the depth frames in raw recordings.")
+            self.record_queue_size = DataField(30) | dui.Number("Queue Size") | Argument(help="Number of frames which can be queued for the recording writer.")
+            self.record_drop_policy = DataField(DropPolicy.DropNewest) | dui.Enum("Drop Policy", tooltip="Block lets the live output wait for the disk") | Argument(help="What happens if the recording writer is too slow (block, drop oldest or newest frame).")
+            self.record_stats = DataField("-") | dui.Text("Frames", readonly=True) | Setting(exposed=False)
+
+        with container.section("Pipelined Mode"):
+            self.pipelined = DataField(False) | dui.Boolean("Enabled", tooltip="Run encoding and output on separate workers") | Argument(help="Run encoding and output (recording, preview, sending) on separate worker threads.")
+            self.pipeline_queue_size = DataField(2) | dui.Number("Queue Size") | Argument(help="Number of frames which can be queued between pipeline stages.")
+            self.pipeline_drop_policy = DataField(DropPolicy.DropOldest) | dui.Enum("Drop Policy") | Argument(help="What happens if a pipeline stage is too slow (block, drop oldest or newest frame).")
+            self.pipeline_stages = DataField("-") | dui.Text("Stage Times", readonly=True) | Setting(exposed=False)
+            self.pipeline_latency = DataField("-") | dui.Text("Latency", readonly=True) | Setting(exposed=False)
+
+        with container.section("Tracing"):
+            self.trace_file = DataField("") | Argument(help="Write the stage times of every frame into a trace file (.csv or .jsonl).") | Setting(exposed=False)
+            self.trace_capture = DataField("-") | dui.Text("Capture", readonly=True, tooltip="p50 / p95 / p99") | Setting(exposed=False) | OscEndpoint(direction=OscDirection.Send)
+            self.trace_masking = DataField("-") | dui.Text("Masking", readonly=True, tooltip="p50 / p95 / p99") | Setting(exposed=False) | OscEndpoint(direction=OscDirection.Send)
+            self.trace_registration = DataField("-") | dui.Text("Registration", readonly=True, tooltip="p50 / p95 / p99") | Setting(exposed=False) | OscEndpoint(direction=OscDirection.Send)
+            self.trace_rectification = DataField("-") | dui.Text("Rectification", readonly=True, tooltip="p50 / p95 / p99") | Setting(exposed=False) | OscEndpoint(direction=OscDirection.Send)
+            self.trace_encode = DataField("-") | dui.Text("Encode", readonly=True, tooltip="p50 / p95 / p99") | Setting(exposed=False) | OscEndpoint(direction=OscDirection.Send)
+            self.trace_filter = DataField("-") | dui.Text("Median / Resize", readonly=True, tooltip="p50 / p95 / p99") | Setting(exposed=False) | OscEndpoint(direction=OscDirection.Send)
+            self.trace_compose = DataField("-") | dui.Text("Compose", readonly=True, tooltip="p50 / p95 / p99") | Setting(exposed=False) | OscEndpoint(direction=OscDirection.Send)
+            self.trace_send = DataField("-") | dui.Text("Send", readonly=True, tooltip="p50 / p95 / p99") | Setting(exposed=False) | OscEndpoint(direction=OscDirection.Send)
+            self.trace_record = DataField("-") | dui.Text("Record", readonly=True, tooltip="p50 / p95 / p99") | Setting(exposed=False) | OscEndpoint(direction=OscDirection.Send)
+            self.trace_preview = DataField("-") | dui.Text("Preview", readonly=True, tooltip="p50 / p95 / p99") | Setting(exposed=False) | OscEndpoint(direction=OscDirection.Send)
+            self.trace_latency = DataField("-") | dui.Text("Latency", readonly=True, tooltip="p50 / p95 / p99") | Setting(exposed=False) | OscEndpoint(direction=OscDirection.Send)
+
         with container.section("View Parameter"):
             self.display_vertical_stack = DataField(True) | dui.Boolean("Display Vertical Stack") | Argument(help="Preview images vertically.")
             self.display_depth_map = DataField(False) | dui.Boolean("Display Depth Map")
@@ -35,6 +70,7 @@ class SpaceStreamConfig:
             self.min_distance = DataField(0.0) | dui.Number("Min Distance") | Argument(help="Min distance to perceive by the camera.") | OscEndpoint()
             self.max_distance = DataField(6.0) | dui.Number("Max Distance") | Argument(help="Max distance to perceive by the camera.") | OscEndpoint()
             self.depth_rectification = DataField(False) | dui.Boolean("Depth Rectification", tooltip="Undistort depth image") | Argument(help="Undistort depth image") | OscEndpoint()
+            self.fused_encoding = DataField(False) | dui.Boolean("Fused Encoding", tooltip="Filter, resize, mask and encode depth in one pass") | Argument(help="Filter, resize, mask and encode raw depth in one pass.") | OscEndpoint()
 
         with container.section("Camera"):
             self.cam_auto_exposure = DataField(True) | dui.Boolean("Auto Exposure") | OscEndpoint()
@@ -45,6 +81,13 @@ class SpaceStreamConfig:
 
         with container.section("Masking"):
             self.masking = DataField(False) | dui.Boolean("Enabled") | OscEndpoint()
+            self.async_masking = DataField(False) | dui.Boolean("Asynchronous", tooltip="Segment on a separate worker and apply the latest mask") | Argument(help="Run the segmentation on a separate worker at its own rate and apply the latest mask.") | OscEndpoint()
+            self.mask_cadence = DataField(1) | dui.Number("Cadence", tooltip="Segment every nth frame") | Argument(help="Segment every nth frame, the frames in between reuse the latest mask.") | OscEndpoint()
+            self.mask_inference_size = DataField(0) | dui.Number("Inference Size", tooltip="Longest side in pixels (0: frame size)") | Argument(help="Longest side of the segmented image in pixels (0: frame size).")
+            self.mask_max_age = DataField(500) | dui.Number("Max Age (ms)", tooltip="Older masks are not applied") | Argument(help="Max age of the applied mask in ms, older masks are not applied.") | OscEndpoint()
+            self.mask_warp = DataField(False) | dui.Boolean("Warp Mask", tooltip="Warp the mask to the current frame (optical flow)") | Argument(help="Warp the latest mask to the current frame with the optical flow.") | OscEndpoint()
+            self.mask_stats = DataField("-") | dui.Text("Mask", readonly=True) | Setting(exposed=False)
 
         with container.section("Frame Buffer Sharing"):
             self.stream_name = DataField("stream") | dui.Text("Stream Name") | Argument(help="Spout / Syphon / NDI stream name.") | OscEndpoint()
+            self.ndi_format = DataField(NDIDepthFormat.BGRA) | dui.Enum("NDI Format", tooltip="UYVY / P216 send depth in the luma plane") | Argument(help="NDI frame format, UYVY (8-bit) and P216 (16-bit) send the raw depth in the luma plane.") | OscEndpoint()
@@ -2,6 +2,7 @@ import argparse
 import json
 import logging
 import threading
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Callable, Optional, List
@@ -10,17 +11,48 @@ import cv2
 import numpy as np
 import pyrealsense2 as rs
 from cyndilib import FourCC
-from duit.utils.name_reference import create_name_reference
 from visiongraph import vg
 from visiongraph_ndi.NDIVideoOutput import NDIVideoOutput
 
 from spacestream.SpaceStreamConfig import SpaceStreamConfig
+from spacestream.WatchDog import WatchDog
 from spacestream.codec.DepthCodec import DepthCodec
+from spacestream.codec.FusedDepthEncoder import FusedDepthEncoder
 from spacestream.codec.InverseHueColorization import InverseHueColorization
 from spacestream.codec.RealSenseColorizer import RealSenseColorizer
+from spacestream.io.AsyncRecorder import AsyncRecorder
 from spacestream.io.EnhancedJSONEncoder import EnhancedJSONEncoder
+from spacestream.io.Metric import Metric
+from spacestream.io.MetricsExporter import MetricsExporter
+from spacestream.io.NDIDepthFormat import NDIDepthFormat
+from spacestream.io.NDIDepthOutput import NDIDepthOutput
+from spacestream.io.RGBDFrameComposer import RGBDFrameComposer
+from spacestream.io.RawRecordingWriter import RawRecordingWriter
+from spacestream.io.RecordingFormat import RecordingFormat
 from spacestream.io.StreamInformation import StreamInformation, StreamSize, Vector2, RangeValue
-from spacestream.nodes.ImageRectificationNode import ImageRectificationNode
+from spacestream.io.YUVDepthPacker import YUVDepthPacker
+from spacestream.nodes.DepthRegistrationMode import DepthRegistrationMode
+from spacestream.nodes.DepthRegistrationNode import DepthRegistrationNode
+from spacestream.nodes.ImageRectificationNode import ImageRectificationNode, ROI
+from spacestream.nodes.RecordingPlaybackInput import RecordingPlaybackInput
+from spacestream.pipeline.BufferPool import BufferPool
+from spacestream.pipeline.ConfigChangeCoalescer import ConfigChangeCoalescer
+from spacestream.pipeline.FramePacket import FramePacket, PackedFrame
+from spacestream.pipeline.FramePipeline import FramePipeline
+from spacestream.pipeline.FramePlan import FramePlan
+from spacestream.pipeline.SegmentationMask import SegmentationMask
+from spacestream.pipeline.SegmentationWorker import SegmentationWorker
+from spacestream.pipeline.StageTracer import StageTracer
+
+# traced stages of a frame, latency is the time from capture until the frame has been handed to the output
+TRACE_STAGES = ["capture", "masking", "registration", "rectification", "encode", "filter", "compose",
+                "send", "record", "preview", "latency"]
+
+# minimal interval between two writes of a camera setting (seconds)
+CAMERA_SETTINGS_DEBOUNCE = 0.1
+
+# minimal interval between updates of the traced percentiles in the settings (seconds)
+TRACE_UPDATE_INTERVAL = 1.0
 
 
 def linear_interpolate(x):
@@ -54,11 +86,19 @@ class SpaceStreamGraph(vg.VisionGraph):
         self.fbs_client: Optional[vg.FrameBufferSharingServer] = None
         self._create_fbs_client(config.stream_name.value)
 
+        # frame buffers shared by the rectifier, the codecs and the composer
+        self.buffer_pool = BufferPool()
+
         self.rectifier: Optional[ImageRectificationNode] = None
+        self.rectification_roi: Optional[ROI] = None
         if isinstance(self.input, vg.BaseCamera):
-            self.rectifier = ImageRectificationNode(self.input)
+            self.rectifier = ImageRectificationNode(self.input, buffer_pool=self.buffer_pool)
             self.add_nodes(self.rectifier)
 
+        # depth to color registration of the graph instead of the camera sdk (lookup mode)
+        self.registration_mode = DepthRegistrationMode.SDK
+        self.registration: Optional[DepthRegistrationNode] = None
+
         def on_stream_name_changed(new_stream_name: str):
             if self.fbs_client is None:
                 return
@@ -84,24 +124,66 @@ class SpaceStreamGraph(vg.VisionGraph):
             self._intrinsic_update_requested = True
 
         self.config.normalize_intrinsics.on_changed += _request_intrinsics_update
+
+        # changes of the settings (ui, osc) are applied by the graph at the frame boundary
+        self.config_changes = ConfigChangeCoalescer()
+
         self.depth_codec: DepthCodec = self.config.codec.value.value()
+        self.depth_codec.buffer_pool = self.buffer_pool
 
         def codec_changed(c):
-            self.depth_codec = c.value()
+            # compile the new codec before it is used by the pipeline
+            depth_codec = c.value()
+            depth_codec.warmup()
+            depth_codec.buffer_pool = self.buffer_pool
+            self._warmup_fused_encoder(depth_codec)
+            self.depth_codec = depth_codec
+
+        self.config_changes.subscribe(self.config.codec, codec_changed)
+
+        # settings are evaluated once per change (frame plan), not for every frame
+        self.frame_plan: Optional[FramePlan] = None
+        self._frame_plan_outdated = True
+
+        def _invalidate_frame_plan(*_):
+            self._frame_plan_outdated = True
+
+        for plan_field in [self.config.codec, self.config.min_distance, self.config.max_distance,
+                           self.config.masking, self.config.async_masking, self.config.mask_cadence,
+                           self.config.mask_inference_size, self.config.mask_max_age, self.config.mask_warp,
+                           self.config.depth_rectification, self.config.fused_encoding,
+                           self.config.ndi_format, self.config.disable_preview, self.config.record,
+                           self.config.record_format, self.config.stream_name, self.config.pipelined]:
+            self.config_changes.subscribe(plan_field, _invalidate_frame_plan)
+
+        self.fused_encoder = FusedDepthEncoder()
 
-        self.config.codec.on_changed += codec_changed
+        # depth in the luma plane for ndi
+        self.yuv_packer = YUVDepthPacker()
 
-        self.recorder: Optional[vg.VidGearVideoRecorder] = None
+        # preallocated rgb-d output frames
+        self.composer = RGBDFrameComposer(self.buffer_pool)
+
+        # stage workers if pipelined mode is enabled
+        self.pipeline: Optional[FramePipeline] = None
+
+        self.recorder: Optional[AsyncRecorder] = None
+
+        # stopped recorders which are still writing their queued frames (joined on release)
+        self._closing_recorders: List[AsyncRecorder] = []
+        self._raw_recording_warned = False
         self.crf: int = 23
 
         self.show_preview = True
         self.segmentation_network: Optional[vg.InstanceSegmentationEstimator] = None
+        self.segmentation_worker: Optional[SegmentationWorker] = None
 
         if segnet is not None:
             self.segmentation_network = segnet
             if isinstance(self.segmentation_network, vg.MediaPipePoseEstimator):
                 self.segmentation_network.enable_segmentation = True
             self.add_nodes(self.segmentation_network)
+            self.segmentation_worker = SegmentationWorker(self.segmentation_network)
 
         # todo: enable midas again - currently it is disabled
         self.use_midas = False
@@ -113,10 +195,22 @@ class SpaceStreamGraph(vg.VisionGraph):
             self.add_nodes(self.midas_net)
 
         # events
-        self.on_frame_ready: Optional[Callable[[np.ndarray], None]] = None
+        # rgb-d frame and packed ndi frame (if any), pooled buffers have to be retained by the receiver
+        self.on_frame_ready: Optional[Callable[[np.ndarray, Optional[PackedFrame]], None]] = None
 
         # time
         self.encoding_watch = vg.ProfileWatch()
+        self.tracer = StageTracer(TRACE_STAGES)
+        self._trace_update_time = 0.0
+
+        # metrics for monitoring (prometheus / osc telemetry), configured by the arguments
+        self.frame_count = 0
+        self.watch_dog = WatchDog()
+        self.metrics_exporter: Optional[MetricsExporter] = None
+        self.metrics_port: Optional[int] = None
+        self.telemetry_host = "127.0.0.1"
+        self.telemetry_port: Optional[int] = None
+        self.metrics_interval = 1.0
 
         self.add_nodes(self.fbs_client)
 
@@ -170,6 +264,15 @@ class SpaceStreamGraph(vg.VisionGraph):
     def _init(self):
         super()._init()
 
+        watch = vg.ProfileWatch()
+        watch.start()
+        self.depth_codec.warmup()
+        self._warmup_fused_encoder(self.depth_codec)
+        if isinstance(self.fbs_client, NDIDepthOutput):
+            self.yuv_packer.warmup()
+        watch.stop()
+        logging.info(f"Codec kernels are ready ({watch.elapsed()} ms)")
+
         if threading.current_thread() is threading.main_thread():
             self.fbs_client.setup()
 
@@ -191,146 +294,651 @@ class SpaceStreamGraph(vg.VisionGraph):
             mat = calibration.get_camera_matrix(CalibrationType.DEPTH)
             print(mat)
 
+            if self.registration_mode == DepthRegistrationMode.Lookup:
+                self.registration = DepthRegistrationNode.from_azure_kinect(self.input, self.depth_units,
+                                                                            self.buffer_pool)
+                self.registration.warmup()
+                logging.info(f"Depth is registered to the color image by lookup (splat {self.registration.splat})")
+        elif self.registration_mode == DepthRegistrationMode.Lookup:
+            logging.warning("Depth registration by lookup is only supported for the Azure Kinect")
+
         if isinstance(self.input, vg.BaseCamera):
             self._apply_camera_settings(self.input)
 
+        if self.config.trace_file.value:
+            self.tracer.open(self.config.trace_file.value)
+            logging.info(f"Writing stage trace to {self.config.trace_file.value}")
+
+        if self.metrics_port is not None or self.telemetry_port is not None:
+            self.metrics_exporter = MetricsExporter(self._collect_metrics, interval=self.metrics_interval,
+                                                    http_port=self.metrics_port,
+                                                    osc_host=self.telemetry_host, osc_port=self.telemetry_port)
+            self.metrics_exporter.start()
+
     def _process(self):
+        self._apply_config_changes()
+        self._update_pipeline()
+
+        packet = self._capture_frame()
+
+        if self.pipeline is None:
+            if packet is not None:
+                self._output_frame(self._encode_frame(packet))
+                self._release_packet(packet)
+            return
+
+        if packet is not None:
+            self.pipeline.submit(packet)
+
+        # frame buffer sharing stays on the graph thread
+        output = self.pipeline.latest_output()
+        if output is not None:
+            start = time.perf_counter()
+            self.send_output(output.rgbd, packed_frame=output.packed_frame)
+            end = output.stamp("send", start)
+            output.trace["latency"] = (end - output.timestamp) * 1000
+            output.completed = True
+            self.watch_dog.reset()
+            self.pipeline.send_statistics.add((end - start) * 1000, (end - output.timestamp) * 1000)
+            self._release_packet(output)
+
+        self._update_pipeline_statistics()
+
+    def _apply_config_changes(self):
+        if self.config_changes.apply() > 0:
+            self.config.config_updates.value = str(self.config_changes)
+
+    def _capture_frame(self) -> Optional[FramePacket]:
+        start = time.perf_counter()
         ts, frame = self.input.read()
 
         if frame is None:
-            return
+            return None
 
-        # start recording
-        if self.config.record.value and self.recorder is None:
-            time_str = datetime.now().strftime("%y-%m-%d-%H-%M-%S")
-            output_file_path = f"recordings/{self.config.stream_name.value}-{time_str}.mp4"
-            self.recorder = vg.VidGearVideoRecorder(output_file_path, fps=self.input.fps)
-            self.recorder.output_params.update({
-                "-crf": self.crf,
-                "-input_framerate": round(self.fps_tracer.smooth_fps)
-            })
-            self.recorder.open()
+        packet = FramePacket(time.perf_counter(), ts, frame)
+        packet.trace["capture"] = (packet.timestamp - start) * 1000
 
-            # write recording parameters
-            with open(Path(output_file_path).with_suffix(".json"), "w") as f:
-                json.dump(self.stream_information, f, cls=EnhancedJSONEncoder, indent=4)
-        elif not self.config.record.value and self.recorder is not None:
-            self.recorder.close()
-            self.recorder = None
+        plan = self.frame_plan
+        h, w = frame.shape[:2]
+        if self._frame_plan_outdated or plan is None or plan.resolution != (w, h):
+            plan = self._compile_frame_plan(frame)
 
-        segmentations: Optional[List[vg.InstanceSegmentationResult]] = None
-        if self.config.masking.value:
-            segmentations = self.segmentation_network.process(frame)
-            for segment in segmentations:
-                frame = self.mask_image(frame, segment.mask)
+        return plan.run(packet)
 
-        if isinstance(self.input, vg.BaseDepthInput):
-            if isinstance(self.input, vg.RealSenseInput):
-                self.depth_units = self.input.depth_frame.get_units()
+    def _compile_frame_plan(self, frame: np.ndarray) -> FramePlan:
+        """
+        Evaluates the settings and the input once, the resulting plan is used until a setting
+        or the resolution changes.
+        """
+        self._frame_plan_outdated = False
 
-            if self.midas_net is not None:
-                depth_buffer = self.midas_net.process(frame)
-            else:
-                depth_buffer = self.input
+        h, w = frame.shape[:2]
+        plan = FramePlan((w, h), depth_codec=self.depth_codec)
+        plan.masking = self.config.masking.value and self.segmentation_worker is not None
+        plan.record_raw = self.config.record.value and self.config.record_format.value == RecordingFormat.Raw
 
-            depth = depth_buffer.depth_buffer
+        # inputs may reuse their buffers while the encode worker still reads the previous packet
+        if self.config.pipelined.value:
+            plan.copy_depth = True
+            plan.steps.append(self._copy_input_frame)
 
-            if self.use_midas:
-                depth = pow(2, 16) - depth
+        if plan.record_raw:
+            plan.steps.append(self._copy_raw_frame)
 
-            # check pre-conditions (move them to the changing side)
-            if isinstance(self.depth_codec, InverseHueColorization) and self.config.min_distance.value <= 0.0:
-                logging.warning("Inverse Hue Colorization needs min-range to be higher than 0.0")
-                self.config.min_distance.value = 0.1
+        if plan.masking:
+            self._update_segmentation_worker()
+            plan.steps.append(self._mask_frame)
+        elif self.segmentation_worker is not None and self.segmentation_worker.is_running:
+            self.segmentation_worker.stop()
 
-            if self.config.min_distance.value < 0.0:
-                self.config.min_distance.value = 0.0
+        if isinstance(self.input, vg.BaseDepthInput):
+            is_realsense = isinstance(self.input, vg.RealSenseInput)
+
+            if is_realsense:
+                self.depth_units = self.input.depth_frame.get_units()
+            elif isinstance(self.input, RecordingPlaybackInput):
+                self.depth_units = self.input.depth_units
 
-            if self.config.max_distance.value == 0.0:
-                self.config.max_distance.value = 0.1
+            self._validate_distance_range(plan.depth_codec)
 
-            if self.config.min_distance.value >= self.config.max_distance.value:
-                self.config.min_distance.value = self.config.max_distance.value - 0.1
+            plan.depth_units = self.depth_units
+            plan.min_value = round(self.config.min_distance.value / self.depth_units)
+            plan.max_value = round(self.config.max_distance.value / self.depth_units)
+            plan.steps.append(self._read_depth)
+            depth = self.input.depth_buffer
 
-            # read depth map and create rgb-d image
-            min_value = round(self.config.min_distance.value / self.depth_units)
-            max_value = round(self.config.max_distance.value / self.depth_units)
+            if self.registration is not None and not self.use_midas:
+                # registered depth has the size of the color image (new buffer, no copy needed)
+                plan.steps.append(self._register_depth)
+                plan.copy_depth = False
+                depth = np.empty((h, w), dtype=np.uint16)
 
-            if isinstance(self.input, vg.RealSenseInput) and isinstance(self.depth_codec, RealSenseColorizer):
+            # raw recordings store the registered depth, like the sdk alignment
+            if plan.record_raw:
+                plan.steps.append(self._copy_raw_depth)
+
+            if is_realsense and isinstance(plan.depth_codec, RealSenseColorizer):
+                plan.steps.append(self._read_realsense_depth_frame)
                 depth = self.input.depth_frame
 
-            # rectify image if necessary
-            if self.config.depth_rectification.value and self.rectifier is not None:
-                depth = self.rectifier.process(depth)
-                frame = self.rectifier.process(frame)
+            rectify = self.config.depth_rectification.value and self.rectifier is not None
+            if rectify:
+                # depth which has the size of the color image is aligned to it (color intrinsics)
+                aligned = isinstance(depth, np.ndarray) and depth.shape[:2] == (h, w)
+                plan.depth_stream_type = vg.CameraStreamType.Color if aligned else vg.CameraStreamType.Depth
+
+                # undistortion, crop and scaling to the output size are a single remap per image
+                plan.output_size = self.rectifier.roi_size((w, h), self.rectification_roi)
+                plan.steps.append(self._rectify_frame)
+
+            plan.median_filter = is_realsense
+            plan.packed_format = self._packed_output_format(depth, (plan.output_size or (w, h))[0])
+            plan.compose = plan.packed_format is None or self.config.record.value \
+                           or not self.config.disable_preview.value
+
+            if self.config.fused_encoding.value and self.fused_encoder.supports(depth):
+                plan.color_table = plan.depth_codec.color_table(plan.min_value, plan.max_value)
+
+            plan.direct_encode = isinstance(depth, np.ndarray) and not is_realsense \
+                                 and (rectify or depth.shape[:2] == (h, w))
+
+        self.frame_plan = plan
+        logging.debug(f"Frame plan compiled ({w} x {h}, {len(plan.steps)} steps)")
+        return plan
+
+    def _validate_distance_range(self, depth_codec: DepthCodec):
+        if isinstance(depth_codec, InverseHueColorization) and self.config.min_distance.value <= 0.0:
+            logging.warning("Inverse Hue Colorization needs min-range to be higher than 0.0")
+            self.config.min_distance.value = 0.1
+
+        if self.config.min_distance.value < 0.0:
+            self.config.min_distance.value = 0.0
+
+        if self.config.max_distance.value == 0.0:
+            self.config.max_distance.value = 0.1
+
+        if self.config.min_distance.value >= self.config.max_distance.value:
+            self.config.min_distance.value = self.config.max_distance.value - 0.1
+
+    def _copy_input_frame(self, packet: FramePacket):
+        packet.frame = self._copy_to_pool(packet.frame)
+        packet.buffers.append(packet.frame)
+
+    def _copy_raw_frame(self, packet: FramePacket):
+        start = time.perf_counter()
+        packet.raw_frame = self._copy_to_pool(packet.frame)
+        packet.buffers.append(packet.raw_frame)
+        packet.stamp("record", start)
+
+    def _mask_frame(self, packet: FramePacket):
+        start = time.perf_counter()
+        self.segmentation_worker.submit(packet.frame, packet.timestamp)
+        mask = self.segmentation_worker.latest(packet.frame, packet.timestamp)
+
+        if mask is not None:
+            masked = self.buffer_pool.acquire(packet.frame.shape, packet.frame.dtype)
+            cv2.bitwise_and(packet.frame, mask.color_mask, dst=masked)
+            packet.buffers.append(masked)
+            packet.frame = masked
+            packet.mask = mask
+
+        packet.stamp("masking", start)
+        self.config.mask_stats.value = str(self.segmentation_worker)
+
+    def _update_segmentation_worker(self):
+        worker = self.segmentation_worker
+        worker.cadence = max(1, int(self.config.mask_cadence.value))
+        worker.inference_size = max(0, int(self.config.mask_inference_size.value))
+        worker.max_age = float(self.config.mask_max_age.value)
+        worker.warp = self.config.mask_warp.value
+
+        if self.config.async_masking.value and not worker.is_running:
+            worker.start()
+            logging.info("Asynchronous segmentation started")
+        elif not self.config.async_masking.value and worker.is_running:
+            worker.stop()
+            logging.info("Asynchronous segmentation stopped")
+
+    def _read_depth(self, packet: FramePacket):
+        if self.midas_net is not None:
+            depth = self.midas_net.process(packet.frame).depth_buffer
+        else:
+            depth = self.input.depth_buffer
 
-            self.encoding_watch.start()
-            depth_map = self.depth_codec.encode(depth, min_value, max_value)
-            self.encoding_watch.stop()
+        if self.use_midas:
+            depth = pow(2, 16) - depth
+
+        if packet.plan.copy_depth and isinstance(depth, np.ndarray):
+            depth = self._copy_to_pool(depth)
+            packet.buffers.append(depth)
+
+        packet.depth = depth
+        packet.min_value = packet.plan.min_value
+        packet.max_value = packet.plan.max_value
+
+    def _copy_raw_depth(self, packet: FramePacket):
+        start = time.perf_counter()
+        packet.raw_depth = self._copy_to_pool(packet.depth)
+        packet.buffers.append(packet.raw_depth)
+        packet.stamp("record", start)
+
+    def _read_realsense_depth_frame(self, packet: FramePacket):
+        packet.depth = self.input.depth_frame
+
+    def _register_depth(self, packet: FramePacket):
+        start = time.perf_counter()
+        packet.depth = self.registration.process(packet.depth, packet.plan.resolution)
+        packet.buffers.append(packet.depth)
+        packet.stamp("registration", start)
+
+    def _rectify_frame(self, packet: FramePacket):
+        start = time.perf_counter()
+        plan: FramePlan = packet.plan
+        roi = self.rectification_roi
+
+        # nearest neighbour for depth, so invalid pixels do not bleed into valid ones
+        packet.depth = self.rectifier.process(packet.depth, plan.depth_stream_type, plan.output_size, roi,
+                                              interpolation=cv2.INTER_NEAREST)
+        packet.frame = self.rectifier.process(packet.frame, vg.CameraStreamType.Color, plan.output_size, roi)
+        packet.buffers += [packet.depth, packet.frame]
+
+        if packet.mask is not None:
+            mask = self.rectifier.process(packet.mask.mask, vg.CameraStreamType.Color, plan.output_size, roi,
+                                          interpolation=cv2.INTER_NEAREST)
+            packet.mask = SegmentationMask(mask, cv2.merge((mask, mask, mask)))
+            packet.buffers.append(mask)
+
+        packet.stamp("rectification", start)
+
+    def _encode_frame(self, packet: FramePacket) -> FramePacket:
+        if packet.depth is None:
+            # just send rgb image for testing
+            packet.rgbd = packet.frame
+            return packet
 
-            # fix realsense image if it has been aligned to remove lines
-            if isinstance(self.input, vg.RealSenseInput):
-                depth_map = cv2.medianBlur(depth_map, 3)
+        plan: FramePlan = packet.plan
+        depth, frame = packet.depth, packet.frame
+        depth_mask = packet.mask.mask if packet.mask is not None else None
 
-            # resize to match rgb image if necessary
-            if depth_map.shape != frame.shape:
-                h, w = frame.shape[:2]
-                depth_map = cv2.resize(depth_map, (w, h), interpolation=cv2.INTER_AREA)
+        if plan.packed_format is not None:
+            # write depth directly into the luma plane of the ndi frame (no rgb encoding and conversion)
+            h, w = frame.shape[:2]
+            start = time.perf_counter()
+            packed_depth = cv2.medianBlur(depth, 3) if plan.median_filter else depth
+            start = packet.stamp("filter", start)
 
-            if self.config.masking.value:
-                if segmentations is not None:
-                    for segment in segmentations:
-                        depth_map = self.mask_image(depth_map, segment.mask)
+            data = self.buffer_pool.acquire((self.yuv_packer.frame_size(w * 2, h, plan.packed_format),), np.uint8)
+            packet.buffers.append(data)
 
-            rgbd = np.hstack((depth_map, frame))
+            self.encoding_watch.start()
+            self.yuv_packer.pack(packed_depth, frame, packet.min_value, packet.max_value, plan.packed_format,
+                                 depth_mask, out=data)
+            self.encoding_watch.stop()
+            packet.stamp("encode", start)
+
+            packet.packed_frame = (data, w * 2, h, plan.packed_format)
+
+        # the encoded rgb-d frame is only needed for the preview and the recording if the packed frame is sent
+        if plan.compose:
+            h, w = frame.shape[:2]
+            rgbd = self.composer.next_frame(w, h)
+            packet.buffers.append(rgbd)
+            self._encode_depth_map(plan, depth, frame, packet.mask,
+                                   out=self.composer.depth_region(rgbd), packet=packet)
+            start = time.perf_counter()
+            self.composer.compose(rgbd, frame)
+            packet.stamp("compose", start)
+            packet.rgbd = rgbd
         else:
-            # just send rgb image for testing
-            rgbd = frame
+            packet.rgbd = frame
+
+        return packet
+
+    def _output_frame(self, packet: FramePacket) -> Optional[FramePacket]:
+        rgbd = packet.rgbd
 
         if self._intrinsic_update_requested:
-            success = self._update_intrinsics(frame)
+            success = self._update_intrinsics(packet.frame)
             self._intrinsic_update_requested = not success
 
-        if threading.current_thread() is threading.main_thread():
+        self._update_recorder()
+
+        # in pipelined mode the graph thread sends the frame if it is the main thread
+        send_output = self.pipeline is None or not self.pipeline.send_on_caller
+
+        if send_output and threading.current_thread() is threading.main_thread():
             # send rgb-d over spout / syphon or ndi
-            if isinstance(self.fbs_client, NDIVideoOutput):
-                self.fbs_client.send(rgbd)
-            else:
-                bgrd = cv2.cvtColor(rgbd, cv2.COLOR_RGB2BGR)
-                self.fbs_client.send(bgrd)
+            start = time.perf_counter()
+            self.send_output(rgbd, packed_frame=packet.packed_frame)
+            packet.stamp("send", start)
 
         if self.config.record.value and self.recorder is not None:
-            self.recorder.add_image(rgbd)
+            start = time.perf_counter()
+            if isinstance(self.recorder.recorder, RawRecordingWriter):
+                # packets of a plan without raw frames (captured before the format has changed) are skipped
+                if packet.raw_depth is not None:
+                    self.recorder.add_frame(packet.raw_depth, packet.raw_frame, packet.input_timestamp,
+                                            packet.min_value * packet.plan.depth_units,
+                                            packet.max_value * packet.plan.depth_units)
+                elif packet.plan.record_raw and not self._raw_recording_warned:
+                    logging.warning("Raw recording needs a depth input, no frames are recorded")
+                    self._raw_recording_warned = True
+            else:
+                self.recorder.add_image(rgbd)
+            packet.stamp("record", start)
+            self.config.record_stats.value = str(self.recorder)
 
         if not self.config.disable_preview.value and self.on_frame_ready is not None:
-            self.on_frame_ready(rgbd)
+            start = time.perf_counter()
+            self.on_frame_ready(rgbd, packet.packed_frame)
+            packet.stamp("preview", start)
         else:
             if self.on_frame_ready is not None:
-                self.on_frame_ready(rgbd)
+                start = time.perf_counter()
+                self.on_frame_ready(rgbd, packet.packed_frame)
+                packet.stamp("preview", start)
 
-            bgrd = cv2.cvtColor(rgbd, cv2.COLOR_RGB2BGR)
-            self.fbs_client.send(bgrd)
+            if send_output:
+                start = time.perf_counter()
+                self.send_output(rgbd, packed_frame=packet.packed_frame)
+                packet.stamp("send", start)
 
+        if send_output:
+            packet.trace["latency"] = (time.perf_counter() - packet.timestamp) * 1000
+            packet.completed = True
+            self.watch_dog.reset()
+
+        self.frame_count += 1
         self.fps_tracer.update()
         self.config.pipeline_fps.value = f"{self.fps_tracer.fps:.2f}"
 
         self.config.encoding_time.value = f"{self.encoding_watch.average():.2f} ms"
+        self.config.buffer_pool_usage.value = str(self.buffer_pool)
+        self._update_trace_statistics()
+
+        return None if send_output else packet
+
+    def _update_trace_statistics(self):
+        now = time.perf_counter()
+        if now - self._trace_update_time < TRACE_UPDATE_INTERVAL:
+            return
+        self._trace_update_time = now
+
+        for stage in TRACE_STAGES:
+            p50, p95, p99 = self.tracer.percentiles(stage)
+            getattr(self.config, f"trace_{stage}").value = f"{p50:.2f} / {p95:.2f} / {p99:.2f} ms"
+
+    def _collect_metrics(self) -> List[Metric]:
+        """
+        Called by the metrics exporter (own thread) once per interval.
+        """
+        self.watch_dog.update()
+        stream = {"stream": self.config.stream_name.value}
+
+        metrics = [
+            Metric("up", 1, stream, help="Graph is running."),
+            Metric("health_status", self.watch_dog.health.value.value, stream,
+                   help="Output health (0: online, 1: warning, 2: offline)."),
+            Metric("fps", max(0.0, self.fps_tracer.smooth_fps), stream, help="Output frames per second."),
+            Metric("frames_total", self.frame_count, stream, "counter", "Frames which have been output."),
+        ]
+
+        for stage in TRACE_STAGES:
+            labels = {**stream, "stage": stage}
+            description = "Processing time of the pipeline stages in ms (quantiles of the last frames)."
+            for quantile, value in zip(("0.5", "0.95", "0.99"), self.tracer.percentiles(stage)):
+                metrics.append(Metric("stage_time_ms", value, {**labels, "quantile": quantile}, "summary", description))
+
+            total, count = self.tracer.totals(stage)
+            metrics += [
+                Metric("stage_time_ms_sum", total, labels, "summary", description),
+                Metric("stage_time_ms_count", count, labels, "summary", description),
+            ]
+
+        pipeline, recorder = self.pipeline, self.recorder
+        dropped = {"pipeline": pipeline.dropped if pipeline is not None else 0,
+                   "send": pipeline.skipped if pipeline is not None else 0,
+                   "recorder": recorder.dropped if recorder is not None else 0}
+        for queue, value in dropped.items():
+            metrics.append(Metric("dropped_frames", value, {**stream, "queue": queue},
+                                  help="Frames dropped by the queues of the current pipeline and recording "
+                                       "(send: output but not sent, a newer frame was ready)."))
+
+        pool = self.buffer_pool
+        metrics += [
+            Metric("buffer_pool_in_use", pool.in_use, stream, help="Frame buffers in use."),
+            Metric("buffer_pool_free", pool.free, stream, help="Free frame buffers."),
+            Metric("buffer_pool_misses_total", pool.misses, stream, "counter", "Frame buffer allocations."),
+            Metric("codec_info", 1, {**stream, "codec": self.config.codec.value.name,
+                                     "ndi_format": self.config.ndi_format.value.name,
+                                     "fused_encoding": str(self.config.fused_encoding.value).lower(),
+                                     "pipelined": str(self.config.pipelined.value).lower()},
+                   help="Encoding settings."),
+            Metric("min_distance_meters", self.config.min_distance.value, stream, help="Min encoded distance."),
+            Metric("max_distance_meters", self.config.max_distance.value, stream, help="Max encoded distance."),
+            Metric("recording", int(recorder is not None), stream, help="Output is recorded."),
+            Metric("config_changes_total", self.config_changes.applied, {**stream, "state": "applied"},
+                   "counter", "Setting changes which have been applied or folded into a newer change."),
+            Metric("config_changes_total", self.config_changes.folded, {**stream, "state": "folded"},
+                   "counter", "Setting changes which have been applied or folded into a newer change."),
+        ]
+
+        return metrics
+
+    def _release_packet(self, packet: FramePacket):
+        # partial traces of dropped packets would make the percentiles look better than they are
+        if packet.completed:
+            self.tracer.add(packet)
+
+        for buffer in packet.buffers:
+            self.buffer_pool.release(buffer)
+        packet.buffers.clear()
+
+    def _copy_to_pool(self, image: np.ndarray) -> np.ndarray:
+        copy = self.buffer_pool.acquire(image.shape, image.dtype)
+        np.copyto(copy, image)
+        return copy
+
+    def _update_recorder(self):
+        # a new recording is started if the format changes while recording
+        if self.config.record.value and self.recorder is not None:
+            is_raw = isinstance(self.recorder.recorder, RawRecordingWriter)
+            if is_raw != (self.config.record_format.value == RecordingFormat.Raw):
+                logging.info(f"Record format changed to {self.config.record_format.value.name}, "
+                             f"starting a new recording")
+                self._stop_recorder()
+
+        # start recording
+        if self.config.record.value and self.recorder is None:
+            self._raw_recording_warned = False
+            time_str = datetime.now().strftime("%y-%m-%d-%H-%M-%S")
+
+            if self.config.record_format.value == RecordingFormat.Raw:
+                # lossless depth and color frames, the stream information is stored in the recording metadata
+                output_file_path = f"recordings/{self.config.stream_name.value}-{time_str}.rgbd"
+                recorder = RawRecordingWriter(output_file_path,
+                                              compression=self.config.record_compression.value,
+                                              stream_information=self.stream_information,
+                                              depth_units=self.depth_units,
+                                              fps=self.input.fps)
+            else:
+                output_file_path = f"recordings/{self.config.stream_name.value}-{time_str}.mp4"
+                recorder = vg.VidGearVideoRecorder(output_file_path, fps=self.input.fps)
+                recorder.output_params.update({
+                    "-crf": self.crf,
+                    "-input_framerate": round(self.fps_tracer.smooth_fps)
+                })
+
+            # frames are written by a separate thread, the live output never waits for the disk
+            self.recorder = AsyncRecorder(recorder,
+                                          queue_size=max(1, int(self.config.record_queue_size.value)),
+                                          policy=self.config.record_drop_policy.value,
+                                          buffer_pool=self.buffer_pool)
+            self.recorder.open()
+
+            # write recording parameters
+            if isinstance(recorder, vg.VidGearVideoRecorder):
+                with open(Path(output_file_path).with_suffix(".json"), "w") as f:
+                    json.dump(self.stream_information, f, cls=EnhancedJSONEncoder, indent=4)
+        elif not self.config.record.value and self.recorder is not None:
+            self._stop_recorder()
+
+    def _stop_recorder(self):
+        self.recorder.close()
+        self._closing_recorders = [r for r in self._closing_recorders if r.is_writing] + [self.recorder]
+        self.recorder = None
+
+    def _update_pipeline(self):
+        pipelined = self.config.pipelined.value
+        capacity = max(1, int(self.config.pipeline_queue_size.value))
+        policy = self.config.pipeline_drop_policy.value
+
+        if self.pipeline is not None:
+            if pipelined and self.pipeline.capacity == capacity and self.pipeline.policy == policy:
+                return
+
+            self.pipeline.stop()
+            self.pipeline = None
+            self.config.pipeline_stages.value = "-"
+            self.config.pipeline_latency.value = "-"
+            logging.info("Pipelined mode stopped")
+
+        if not pipelined:
+            return
+
+        self.pipeline = FramePipeline(self._encode_frame, self._output_frame, capacity, policy,
+                                      send_on_caller=threading.current_thread() is threading.main_thread(),
+                                      release=self._release_packet)
+        self.pipeline.start()
+        logging.info(f"Pipelined mode started (queue size: {capacity}, policy: {policy.value})")
+
+    def _update_pipeline_statistics(self):
+        stats = self.pipeline.statistics
+        self.config.pipeline_stages.value = " / ".join(str(s) for s in stats)
+        self.config.pipeline_latency.value = f"{stats[-1].latency:.1f} ms " \
+                                             f"(dropped {self.pipeline.dropped}, skipped {self.pipeline.skipped})"
 
     def _release(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
+        if self.segmentation_worker is not None:
+            self.segmentation_worker.stop()
+
         if threading.current_thread() is threading.main_thread():
             self.fbs_client.release()
 
         super()._release()
-        if self.config.record.value and self.recorder is not None:
-            self.recorder.close()
+        self.tracer.close()
 
-    def _setup_camera_settings(self, cam: vg.BaseCamera):
-        cam_ref = create_name_reference(cam)
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = None
+        if self.recorder is not None:
+            self._closing_recorders.append(self.recorder)
+            self.recorder = None
 
-        def _on_auto_exposure_change(on: bool):
-            if self.config.is_loading:
-                return
+        for recorder in self._closing_recorders:
+            recorder.close(wait=True)
+        self._closing_recorders.clear()
+
+    def _encode_depth_map(self, plan: FramePlan, depth, frame: np.ndarray,
+                          mask: Optional[SegmentationMask],
+                          out: Optional[np.ndarray] = None, packet: Optional[FramePacket] = None) -> np.ndarray:
+        start = time.perf_counter()
+
+        if plan.color_table is not None:
+            # median filter, resize, masking and encoding in one pass over the raw depth
+            h, w = frame.shape[:2]
+
+            self.encoding_watch.start()
+            depth_map = self.fused_encoder.encode(depth, plan.color_table, (w, h),
+                                                  mask.mask if mask is not None else None,
+                                                  median_filter=plan.median_filter, out=out)
+            self.encoding_watch.stop()
+
+            if packet is not None:
+                packet.stamp("encode", start)
+            return depth_map
+
+        # encode directly into the output if no filtering or resizing is necessary
+        is_direct = plan.direct_encode
+
+        self.encoding_watch.start()
+        encoded = plan.depth_codec.encode(depth, plan.min_value, plan.max_value, out=out if is_direct else None)
+        self.encoding_watch.stop()
+
+        if packet is not None:
+            start = packet.stamp("encode", start)
+
+        depth_map = encoded
 
+        if not is_direct:
+            # fix realsense image if it has been aligned to remove lines
+            if plan.median_filter:
+                depth_map = cv2.medianBlur(depth_map, 3)
+
+            # resize to match rgb image if necessary
+            if depth_map.shape != frame.shape:
+                h, w = frame.shape[:2]
+                depth_map = cv2.resize(depth_map, (w, h), interpolation=cv2.INTER_AREA)
+
+            # copy into the output and mask in one pass
+            if out is not None:
+                if mask is not None:
+                    cv2.bitwise_and(depth_map, mask.color_mask, dst=out)
+                else:
+                    np.copyto(out, depth_map)
+                self.buffer_pool.release(encoded)
+                depth_map = out
+            elif mask is not None:
+                depth_map = cv2.bitwise_and(depth_map, mask.color_mask)
+
+            if packet is not None:
+                packet.stamp("filter", start)
+        elif mask is not None:
+            cv2.bitwise_and(depth_map, mask.color_mask, dst=depth_map)
+
+            if packet is not None:
+                packet.stamp("filter", start)
+
+        return depth_map
+
+    def send_output(self, rgbd: np.ndarray, bgrd: Optional[np.ndarray] = None,
+                    packed_frame: Optional[PackedFrame] = None):
+        if packed_frame is not None and isinstance(self.fbs_client, NDIDepthOutput):
+            self.fbs_client.send_packed(*packed_frame)
+        elif isinstance(self.fbs_client, NDIVideoOutput):
+            self.fbs_client.send(rgbd)
+        else:
+            self.fbs_client.send(bgrd if bgrd is not None else self.composer.swapped(rgbd))
+
+    def _packed_output_format(self, depth, width: int) -> Optional[NDIDepthFormat]:
+        if not isinstance(self.fbs_client, NDIDepthOutput):
+            return None
+
+        depth_format = self.config.ndi_format.value
+        if depth_format == NDIDepthFormat.BGRA or not self.yuv_packer.supports(depth):
+            return None
+
+        if not self.yuv_packer.supports(depth, width):
+            logging.warning(f"{depth_format.name} needs an even frame width ({width}), sending BGRA instead")
+            return None
+
+        return depth_format
+
+    def _warmup_fused_encoder(self, depth_codec: DepthCodec):
+        if not self.config.fused_encoding.value:
+            return
+
+        # a separate encoder compiles the kernels, the maps of the shared one may be in use by the encode worker
+        color_table = depth_codec.color_table(500, 6000)
+        if color_table is not None:
+            FusedDepthEncoder().warmup(color_table)
+
+    def _setup_camera_settings(self, cam: vg.BaseCamera):
+        def _on_auto_exposure_change(on: bool):
             try:
                 cam.enable_auto_exposure = on
 
@@ -341,9 +949,6 @@ class SpaceStreamGraph(vg.VisionGraph):
                 pass
 
         def _on_auto_white_balance_change(on: bool):
-            if self.config.is_loading:
-                return
-
             try:
                 cam.enable_auto_white_balance = on
 
@@ -353,9 +958,6 @@ class SpaceStreamGraph(vg.VisionGraph):
                 pass
 
         def _on_exposure_change(value: int):
-            if self.config.is_loading:
-                return
-
             self.config.cam_auto_exposure.value = False
 
             try:
@@ -364,9 +966,6 @@ class SpaceStreamGraph(vg.VisionGraph):
                 logging.warning(f"Could not set exposure ({value}): {ex}")
 
         def _on_white_balance_change(value: int):
-            if self.config.is_loading:
-                return
-
             self.config.cam_auto_white_balance.value = False
 
             try:
@@ -374,13 +973,20 @@ class SpaceStreamGraph(vg.VisionGraph):
             except Exception as ex:
                 logging.warning(f"Could not set white-balance ({value}): {ex}")
 
-        self.config.cam_auto_exposure.on_changed += _on_auto_exposure_change
-        self.config.cam_exposure.on_changed += _on_exposure_change
+        def _on_iso_change(value: int):
+            cam.gain = int(value)
+
+        def is_loading() -> bool:
+            return self.config.is_loading
 
-        self.config.cam_auto_white_balance.on_changed += _on_auto_white_balance_change
-        self.config.cam_white_balance.on_changed += _on_white_balance_change
+        # camera writes are slow, slider values are written at most once per interval (latest value)
+        for field, handler in [(self.config.cam_auto_exposure, _on_auto_exposure_change),
+                               (self.config.cam_exposure, _on_exposure_change),
+                               (self.config.cam_auto_white_balance, _on_auto_white_balance_change),
+                               (self.config.cam_white_balance, _on_white_balance_change)]:
+            self.config_changes.subscribe(field, handler, CAMERA_SETTINGS_DEBOUNCE, ignore=is_loading)
 
-        self.config.cam_iso.bind_to_attribute(cam, cam_ref.gain, lambda x: int(x))
+        self.config_changes.subscribe(self.config.cam_iso, _on_iso_change, CAMERA_SETTINGS_DEBOUNCE)
 
     def _apply_camera_settings(self, cam: vg.BaseCamera):
         self.config.cam_iso.fire()
@@ -392,11 +998,6 @@ class SpaceStreamGraph(vg.VisionGraph):
         if isinstance(self.fbs_server_type, NDIVideoOutput):
             self.fbs_server_type.fourcc = FourCC.BGRA
 
-    @staticmethod
-    def mask_image(image: np.ndarray, mask: np.ndarray) -> np.ndarray:
-        masked = cv2.bitwise_and(image, image, mask=mask)
-        return masked
-
     @staticmethod
     def add_params(parser: argparse.ArgumentParser):
         pass
@@ -405,3 +1006,16 @@ class SpaceStreamGraph(vg.VisionGraph):
         super().configure(args)
 
         self.crf = args.record_crf
+
+        if self.rectifier is not None:
+            self.rectifier.cache_path = args.rectification_cache
+
+        self.registration_mode = args.depth_registration
+
+        if args.rectification_roi is not None:
+            self.rectification_roi = tuple(args.rectification_roi)
+
+        self.metrics_port = args.metrics_port if args.metrics else None
+        self.telemetry_host = args.telemetry_host
+        self.telemetry_port = args.telemetry_port if args.telemetry else None
+        self.metrics_interval = args.metrics_interval
@@ -5,11 +5,11 @@ from pathlib import Path
 
 from duit.arguments.Arguments import DefaultArguments
 from duit_osc.OscService import OscService
-from visiongraph_ndi.NDIVideoOutput import NDIVideoOutput
 from visiongui.ui.UIContext import UIContext
 
 from spacestream.SpaceStreamApp import SpaceStreamApp
 from spacestream.SpaceStreamConfig import SpaceStreamConfig
+from spacestream.io.NDIDepthOutput import NDIDepthOutput
 from spacestream.ui.MainWindow import MainWindow
 
 os.environ["CONDA_DLL_SEARCH_MODIFICATION_ENABLE"] = "1"
@@ -19,13 +19,21 @@ from functools import partial
 
 import configargparse
 import numba
-from visiongraph.input import add_input_step_choices
+from visiongraph.input import add_input_step_choices, InputProviders
+from visiongraph.util.ArgUtils import add_enum_choice_argument
 
 from spacestream import codec
+from spacestream.benchmark.BenchmarkReport import print_results, save_results
+from spacestream.benchmark.PipelineBenchmark import PipelineBenchmark
+from spacestream.nodes.DepthRegistrationMode import DepthRegistrationMode
+from spacestream.nodes.RecordingPlaybackInput import RecordingPlaybackInput
 
 from visiongraph import vg
 import pyrealsense2 as rs
 
+# replay raw and mp4 recordings through the normal pipeline
+InputProviders["playback"] = RecordingPlaybackInput
+
 segmentation_networks = {
     "mediapipe": partial(vg.MediaPipePoseEstimator.create, vg.MediaPipePoseConfig.Full),
     "mediapipe-light": partial(vg.MediaPipePoseEstimator.create, vg.MediaPipePoseConfig.Light),
@@ -51,6 +59,12 @@ def parse_args(config: SpaceStreamConfig):
     input_group = parser.add_argument_group("input provider")
     add_input_step_choices(input_group)
     input_group.add_argument("--midas", action="store_true", help="Use midas for depth capture.")
+    input_group.add_argument("--rectification-roi", type=float, nargs=4, default=None,
+                             metavar=("x", "y", "width", "height"),
+                             help="Normalized region of the rectified images which is streamed (depth rectification).")
+    add_enum_choice_argument(input_group, DepthRegistrationMode, "--depth-registration",
+                             help="Depth to color registration of the Azure Kinect (sdk alignment or precomputed lookup).",
+                             default=DepthRegistrationMode.SDK)
 
     masking_group = parser.add_argument_group("masking")
     vg.add_step_choice_argument(masking_group, segmentation_networks, name="--segnet", default="mediapipe",
@@ -60,6 +74,12 @@ def parse_args(config: SpaceStreamConfig):
     performance_group.add_argument("--parallel", action="store_true", help="Enable parallel for codec operations.")
     performance_group.add_argument("--num-threads", type=int, default=4, help="Number of threads for parallelization.")
     performance_group.add_argument("--no-fastmath", action="store_true", help="Disable fastmath for codec operations.")
+    performance_group.add_argument("--no-kernel-cache", action="store_true", help="Disable on-disk cache of compiled codec kernels.")
+    performance_group.add_argument("--rectification-cache", type=str, default=None, help="Directory to store the rectification maps, they are loaded on the next start.")
+    performance_group.add_argument("--benchmark", action="store_true", help="Run the pipeline headless on a synthetic scene (input size) and print the performance.")
+    performance_group.add_argument("--benchmark-fps", type=float, default=0, help="Frame rate of the synthetic benchmark input (0: as fast as possible).")
+    performance_group.add_argument("--benchmark-frames", type=int, default=300, help="Number of measured frames of the benchmark.")
+    performance_group.add_argument("--benchmark-output", type=str, default=None, help="Benchmark result file path (.json or .csv).")
 
     debug_group = parser.add_argument_group("debug")
     debug_group.add_argument("--no-filter", action="store_true", help="Disable realsense image filter.")
@@ -74,6 +94,14 @@ def parse_args(config: SpaceStreamConfig):
     osc_group.add_argument("--osc-in-port", type=int, default=7401, help="OSC receiving port address (default: 7401)")
     osc_group.add_argument("--osc-out-port", type=int, default=7400, help="OSC receiving port address (default: 7400)")
 
+    metrics_group = parser.add_argument_group("metrics")
+    metrics_group.add_argument("--metrics", action="store_true", help="Publish metrics in prometheus format over http.")
+    metrics_group.add_argument("--metrics-port", type=int, default=9464, help="Metrics http port (default: 9464)")
+    metrics_group.add_argument("--telemetry", action="store_true", help="Send metrics as osc telemetry.")
+    metrics_group.add_argument("--telemetry-host", type=str, default="127.0.0.1", help="Telemetry osc host address (default: 127.0.0.1)")
+    metrics_group.add_argument("--telemetry-port", type=int, default=7402, help="Telemetry osc port (default: 7402)")
+    metrics_group.add_argument("--metrics-interval", type=float, default=1.0, help="Update interval of the metrics in seconds.")
+
     output_group = parser.add_argument_group("output")
     output_group.add_argument("--ndi", action="store_true", help="Use NDI for frame buffer sharing.")
 
@@ -96,15 +124,20 @@ def main():
     if args.loglevel.lower() == "debug" or True:
         faulthandler.enable()
 
+    # codec kernels read these flags on every call, so they also apply to already imported codecs
     if args.parallel:
         num_threads = min(numba.config.NUMBA_NUM_THREADS, args.num_threads)
         numba.set_num_threads(num_threads)
+        codec.NUM_THREADS = num_threads
         codec.ENABLE_PARALLEL = True
         logging.warning(f"Enable parallel with {num_threads} threads")
 
     if args.no_fastmath:
         codec.ENABLE_FAST_MATH = False
 
+    if args.no_kernel_cache:
+        codec.ENABLE_CACHE = False
+
     if issubclass(args.input, vg.BaseDepthInput):
         args.depth = True
 
@@ -117,7 +150,21 @@ def main():
             args.rs_filter = [rs.spatial_filter, rs.temporal_filter]
 
     if issubclass(args.input, vg.AzureKinectInput):
-        args.k4a_align_to_color = True
+        args.k4a_align_to_color = args.depth_registration == DepthRegistrationMode.SDK
+
+    if args.benchmark:
+        # headless run of the configured pipeline on a synthetic scene
+        segnet = args.segnet() if config.masking.value else None
+        benchmark = PipelineBenchmark(config, resolution=tuple(args.input_size), fps=args.benchmark_fps,
+                                      frames=args.benchmark_frames,
+                                      segnet=segnet)
+        results = [benchmark.run()]
+        print_results(results)
+
+        if args.benchmark_output is not None:
+            save_results(Path(args.benchmark_output), results)
+            print(f"results written to {args.benchmark_output}")
+        return
 
     if args.osc:
         osc_service = OscService(host=args.osc_host, in_port=args.osc_in_port, out_port=args.osc_out_port)
@@ -135,7 +182,7 @@ def main():
         print(f"    Please, send new values on port {osc_service.in_port}")
 
     show_ui = not args.no_preview
-    fbs_server_type = NDIVideoOutput if args.ndi else vg.FrameBufferSharingServer
+    fbs_server_type = NDIDepthOutput if args.ndi else vg.FrameBufferSharingServer
 
     # create app and graph
     app = SpaceStreamApp(config, args.input(), args.segnet(), fbs_server_type, multi_threaded=show_ui)
@@ -0,0 +1,63 @@
+import csv
+import dataclasses
+import json
+import os
+import platform
+from pathlib import Path
+from typing import Any, List, Optional
+
+import numba
+import numpy as np
+
+from spacestream.io.EnhancedJSONEncoder import EnhancedJSONEncoder
+
+
+def system_information() -> dict:
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "numba": numba.__version__,
+        "numba_threads": numba.config.NUMBA_NUM_THREADS,
+    }
+
+
+def print_results(results: List[Any]):
+    if len(results) == 0:
+        print("no results")
+        return
+
+    fields = [f.name for f in dataclasses.fields(results[0])]
+    rows = [[_format(getattr(r, name)) for name in fields] for r in results]
+    widths = [max(len(name), *[len(row[i]) for row in rows]) for i, name in enumerate(fields)]
+
+    print("  ".join(name.rjust(widths[i]) for i, name in enumerate(fields)))
+    for row in rows:
+        print("  ".join(value.rjust(widths[i]) for i, value in enumerate(row)))
+
+
+def save_results(path: Path, results: List[Any]):
+    """
+    Stores the results as csv (one row per result) or json (including the system information).
+    """
+    if path.suffix.lower() == ".csv":
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=[f.name for f in dataclasses.fields(results[0])])
+            writer.writeheader()
+            writer.writerows(dataclasses.asdict(r) for r in results)
+        return
+
+    with open(path, "w") as f:
+        json.dump({"system": system_information(), "results": results}, f, cls=EnhancedJSONEncoder, indent=2)
+
+
+def _format(value: Optional[Any]) -> str:
+    if value is None:
+        return "-"
+
+    if isinstance(value, float):
+        return f"{value:.3f}"
+
+    return str(value)
@@ -0,0 +1,233 @@
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numba
+import numpy as np
+
+from spacestream import codec
+from spacestream.benchmark.SyntheticScene import SyntheticScene
+from spacestream.codec.DepthCodec import DepthCodec
+from spacestream.codec.DepthCodecType import DepthCodecType
+from spacestream.codec.InverseHueColorization import InverseHueColorization
+
+DEFAULT_RESOLUTIONS = [(640, 480), (848, 480), (1280, 720), (1024, 1024)]
+DEFAULT_THREAD_COUNTS = [1, 2, 4, 8]
+
+# minimal distance the graph enforces for the inverse hue codec (in meters)
+INVERSE_HUE_MIN_DISTANCE = 0.1
+
+
+@dataclass
+class CodecBenchmarkResult:
+    codec: str
+    source: str
+    width: int
+    height: int
+    mode: str
+    threads: int
+    frames: int
+    encode_ms: float
+    encode_mpx_per_s: float
+    decode_ms: Optional[float] = None
+    decode_mpx_per_s: Optional[float] = None
+    rmse_mm: Optional[float] = None
+    max_error_mm: Optional[float] = None
+    valid_pixels: float = 0.0
+
+
+def load_depth_frames(path: Path) -> List[np.ndarray]:
+    """
+    Loads recorded uint16 depth frames from a .npy file (single frame or stack), a 16-bit image
+    or a directory of 16-bit images.
+    """
+    if path.is_dir():
+        files = sorted(p for p in path.iterdir() if p.suffix.lower() in (".png", ".tif", ".tiff"))
+        return [frame for f in files for frame in load_depth_frames(f)]
+
+    if path.suffix.lower() == ".npy":
+        data = np.load(str(path))
+        frames = [data] if data.ndim == 2 else list(data)
+    else:
+        frames = [cv2.imread(str(path), cv2.IMREAD_UNCHANGED)]
+
+    for frame in frames:
+        if frame is None or frame.ndim != 2 or frame.dtype != np.uint16:
+            raise ValueError(f"{path} does not contain single channel uint16 depth frames.")
+
+    return frames
+
+
+def codec_range(depth_codec: DepthCodec, min_distance: float, max_distance: float,
+                depth_units: float) -> Tuple[int, int]:
+    """
+    Converts the distance range (in meters) into depth values, the same way the graph does.
+    """
+    if isinstance(depth_codec, InverseHueColorization) and min_distance <= 0.0:
+        min_distance = INVERSE_HUE_MIN_DISTANCE
+
+    return round(min_distance / depth_units), round(max_distance / depth_units)
+
+
+def depth_error(frames: List[np.ndarray], decoded: List[np.ndarray], d_min: int, d_max: int, depth_units: float,
+                invalid_threshold: Optional[float] = None) \
+        -> Tuple[Optional[float], Optional[float], float, Optional[float]]:
+    """
+    Calculates the round trip error of the valid (encoded) pixels in mm.
+    Returns rmse, max error, the ratio of valid pixels and the ratio of valid pixels with an error above the threshold.
+    """
+    to_mm = depth_units * 1000
+
+    squared_sum = 0.0
+    max_error = 0.0
+    valid_count = 0
+    invalid_count = 0
+
+    for depth, result in zip(frames, decoded):
+        # only values inside the encoded range can be recovered
+        valid = (depth > 0) & (depth >= d_min) & (depth <= d_max)
+        error = np.abs(depth[valid].astype(np.float64) - result[valid].astype(np.float64)) * to_mm
+
+        if error.size > 0:
+            squared_sum += float(np.sum(error * error))
+            max_error = max(max_error, float(error.max()))
+            valid_count += error.size
+
+            if invalid_threshold is not None:
+                invalid_count += int(np.count_nonzero(error > invalid_threshold))
+
+    if valid_count == 0:
+        return None, None, 0.0, None
+
+    total = sum(f.size for f in frames[:len(decoded)])
+    invalid_ratio = invalid_count / valid_count if invalid_threshold is not None else None
+    return float(np.sqrt(squared_sum / valid_count)), max_error, valid_count / total, invalid_ratio
+
+
+class CodecBenchmark:
+    """
+    Measures encode / decode throughput and round trip accuracy of the depth codecs.
+    """
+
+    def __init__(self,
+                 codecs: Sequence[DepthCodecType] = tuple(DepthCodecType),
+                 resolutions: Sequence[Tuple[int, int]] = tuple(DEFAULT_RESOLUTIONS),
+                 thread_counts: Sequence[int] = tuple(DEFAULT_THREAD_COUNTS),
+                 frames: int = 10, repetitions: int = 3,
+                 min_distance: float = 0.0, max_distance: float = 6.0, depth_units: float = 0.001,
+                 recorded_frames: Optional[List[np.ndarray]] = None,
+                 use_lookup_table: bool = True):
+        self.codecs = codecs
+        self.resolutions = resolutions
+        self.thread_counts = thread_counts
+        self.frames = frames
+        self.repetitions = repetitions
+        self.min_distance = min_distance
+        self.max_distance = max_distance
+        self.depth_units = depth_units
+        self.recorded_frames = recorded_frames
+        self.use_lookup_table = use_lookup_table
+
+    def run(self) -> List[CodecBenchmarkResult]:
+        results: List[CodecBenchmarkResult] = []
+        modes = self._modes()
+
+        parallel, num_threads = codec.ENABLE_PARALLEL, codec.NUM_THREADS
+
+        try:
+            for source, frames in self._sources():
+                for codec_type in self.codecs:
+                    results += self._run_codec(codec_type, source, frames, modes)
+        finally:
+            codec.ENABLE_PARALLEL, codec.NUM_THREADS = parallel, num_threads
+
+        return results
+
+    def _sources(self):
+        for w, h in self.resolutions:
+            scene = SyntheticScene(w, h)
+            yield "synthetic", [scene.depth(i) for i in range(self.frames)]
+
+            if self.recorded_frames:
+                # recorded depth is resampled to the benchmark resolution (nearest, to not create new depth values)
+                yield "recorded", [cv2.resize(frame, (w, h), interpolation=cv2.INTER_NEAREST)
+                                   for frame in self.recorded_frames[:self.frames]]
+
+    def _modes(self) -> List[Tuple[str, int]]:
+        modes = [("serial", 1)]
+
+        for threads in self.thread_counts:
+            if threads > numba.config.NUMBA_NUM_THREADS:
+                logging.warning(f"Skipping {threads} threads (only {numba.config.NUMBA_NUM_THREADS} available)")
+                continue
+
+            modes.append(("parallel", threads))
+
+        return modes
+
+    def _run_codec(self, codec_type: DepthCodecType, source: str,
+                   frames: List[np.ndarray], modes: List[Tuple[str, int]]) -> List[CodecBenchmarkResult]:
+        depth_codec: DepthCodec = codec_type.value()
+
+        if hasattr(depth_codec, "use_lookup_table"):
+            depth_codec.use_lookup_table = self.use_lookup_table
+
+        d_min, d_max = codec_range(depth_codec, self.min_distance, self.max_distance, self.depth_units)
+
+        h, w = frames[0].shape[:2]
+        results = []
+
+        for mode, threads in modes:
+            codec.ENABLE_PARALLEL = mode == "parallel"
+            codec.NUM_THREADS = threads
+
+            # compile and check if the codec supports plain depth buffers
+            try:
+                depth_codec.encode(frames[0], d_min, d_max)
+            except Exception as ex:
+                logging.warning(f"Skipping {codec_type.name}: encoding of depth buffers is not supported ({ex})")
+                return results
+
+            # the receiver gets the channels in reversed order
+            encoded_frames = [np.ascontiguousarray(depth_codec.encode(f, d_min, d_max)[:, :, ::-1]) for f in frames]
+
+            try:
+                depth_codec.decode(encoded_frames[0], d_min, d_max)
+                supports_decode = True
+            except Exception as ex:
+                logging.info(f"{codec_type.name}: decoding is not supported ({ex})")
+                supports_decode = False
+
+            encode_ms = self._measure(lambda f: depth_codec.encode(f, d_min, d_max), frames)
+
+            result = CodecBenchmarkResult(codec_type.name, source, w, h, mode, threads, len(frames),
+                                          encode_ms, self._mpx_per_s(w, h, encode_ms))
+
+            if supports_decode:
+                result.decode_ms = self._measure(lambda f: depth_codec.decode(f, d_min, d_max), encoded_frames)
+                result.decode_mpx_per_s = self._mpx_per_s(w, h, result.decode_ms)
+
+                decoded = [depth_codec.decode(f, d_min, d_max).copy() for f in encoded_frames]
+                result.rmse_mm, result.max_error_mm, result.valid_pixels, _ = depth_error(frames, decoded, d_min, d_max,
+                                                                                           self.depth_units)
+
+            logging.info(f"{result}")
+            results.append(result)
+
+        return results
+
+    def _measure(self, method, frames: List[np.ndarray]) -> float:
+        start = time.perf_counter()
+
+        for _ in range(self.repetitions):
+            for frame in frames:
+                method(frame)
+
+        return (time.perf_counter() - start) * 1000 / (self.repetitions * len(frames))
+
+    @staticmethod
+    def _mpx_per_s(w: int, h: int, ms: float) -> float:
+        return w * h / 1_000_000 / (ms / 1000) if ms > 0 else 0.0
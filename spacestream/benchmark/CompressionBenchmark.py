@@ -0,0 +1,176 @@
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from visiongraph import vg
+
+from spacestream.benchmark.CodecBenchmark import codec_range, depth_error
+from spacestream.benchmark.SyntheticScene import SyntheticScene
+from spacestream.codec.DepthCodec import DepthCodec
+from spacestream.codec.DepthCodecType import DepthCodecType
+
+DEFAULT_CRF_VALUES = [18, 23, 28, 35]
+DEFAULT_VIDEO_CODECS = ["libx264", "libx265"]
+
+
+@dataclass
+class CompressionBenchmarkResult:
+    codec: str
+    vcodec: str
+    pix_fmt: str
+    crf: Optional[int]
+    bitrate: Optional[str]
+    width: int
+    height: int
+    frames: int
+    file_size: int
+    kbit_per_s: float
+    rmse_mm: Optional[float] = None
+    max_error_mm: Optional[float] = None
+    invalid_pixels: Optional[float] = None
+
+
+class CompressionBenchmark:
+    """
+    Records encoded rgb-d frames with the same recorder (ffmpeg) as the graph at different crf / bitrate settings,
+    reads the videos back and measures the depth error after decoding.
+    """
+
+    def __init__(self,
+                 codecs: Sequence[DepthCodecType] = tuple(DepthCodecType),
+                 vcodecs: Sequence[str] = tuple(DEFAULT_VIDEO_CODECS),
+                 crf_values: Sequence[int] = tuple(DEFAULT_CRF_VALUES),
+                 bitrates: Sequence[str] = (),
+                 resolution: Tuple[int, int] = (640, 480),
+                 frames: int = 60, fps: int = 30, pix_fmt: str = "yuv420p",
+                 min_distance: float = 0.0, max_distance: float = 6.0, depth_units: float = 0.001,
+                 invalid_threshold: float = 50.0,
+                 recorded_frames: Optional[List[np.ndarray]] = None,
+                 output_dir: Optional[Path] = None):
+        self.codecs = codecs
+        self.vcodecs = vcodecs
+        self.crf_values = crf_values
+        self.bitrates = bitrates
+        self.resolution = resolution
+        self.frames = frames
+        self.fps = fps
+        self.pix_fmt = pix_fmt
+        self.min_distance = min_distance
+        self.max_distance = max_distance
+        self.depth_units = depth_units
+        self.invalid_threshold = invalid_threshold
+        self.recorded_frames = recorded_frames
+        self.output_dir = output_dir
+
+    def run(self) -> List[CompressionBenchmarkResult]:
+        depth_frames, color_frames = self._create_frames()
+        results: List[CompressionBenchmarkResult] = []
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_dir = self.output_dir if self.output_dir is not None else Path(temp_dir)
+            output_dir.mkdir(parents=True, exist_ok=True)
+
+            for codec_type in self.codecs:
+                depth_codec: DepthCodec = codec_type.value()
+                d_min, d_max = codec_range(depth_codec, self.min_distance, self.max_distance, self.depth_units)
+
+                try:
+                    encoded_frames = [depth_codec.encode(f, d_min, d_max).copy() for f in depth_frames]
+                except Exception as ex:
+                    logging.warning(f"Skipping {codec_type.name}: encoding of depth buffers is not supported ({ex})")
+                    continue
+
+                # same layout as the graph output (depth | color)
+                rgbd_frames = [np.hstack((d, c)) for d, c in zip(encoded_frames, color_frames)]
+
+                for vcodec in self.vcodecs:
+                    for crf, bitrate in self._settings():
+                        name = f"{codec_type.name}-{vcodec}-{f'crf{crf}' if crf is not None else bitrate}.mp4"
+                        video_path = output_dir / name
+
+                        self._record(video_path, rgbd_frames, vcodec, crf, bitrate)
+                        decoded = self._decode(video_path, depth_codec, d_min, d_max)
+
+                        file_size = os.path.getsize(video_path)
+                        duration = len(rgbd_frames) / self.fps
+                        frame_count = len(decoded) if decoded is not None else len(rgbd_frames)
+
+                        result = CompressionBenchmarkResult(codec_type.name, vcodec, self.pix_fmt, crf, bitrate,
+                                                            self.resolution[0], self.resolution[1], frame_count,
+                                                            file_size, file_size * 8 / 1000 / duration)
+
+                        if decoded is not None:
+                            result.rmse_mm, result.max_error_mm, _, result.invalid_pixels = \
+                                depth_error(depth_frames, decoded, d_min, d_max, self.depth_units,
+                                            self.invalid_threshold)
+
+                        logging.info(f"{result}")
+                        results.append(result)
+
+        return results
+
+    def _create_frames(self) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        w, h = self.resolution
+        scene = SyntheticScene(w, h)
+
+        if self.recorded_frames:
+            depth_frames = [cv2.resize(frame, (w, h), interpolation=cv2.INTER_NEAREST)
+                            for frame in self.recorded_frames[:self.frames]]
+        else:
+            depth_frames = [scene.depth(i) for i in range(self.frames)]
+
+        color_frames = [scene.color(i) for i in range(len(depth_frames))]
+        return depth_frames, color_frames
+
+    def _settings(self):
+        for crf in self.crf_values:
+            yield crf, None
+
+        for bitrate in self.bitrates:
+            yield None, bitrate
+
+    def _record(self, path: Path, frames: List[np.ndarray], vcodec: str, crf: Optional[int], bitrate: Optional[str]):
+        recorder = vg.VidGearVideoRecorder(str(path), fps=self.fps)
+        recorder.output_params.update({
+            "-vcodec": vcodec,
+            "-pix_fmt": self.pix_fmt,
+        })
+
+        if crf is not None:
+            recorder.output_params["-crf"] = crf
+        else:
+            recorder.output_params.pop("-crf", None)
+            recorder.output_params["-b:v"] = bitrate
+
+        recorder.open()
+        for frame in frames:
+            recorder.add_image(frame)
+        recorder.close()
+
+    def _decode(self, path: Path, depth_codec: DepthCodec, d_min: int, d_max: int) -> Optional[List[np.ndarray]]:
+        w = self.resolution[0]
+        capture = cv2.VideoCapture(str(path))
+
+        decoded = []
+        try:
+            while True:
+                success, frame = capture.read()
+
+                if not success:
+                    break
+
+                # the receiver gets the channels in reversed order
+                depth_map = np.ascontiguousarray(frame[:, :w, ::-1])
+                decoded.append(depth_codec.decode(depth_map, d_min, d_max).copy())
+        except Exception as ex:
+            logging.info(f"{type(depth_codec).__name__}: decoding is not supported ({ex})")
+            return None
+        finally:
+            capture.release()
+
+        return decoded
@@ -0,0 +1,34 @@
+from argparse import ArgumentParser, Namespace
+
+import numpy as np
+from visiongraph import vg
+
+
+class NullFrameBufferSharingServer(vg.FrameBufferSharingServer):
+    """
+    Frame buffer sharing server which only counts the frames, to run the graph without spout, syphon or ndi.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.frames = 0
+
+    def setup(self):
+        pass
+
+    def send(self, frame: np.ndarray, flip_texture: bool = False) -> None:
+        self.frames += 1
+
+    def release(self):
+        pass
+
+    def configure(self, args: Namespace):
+        pass
+
+    @staticmethod
+    def add_params(parser: ArgumentParser):
+        pass
+
+    @staticmethod
+    def create(name: str) -> "NullFrameBufferSharingServer":
+        return NullFrameBufferSharingServer(name)
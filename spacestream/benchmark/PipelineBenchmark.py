@@ -0,0 +1,165 @@
+import logging
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from visiongraph import vg
+
+from spacestream.SpaceStreamConfig import SpaceStreamConfig
+from spacestream.SpaceStreamGraph import SpaceStreamGraph
+from spacestream.benchmark.NullFrameBufferSharingServer import NullFrameBufferSharingServer
+from spacestream.benchmark.SyntheticInput import SyntheticInput
+from spacestream.pipeline.DropPolicy import DropPolicy
+
+
+@dataclass
+class PipelineBenchmarkResult:
+    codec: str
+    width: int
+    height: int
+    mode: str
+    frames: int
+    fps: float
+    capture_ms: float
+    encode_ms: float
+    output_ms: float
+    dropped: int
+    skipped: int
+    cpu_percent: float
+    alloc_peak_kb: Optional[float] = None
+    retained_kb: Optional[float] = None
+
+
+class PipelineBenchmark:
+    """
+    Runs the whole graph headless (synthetic input, no ui, camera or frame buffer sharing) with the settings
+    of the config and measures the processing time of the stages, the frame rate and the cpu utilisation
+    (process time / wall time, 100% is one core). In pipelined mode the stage times are the running averages
+    of the pipeline statistics.
+
+    Without an input frame rate (fps), the capture stage would flood the pipelined mode, so the pipeline
+    blocks instead of dropping frames to measure the throughput.
+
+    Allocations are traced (tracemalloc) in a separate pass, because tracing slows down the pipeline:
+    alloc_peak_kb is the average peak of memory allocated while a frame is processed, retained_kb the memory
+    which has not been released after the pass.
+    """
+
+    def __init__(self, config: SpaceStreamConfig, resolution: Tuple[int, int] = (640, 480), fps: float = 0,
+                 frames: int = 300, warmup_frames: int = 30, allocation_frames: int = 30,
+                 segnet: Optional[vg.InstanceSegmentationEstimator] = None):
+        self.config = config
+        self.resolution = resolution
+        self.fps = fps
+        self.frames = frames
+        self.warmup_frames = warmup_frames
+        self.allocation_frames = allocation_frames
+        self.segnet = segnet
+
+    def run(self) -> PipelineBenchmarkResult:
+        if self.config.masking.value and self.segnet is None:
+            logging.warning("Masking is disabled for the benchmark (no segmentation network)")
+            self.config.masking.value = False
+
+        if self.config.pipelined.value and self.fps <= 0:
+            self.config.pipeline_drop_policy.value = DropPolicy.Block
+
+        w, h = self.resolution
+        graph = SpaceStreamGraph(self.config, SyntheticInput(w, h, self.fps), segnet=self.segnet,
+                                 fbs_server_type=NullFrameBufferSharingServer,
+                                 multi_threaded=False, handle_signals=False)
+
+        graph._init()
+        try:
+            for _ in range(self.warmup_frames):
+                self._process(graph)
+
+            result = self._measure(graph)
+
+            if self.allocation_frames > 0:
+                result.alloc_peak_kb, result.retained_kb = self._trace_allocations(graph)
+        finally:
+            graph._release()
+
+        return result
+
+    def _measure(self, graph: SpaceStreamGraph) -> PipelineBenchmarkResult:
+        stage_times: List[Tuple[float, float, float]] = []
+        graph._update_pipeline()
+
+        if graph.pipeline is not None:
+            for stats in graph.pipeline.statistics:
+                stats.reset()
+            dropped = graph.pipeline.dropped
+            skipped = graph.pipeline.skipped
+            output_frames = graph.pipeline.workers[-1].statistics.frames
+
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+
+        for _ in range(self.frames):
+            stage_times.append(self._process(graph))
+
+        elapsed = time.perf_counter() - start
+        cpu_time = time.process_time() - cpu_start
+
+        w, h = self.resolution
+        mode = "pipelined" if graph.pipeline is not None else "sequential"
+        result = PipelineBenchmarkResult(self.config.codec.value.name, w, h, mode, self.frames,
+                                         self.frames / elapsed, *np.mean(stage_times, axis=0).tolist(),
+                                         0, 0, cpu_time / elapsed * 100)
+
+        if graph.pipeline is not None:
+            capture, encode, output, *send = graph.pipeline.statistics
+            result.fps = (output.frames - output_frames) / elapsed
+            result.capture_ms = capture.processing_time
+            result.encode_ms = encode.processing_time
+            result.output_ms = output.processing_time + sum(s.processing_time for s in send)
+            result.dropped = graph.pipeline.dropped - dropped
+            result.skipped = graph.pipeline.skipped - skipped
+
+        return result
+
+    def _trace_allocations(self, graph: SpaceStreamGraph) -> Tuple[float, float]:
+        peaks = []
+
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+
+            for _ in range(self.allocation_frames):
+                current = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                self._process(graph)
+                peaks.append(tracemalloc.get_traced_memory()[1] - current)
+
+            retained = tracemalloc.get_traced_memory()[0] - baseline
+        finally:
+            tracemalloc.stop()
+
+        return float(np.mean(peaks)) / 1024, retained / 1024
+
+    @staticmethod
+    def _process(graph: SpaceStreamGraph) -> Tuple[float, float, float]:
+        """
+        Processes one frame and returns the time of the capture, encode and output stage (sequential mode only).
+        """
+        if graph.config.pipelined.value:
+            graph._process()
+            return 0.0, 0.0, 0.0
+
+        graph._apply_config_changes()
+        graph._update_pipeline()
+
+        start = time.perf_counter()
+        packet = graph._capture_frame()
+        captured = time.perf_counter()
+        graph._encode_frame(packet)
+        encoded = time.perf_counter()
+        graph._output_frame(packet)
+        graph._release_packet(packet)
+        end = time.perf_counter()
+
+        return (captured - start) * 1000, (encoded - captured) * 1000, (end - encoded) * 1000
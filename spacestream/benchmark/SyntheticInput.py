@@ -0,0 +1,74 @@
+import time
+from argparse import ArgumentParser, Namespace
+from typing import List, Optional, Tuple
+
+import numpy as np
+from visiongraph import vg
+
+from spacestream.benchmark.SyntheticScene import SyntheticScene
+
+
+class SyntheticInput(vg.BaseDepthInput):
+    """
+    Depth input which plays a loop of pre-rendered SyntheticScene frames, so the time to render the scene
+    is not part of the measured pipeline. If fps is set, frames are delivered at that rate (like a camera),
+    otherwise as fast as they are read.
+    """
+
+    def __init__(self, width: int = 640, height: int = 480, fps: float = 0, loop_frames: int = 30, seed: int = 0):
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.loop_frames = loop_frames
+        self.seed = seed
+
+        self._depth_frames: List[np.ndarray] = []
+        self._color_frames: List[np.ndarray] = []
+        self._index = 0
+        self._depth: Optional[np.ndarray] = None
+        self._next_frame_time = 0.0
+
+    def setup(self):
+        scene = SyntheticScene(self.width, self.height, seed=self.seed)
+        self._depth_frames = [scene.depth(i) for i in range(self.loop_frames)]
+        self._color_frames = [scene.color(i) for i in range(self.loop_frames)]
+        self._index = 0
+
+    def release(self):
+        self._depth_frames.clear()
+        self._color_frames.clear()
+        self._depth = None
+
+    def read(self) -> Tuple[int, Optional[np.ndarray]]:
+        if self.fps > 0:
+            now = time.perf_counter()
+            if self._next_frame_time > now:
+                time.sleep(self._next_frame_time - now)
+            self._next_frame_time = max(self._next_frame_time, now) + 1 / self.fps
+
+        i = self._index % self.loop_frames
+        self._index += 1
+
+        self._depth = self._depth_frames[i]
+        return self._post_process(int(time.time() * 1000), self._color_frames[i])
+
+    def distance(self, x: float, y: float) -> float:
+        ix = min(max(int(x * self.width), 0), self.width - 1)
+        iy = min(max(int(y * self.height), 0), self.height - 1)
+        return float(self._depth[iy, ix]) * 0.001
+
+    @property
+    def depth_buffer(self) -> np.ndarray:
+        return self._depth
+
+    @property
+    def depth_map(self) -> np.ndarray:
+        return self._depth
+
+    def configure(self, args: Namespace):
+        pass
+
+    @staticmethod
+    def add_params(parser: ArgumentParser):
+        pass
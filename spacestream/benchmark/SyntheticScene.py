@@ -0,0 +1,75 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+
+class SyntheticScene:
+    """
+    Procedural rgb-d scene (tilted background plane, moving box, moving spheres, sensor noise and holes)
+    to benchmark the codecs and the pipeline without a camera. Depth is returned in millimeters (uint16).
+    """
+
+    def __init__(self, width: int, height: int, seed: int = 0,
+                 near: float = 800.0, far: float = 5500.0,
+                 noise: float = 0.002, hole_ratio: float = 0.02):
+        self.width = width
+        self.height = height
+        self.near = near
+        self.far = far
+        self.noise = noise
+        self.hole_ratio = hole_ratio
+
+        self._random = np.random.default_rng(seed)
+
+        ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+        self._u = xs / max(width - 1, 1)
+        self._v = ys / max(height - 1, 1)
+
+        self._color: Optional[np.ndarray] = None
+
+    def depth(self, index: int) -> np.ndarray:
+        t = index / 30.0
+        u, v = self._u, self._v
+
+        # tilted background plane
+        depth = self.far - (self.far - self.near) * 0.25 * (u * 0.5 + v)
+
+        # moving box (fronto-parallel plane)
+        bx = 0.5 + 0.3 * math.sin(t * 0.7)
+        box = (np.abs(u - bx) < 0.12) & (np.abs(v - 0.6) < 0.25)
+        depth = np.where(box, self.near + (self.far - self.near) * 0.45, depth)
+
+        # moving spheres
+        aspect = self.width / max(self.height, 1)
+        for i, (radius, speed) in enumerate(((0.15, 1.0), (0.1, 1.7), (0.07, 2.3))):
+            cx = 0.5 + 0.35 * math.cos(t * speed + i)
+            cy = 0.5 + 0.3 * math.sin(t * speed * 0.8 + i * 2)
+            cz = self.near + (self.far - self.near) * (0.1 + 0.15 * i)
+
+            dx = (u - cx) * aspect
+            dy = v - cy
+            d2 = radius * radius - dx * dx - dy * dy
+
+            inside = d2 > 0
+            surface = cz - np.sqrt(np.maximum(d2, 0)) * (self.far - self.near)
+            depth = np.where(inside & (surface < depth), surface, depth)
+
+        # depth dependent sensor noise
+        depth = depth * (1.0 + self._random.normal(0, self.noise, depth.shape).astype(np.float32))
+
+        result = np.clip(depth, 0, 65535).astype(np.uint16)
+
+        # holes (no-data pixels)
+        if self.hole_ratio > 0:
+            result[self._random.random(result.shape) < self.hole_ratio] = 0
+
+        return result
+
+    def color(self, index: int) -> np.ndarray:
+        if self._color is None:
+            # static checkerboard with gradient, bgr
+            checker = ((self._u * 16).astype(np.int32) + (self._v * 12).astype(np.int32)) % 2
+            self._color = np.stack([self._u * 255, self._v * 255, 64 + checker * 128], axis=-1).astype(np.uint8)
+
+        return np.roll(self._color, index * 4, axis=1)
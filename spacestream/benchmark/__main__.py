@@ -0,0 +1,156 @@
+import logging
+from pathlib import Path
+
+import configargparse
+
+from spacestream.benchmark.BenchmarkReport import print_results, save_results
+from spacestream.benchmark.CodecBenchmark import CodecBenchmark, DEFAULT_RESOLUTIONS, DEFAULT_THREAD_COUNTS, \
+    load_depth_frames
+from spacestream.benchmark.CompressionBenchmark import CompressionBenchmark, DEFAULT_CRF_VALUES, \
+    DEFAULT_VIDEO_CODECS
+from spacestream.benchmark.PipelineBenchmark import PipelineBenchmark
+from spacestream.SpaceStreamConfig import SpaceStreamConfig
+from spacestream.codec.DepthCodecType import DepthCodecType
+
+
+def _resolution(value: str):
+    w, h = value.lower().split("x")
+    return int(w), int(h)
+
+
+def _add_codec_parser(subparsers):
+    parser = subparsers.add_parser("codec", help="Encode / decode throughput and round trip accuracy of the codecs.")
+    parser.add_argument("--codecs", type=str, nargs="+", default=[c.name for c in DepthCodecType],
+                        choices=[c.name for c in DepthCodecType], help="Codecs to benchmark.")
+    parser.add_argument("--resolutions", type=_resolution, nargs="+", default=DEFAULT_RESOLUTIONS,
+                        help="Resolutions to benchmark (e.g. 640x480).")
+    parser.add_argument("--threads", type=int, nargs="+", default=DEFAULT_THREAD_COUNTS,
+                        help="Thread counts of the parallel runs.")
+    parser.add_argument("--frames", type=int, default=10, help="Number of distinct frames per run.")
+    parser.add_argument("--repetitions", type=int, default=3, help="How often the frames are encoded per run.")
+    parser.add_argument("--min-distance", type=float, default=0.0, help="Min distance of the encoded range in meters.")
+    parser.add_argument("--max-distance", type=float, default=6.0, help="Max distance of the encoded range in meters.")
+    parser.add_argument("--depth-units", type=float, default=0.001, help="Depth units of the frames in meters.")
+    parser.add_argument("--depth", type=Path, default=None,
+                        help="Recorded depth (.npy, 16-bit png / tiff or a directory of them).")
+    parser.add_argument("--no-lookup", action="store_true", help="Disable the lookup tables of the codecs.")
+
+
+def _run_codec(args):
+    benchmark = CodecBenchmark(codecs=[DepthCodecType[name] for name in args.codecs],
+                               resolutions=args.resolutions,
+                               thread_counts=args.threads,
+                               frames=args.frames,
+                               repetitions=args.repetitions,
+                               min_distance=args.min_distance,
+                               max_distance=args.max_distance,
+                               depth_units=args.depth_units,
+                               recorded_frames=load_depth_frames(args.depth) if args.depth is not None else None,
+                               use_lookup_table=not args.no_lookup)
+    return benchmark.run()
+
+
+def _add_compression_parser(subparsers):
+    parser = subparsers.add_parser("compression", help="Depth error of the codecs after video compression (ffmpeg).")
+    parser.add_argument("--codecs", type=str, nargs="+", default=[c.name for c in DepthCodecType],
+                        choices=[c.name for c in DepthCodecType], help="Codecs to benchmark.")
+    parser.add_argument("--vcodecs", type=str, nargs="+", default=DEFAULT_VIDEO_CODECS,
+                        help="FFmpeg video codecs (e.g. libx264, libx265).")
+    parser.add_argument("--crf", type=int, nargs="*", default=DEFAULT_CRF_VALUES, help="CRF values to record with.")
+    parser.add_argument("--bitrates", type=str, nargs="*", default=[],
+                        help="Constant bitrates to record with (e.g. 5M), used instead of crf.")
+    parser.add_argument("--pix-fmt", type=str, default="yuv420p", help="Pixel format of the videos.")
+    parser.add_argument("--resolution", type=_resolution, default=(640, 480), help="Resolution of the depth frames.")
+    parser.add_argument("--frames", type=int, default=60, help="Number of frames per video.")
+    parser.add_argument("--fps", type=int, default=30, help="Frame rate of the videos.")
+    parser.add_argument("--min-distance", type=float, default=0.0, help="Min distance of the encoded range in meters.")
+    parser.add_argument("--max-distance", type=float, default=6.0, help="Max distance of the encoded range in meters.")
+    parser.add_argument("--depth-units", type=float, default=0.001, help="Depth units of the frames in meters.")
+    parser.add_argument("--invalid-threshold", type=float, default=50.0,
+                        help="Error in mm above which a pixel counts as invalid.")
+    parser.add_argument("--depth", type=Path, default=None,
+                        help="Recorded depth (.npy, 16-bit png / tiff or a directory of them).")
+    parser.add_argument("--keep-videos", type=Path, default=None, help="Directory to keep the recorded videos.")
+
+
+def _run_compression(args):
+    benchmark = CompressionBenchmark(codecs=[DepthCodecType[name] for name in args.codecs],
+                                     vcodecs=args.vcodecs,
+                                     crf_values=args.crf,
+                                     bitrates=args.bitrates,
+                                     resolution=args.resolution,
+                                     frames=args.frames,
+                                     fps=args.fps,
+                                     pix_fmt=args.pix_fmt,
+                                     min_distance=args.min_distance,
+                                     max_distance=args.max_distance,
+                                     depth_units=args.depth_units,
+                                     invalid_threshold=args.invalid_threshold,
+                                     recorded_frames=load_depth_frames(args.depth) if args.depth is not None else None,
+                                     output_dir=args.keep_videos)
+    return benchmark.run()
+
+
+def _add_pipeline_parser(subparsers):
+    parser = subparsers.add_parser("pipeline", help="Frame rate, stage times, cpu and allocations of the whole graph.")
+    parser.add_argument("--codecs", type=str, nargs="+", default=[DepthCodecType.UniformHue.name],
+                        choices=[c.name for c in DepthCodecType], help="Codecs to benchmark.")
+    parser.add_argument("--resolutions", type=_resolution, nargs="+", default=[(640, 480)],
+                        help="Resolutions to benchmark (e.g. 640x480).")
+    parser.add_argument("--modes", type=str, nargs="+", default=["sequential", "pipelined"],
+                        choices=["sequential", "pipelined"], help="Execution modes of the graph.")
+    parser.add_argument("--fps", type=float, default=0, help="Frame rate of the input (0: as fast as possible).")
+    parser.add_argument("--frames", type=int, default=300, help="Number of measured frames per run.")
+    parser.add_argument("--warmup", type=int, default=30, help="Number of frames before the measurement.")
+    parser.add_argument("--allocation-frames", type=int, default=30,
+                        help="Number of frames to trace the allocations (0 to disable).")
+
+
+def _run_pipeline(args):
+    results = []
+
+    for name in args.codecs:
+        for resolution in args.resolutions:
+            for mode in args.modes:
+                config = SpaceStreamConfig()
+                config.codec.value = DepthCodecType[name]
+                config.pipelined.value = mode == "pipelined"
+                config.disable_preview.value = True
+
+                benchmark = PipelineBenchmark(config, resolution=resolution, fps=args.fps, frames=args.frames,
+                                              warmup_frames=args.warmup, allocation_frames=args.allocation_frames)
+                results.append(benchmark.run())
+
+    return results
+
+
+def main():
+    parser = configargparse.ArgumentParser(prog="space-stream-benchmark",
+                                           description="Performance benchmarks for space-stream.")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="Result file path (.json or .csv).")
+    parser.add_argument("--loglevel", type=str, default="WARNING", help="Logging level.")
+
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    _add_codec_parser(subparsers)
+    _add_compression_parser(subparsers)
+    _add_pipeline_parser(subparsers)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.loglevel.upper())
+
+    benchmarks = {
+        "codec": _run_codec,
+        "compression": _run_compression,
+        "pipeline": _run_pipeline,
+    }
+
+    results = benchmarks[args.benchmark](args)
+    print_results(results)
+
+    if args.output is not None and len(results) > 0:
+        save_results(args.output, results)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import functools
+import threading
+import types
+from typing import Callable, Dict, Tuple
+
+import numba
+
+from spacestream import codec
+
+
+class CodecKernel:
+    """
+    Wraps a numba kernel and compiles separate serial / parallel (and fastmath) variants of it on demand.
+    The variant is selected on every call by the current codec settings (ENABLE_PARALLEL, ENABLE_FAST_MATH,
+    NUM_THREADS), which allows to change them at runtime instead of at import time.
+    Compiled variants are cached on disk if ENABLE_CACHE is set.
+    """
+
+    def __init__(self, func: Callable):
+        self.func = func
+        self._dispatchers: Dict[Tuple[bool, bool], Callable] = {}
+        self._lock = threading.Lock()
+
+        functools.update_wrapper(self, func)
+
+    def __call__(self, *args):
+        parallel = codec.ENABLE_PARALLEL
+
+        # numba thread count is thread local and has to be set by the thread which runs the kernel
+        if parallel and codec.NUM_THREADS is not None and numba.get_num_threads() != codec.NUM_THREADS:
+            numba.set_num_threads(codec.NUM_THREADS)
+
+        return self.dispatcher(parallel, codec.ENABLE_FAST_MATH)(*args)
+
+    def dispatcher(self, parallel: bool, fastmath: bool) -> Callable:
+        key = (parallel, fastmath)
+        dispatcher = self._dispatchers.get(key)
+
+        if dispatcher is None:
+            with self._lock:
+                dispatcher = self._dispatchers.get(key)
+
+                if dispatcher is None:
+                    dispatcher = numba.njit(parallel=parallel, fastmath=fastmath,
+                                            cache=codec.ENABLE_CACHE)(self._create_variant(parallel, fastmath))
+                    self._dispatchers[key] = dispatcher
+
+        return dispatcher
+
+    def _create_variant(self, parallel: bool, fastmath: bool) -> Callable:
+        # every variant needs its own qualified name, otherwise the variants share the same disk cache entry
+        suffix = "parallel" if parallel else "serial"
+        if fastmath:
+            suffix += "_fastmath"
+
+        variant = types.FunctionType(self.func.__code__, self.func.__globals__, f"{self.func.__name__}_{suffix}",
+                                     self.func.__defaults__, self.func.__closure__)
+        variant.__qualname__ = f"{self.func.__qualname__}_{suffix}"
+        variant.__module__ = self.func.__module__
+        return variant
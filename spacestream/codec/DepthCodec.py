@@ -4,6 +4,8 @@ from typing import Optional
 
 import numpy as np
 
+from spacestream.pipeline.BufferPool import BufferPool
+
 
 class DepthCodec(ABC):
     def __init__(self):
@@ -11,11 +13,25 @@ class DepthCodec(ABC):
         self.encode_buffer: Optional[np.ndarray] = None
         self.decode_buffer: Optional[np.ndarray] = None
 
-    def prepare_encode_buffer(self, frame: np.ndarray):
+        # if set, encode returns a new pooled buffer for every frame (released by the caller)
+        self.buffer_pool: Optional[BufferPool] = None
+
+    def prepare_encode_buffer(self, frame: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Returns the buffer to encode into, which is either the provided output buffer, a buffer of the pool
+        or the own encode buffer.
+        """
+        if out is not None:
+            return out
+
         h, w = frame.shape[:2]
+        if self.buffer_pool is not None:
+            return self.buffer_pool.acquire((h, w, 3), np.uint8)
+
         if not isinstance(self.encode_buffer, np.ndarray) \
                 or h != self.encode_buffer.shape[0] or w != self.encode_buffer.shape[1]:
             self.encode_buffer = np.zeros(shape=(h, w, 3), dtype=np.uint8)
+        return self.encode_buffer
 
     def prepare_decode_buffer(self, frame: np.ndarray):
         h, w = frame.shape[:2]
@@ -23,8 +39,40 @@ class DepthCodec(ABC):
                 or h != self.decode_buffer.shape[0] or w != self.decode_buffer.shape[1]:
             self.decode_buffer = np.zeros(shape=(h, w), dtype=np.uint16)
 
+    def warmup(self, decode: bool = False):
+        """
+        Runs the codec on a small synthetic frame to compile (or load the cached) kernels
+        before the first camera frame arrives.
+        """
+        depth = np.linspace(0, 7000, 64).astype(np.uint16).reshape(8, 8)
+
+        # contiguous buffers and the depth region of an rgb-d frame are compiled separately
+        outputs = [np.zeros(shape=(8, 8, 3), dtype=np.uint8), np.zeros(shape=(8, 16, 3), dtype=np.uint8)[:, :8]]
+
+        # the graph uses integer ranges, tools and settings use float ranges
+        for d_min, d_max in ((500, 6000), (500.0, 6000.0)):
+            for out in outputs:
+                encoded = self.encode(depth, d_min, d_max, out=out)
+
+            if decode:
+                self.decode(np.ascontiguousarray(encoded[:, :, ::-1]), d_min, d_max)
+
+        self.encode_buffer = None
+        self.decode_buffer = None
+
+    def color_table(self, d_min: float, d_max: float) -> Optional[np.ndarray]:
+        """
+        Returns a (65536, 3) lookup table which maps every uint16 depth value onto its encoded color,
+        or None if the codec can not be expressed as a table.
+        """
+        return None
+
     @abstractmethod
-    def encode(self, depth: np.ndarray, d_min: float, d_max: float) -> np.ndarray:
+    def encode(self, depth: np.ndarray, d_min: float, d_max: float, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Encodes the depth into an rgb image. If out (e.g. a region of the output frame) is provided,
+        the result is written into it, otherwise into the encode buffer (see prepare_encode_buffer).
+        """
         pass
 
     @abstractmethod
@@ -19,8 +19,14 @@ def _init_inverse_hue():
     return InverseHueColorization()
 
 
+def _init_triangle_wave():
+    from spacestream.codec.TriangleWaveCodec import TriangleWaveCodec
+    return TriangleWaveCodec()
+
+
 class DepthCodecType(Enum):
     Linear = partial(_init_linear_codec)
     UniformHue = partial(_init_uniform_hue)
     InverseHue = partial(_init_inverse_hue)
+    TriangleWave = partial(_init_triangle_wave)
     RSColorizer = RealSenseColorizer
@@ -0,0 +1,157 @@
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from numba import njit, prange
+
+from spacestream.codec.CodecKernel import CodecKernel
+
+# output rows per parallel chunk, every chunk has its own scratch rows for the median filter
+ROWS_PER_CHUNK = 16
+
+
+@njit(inline="always")
+def _median3(a, b, c):
+    return max(min(a, b), min(max(a, b), c))
+
+
+@njit(inline="always")
+def _median_row(depth: np.ndarray, sy: int, rows: np.ndarray) -> np.ndarray:
+    """
+    3x3 median of the depth row sy (replicated border, same as cv2.medianBlur). The scratch rows hold the
+    vertically sorted columns (low, mid, high) and the filtered row, which is returned.
+    """
+    dh, dw = depth.shape[:2]
+    low = rows[0]
+    mid = rows[1]
+    high = rows[2]
+    filtered = rows[3]
+
+    top = depth[max(sy - 1, 0)]
+    center = depth[sy]
+    bottom = depth[min(sy + 1, dh - 1)]
+
+    for x in range(dw):
+        a = top[x]
+        b = center[x]
+        c = bottom[x]
+
+        low[x + 1] = min(a, b, c)
+        mid[x + 1] = _median3(a, b, c)
+        high[x + 1] = max(a, b, c)
+
+    low[0], mid[0], high[0] = low[1], mid[1], high[1]
+    low[dw + 1], mid[dw + 1], high[dw + 1] = low[dw], mid[dw], high[dw]
+
+    # median of 9 = median of (max of lows, median of mids, min of highs)
+    for x in range(dw):
+        filtered[x] = _median3(max(low[x], low[x + 1], low[x + 2]),
+                               _median3(mid[x], mid[x + 1], mid[x + 2]),
+                               min(high[x], high[x + 1], high[x + 2]))
+
+    return filtered
+
+
+class FusedDepthEncoder:
+    """
+    Runs median filtering, resizing, masking and encoding of a raw uint16 depth buffer in a single pass.
+    The encoding (including clamping to the range) is done by the color table of the codec (see DepthCodec.color_table).
+    """
+
+    def __init__(self):
+        self.encode_buffer: Optional[np.ndarray] = None
+
+        self._map_key: Optional[Tuple[int, int, int, int]] = None
+        self._x_map: Optional[np.ndarray] = None
+        self._y_map: Optional[np.ndarray] = None
+
+        # scratch rows of the median filter per chunk (low, mid, high, filtered row)
+        self._scratch: Optional[np.ndarray] = None
+
+        # numba needs a typed array even if masking is disabled
+        self._empty_mask = np.zeros(shape=(1, 1), dtype=np.uint8)
+
+    @staticmethod
+    def supports(depth) -> bool:
+        return isinstance(depth, np.ndarray) and depth.dtype == np.uint16 and depth.ndim == 2
+
+    def encode(self, depth: np.ndarray, color_table: np.ndarray, size: Tuple[int, int],
+               mask: Optional[np.ndarray] = None, median_filter: bool = False,
+               out: Optional[np.ndarray] = None) -> np.ndarray:
+        w, h = size
+        self._prepare(depth, w, h, allocate=out is None)
+        result = out if out is not None else self.encode_buffer
+
+        use_mask = mask is not None
+        if use_mask and (mask.shape[0] != h or mask.shape[1] != w):
+            mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
+
+        self._fused_encode(depth, result, color_table, self._x_map, self._y_map,
+                           mask if use_mask else self._empty_mask, use_mask, median_filter, self._scratch)
+        return result
+
+    def warmup(self, color_table: np.ndarray):
+        depth = np.zeros(shape=(8, 8), dtype=np.uint16)
+        mask = np.zeros(shape=(8, 8), dtype=np.uint8)
+        self.encode(depth, color_table, (8, 8), mask, median_filter=True)
+        self.encode(depth, color_table, (8, 8), mask, median_filter=True,
+                    out=np.zeros(shape=(8, 16, 3), dtype=np.uint8)[:, :8])
+
+        self.encode_buffer = None
+
+    def _prepare(self, depth: np.ndarray, w: int, h: int, allocate: bool = True):
+        if allocate and (not isinstance(self.encode_buffer, np.ndarray)
+                         or h != self.encode_buffer.shape[0] or w != self.encode_buffer.shape[1]):
+            self.encode_buffer = np.zeros(shape=(h, w, 3), dtype=np.uint8)
+
+        dh, dw = depth.shape[:2]
+        map_key = (dw, dh, w, h)
+
+        if self._map_key != map_key:
+            # nearest neighbour sampling positions (pixel centers) of the output inside the depth buffer
+            self._x_map = np.minimum(((np.arange(w) + 0.5) * dw / w).astype(np.int32), dw - 1)
+            self._y_map = np.minimum(((np.arange(h) + 0.5) * dh / h).astype(np.int32), dh - 1)
+            self._map_key = map_key
+
+            chunks = (h + ROWS_PER_CHUNK - 1) // ROWS_PER_CHUNK
+            self._scratch = np.empty(shape=(chunks, 4, dw + 2), dtype=depth.dtype)
+
+    @staticmethod
+    @CodecKernel
+    def _fused_encode(depth: np.ndarray, result: np.ndarray, color_table: np.ndarray,
+                      x_map: np.ndarray, y_map: np.ndarray, mask: np.ndarray,
+                      use_mask: bool, median_filter: bool, scratch: np.ndarray):
+        h, w = result.shape[:2]
+
+        for chunk in prange(scratch.shape[0]):
+            rows = scratch[chunk]
+
+            # upscaled output rows share their source row, the filtered row is only computed once
+            last_sy = -1
+
+            for y in range(chunk * ROWS_PER_CHUNK, min((chunk + 1) * ROWS_PER_CHUNK, h)):
+                sy = y_map[y]
+
+                if not median_filter:
+                    row = depth[sy]
+                elif sy == last_sy:
+                    row = rows[3]
+                else:
+                    row = _median_row(depth, sy, rows)
+                    last_sy = sy
+
+                out = result[y]
+                mask_row = mask[y] if use_mask else mask[0]
+
+                for x in range(w):
+                    if use_mask and mask_row[x] == 0:
+                        out[x, 0] = 0
+                        out[x, 1] = 0
+                        out[x, 2] = 0
+                        continue
+
+                    d = row[x_map[x]]
+
+                    out[x, 0] = color_table[d, 0]
+                    out[x, 1] = color_table[d, 1]
+                    out[x, 2] = color_table[d, 2]
@@ -0,0 +1,233 @@
+from functools import lru_cache
+
+import numpy as np
+from numba import njit, prange
+
+from spacestream import codec
+from spacestream.codec.CodecKernel import CodecKernel
+
+INDEPENDENT_VALUES = 1529
+
+# one additional palette entry (black) for depth values outside of the encoded range
+INVALID_INDEX = INDEPENDENT_VALUES + 1
+
+DEPTH_TABLE_SIZE = pow(2, 16)
+COLOR_TABLE_SIZE = pow(2, 24)
+RANGE_TABLE_CACHE_SIZE = 16
+
+
+def _hue_color(d_norm: int) -> (int, int, int):
+    r, g, b = 0, 0, 0
+
+    # red
+    if 0 <= d_norm <= 255 or 1275 < d_norm <= 1529:
+        r = 255
+    elif 255 < d_norm <= 510:
+        r = 255 - d_norm
+    elif 510 < d_norm <= 1020:
+        r = 0
+    elif 1020 < d_norm <= 1275:
+        r = d_norm - 1020
+
+    # green
+    if 0 < d_norm <= 255:
+        g = d_norm
+    elif 255 < d_norm <= 765:
+        g = 255
+    elif 765 < d_norm <= 1020:
+        g = 765 - d_norm
+    elif d_norm > 1020:
+        g = 0
+
+    # blue
+    if 0 < d_norm <= 510:
+        b = 0
+    elif 510 < d_norm <= 765:
+        b = d_norm - 510
+    elif 765 < d_norm <= 1275:
+        b = 255
+    elif 1275 < d_norm <= 1529:
+        b = 1529 - d_norm
+
+    # wrap into byte range the same way the numba kernels store into uint8
+    return r & 0xFF, g & 0xFF, b & 0xFF
+
+
+@lru_cache(maxsize=1)
+def create_hue_palette() -> np.ndarray:
+    """
+    Creates the bgr palette of all hue colors, indexed by the normalized depth (d_norm).
+    The last entry (INVALID_INDEX) is black and used for values outside the encoded range.
+    """
+    palette = np.zeros(shape=(INVALID_INDEX + 1, 3), dtype=np.uint8)
+
+    for d_norm in range(INDEPENDENT_VALUES + 1):
+        r, g, b = _hue_color(d_norm)
+        palette[d_norm] = (b, g, r)
+
+    palette.setflags(write=False)
+    return palette
+
+
+@lru_cache(maxsize=RANGE_TABLE_CACHE_SIZE)
+def create_depth_index_table(d_min: float, d_max: float, inverse_transform: bool) -> np.ndarray:
+    """
+    Creates a lookup table which maps every uint16 depth value onto its palette index for the given range.
+    """
+    d = np.arange(DEPTH_TABLE_SIZE, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if inverse_transform:
+            disp = 1 / d
+            disp_max = 1 / d_min
+            disp_min = 1 / d_max
+
+            d_norm = np.round((disp - disp_min) / (disp_max - disp_min) * INDEPENDENT_VALUES)
+
+            # no-data points are encoded as d_norm 0 (same as the per-pixel kernel)
+            d_norm[0] = 0
+        else:
+            d_norm = np.round(((d - d_min) / (d_max - d_min)) * INDEPENDENT_VALUES)
+
+    valid = np.isfinite(d_norm) & (d_norm >= 0) & (d_norm <= INDEPENDENT_VALUES)
+
+    table = np.full(DEPTH_TABLE_SIZE, INVALID_INDEX, dtype=np.uint16)
+    table[valid] = d_norm[valid]
+
+    table.setflags(write=False)
+    return table
+
+
+@lru_cache(maxsize=RANGE_TABLE_CACHE_SIZE)
+def create_depth_color_table(d_min: float, d_max: float, inverse_transform: bool) -> np.ndarray:
+    """
+    Creates a lookup table which maps every uint16 depth value directly onto its bgr color for the given range.
+    """
+    table = create_hue_palette()[create_depth_index_table(d_min, d_max, inverse_transform)]
+
+    table.setflags(write=False)
+    return table
+
+
+@njit(cache=True)
+def _fill_color_table(table: np.ndarray):
+    for i in range(table.shape[0]):
+        r = (i >> 16) & 0xFF
+        g = (i >> 8) & 0xFF
+        b = i & 0xFF
+
+        d_norm = 0
+
+        # paper version
+        if r >= g and r >= b and g >= b:
+            d_norm = g - b
+        elif r >= g and r >= b and g < b:
+            d_norm = g - b + 1529
+        elif g >= r and g >= b:
+            d_norm = b - r + 510
+        elif b >= g and b >= r:
+            d_norm = r - g + 1020
+
+        table[i] = d_norm
+
+
+@lru_cache(maxsize=1)
+def create_color_index_table() -> np.ndarray:
+    """
+    Creates a lookup table which maps every 24-bit rgb color onto its normalized depth (d_norm).
+    The table is indexed by (r << 16) | (g << 8) | b and uses 32 MB, which is why it is only created on first decode.
+    """
+    table = np.zeros(COLOR_TABLE_SIZE, dtype=np.uint16)
+    _fill_color_table(table)
+
+    table.setflags(write=False)
+    return table
+
+
+@CodecKernel
+def _fill_recovery_table(table: np.ndarray, d_min: float, d_max: float, inverse_transform: bool):
+    # same expression (and compiler flags) as the per-pixel decode kernel, fastmath changes the rounding
+    for i in prange(table.shape[0]):
+        d_norm = int(i)
+
+        if inverse_transform:
+            disp_max = 1 / d_min
+            disp_min = 1 / d_max
+            d_recovery = INDEPENDENT_VALUES / ((INDEPENDENT_VALUES * disp_min) + (disp_max - disp_min) * d_norm)
+        else:
+            d_recovery = d_min + (((d_max - d_min) * d_norm) / INDEPENDENT_VALUES)
+        table[i] = d_recovery
+
+
+@lru_cache(maxsize=RANGE_TABLE_CACHE_SIZE)
+def _create_depth_recovery_table(d_min: float, d_max: float, inverse_transform: bool,
+                                 fast_math: bool) -> np.ndarray:
+    d_recovery = np.zeros(INDEPENDENT_VALUES + 1, dtype=np.float64)
+    _fill_recovery_table(d_recovery, d_min, d_max, inverse_transform)
+
+    table = np.clip(d_recovery, 0, DEPTH_TABLE_SIZE - 1).astype(np.uint16)
+
+    table.setflags(write=False)
+    return table
+
+
+def create_depth_recovery_table(d_min: float, d_max: float, inverse_transform: bool) -> np.ndarray:
+    """
+    Creates a lookup table which maps every normalized depth (d_norm) back onto its uint16 depth for the given range.
+    The table is calculated by a kernel with the current fastmath setting, so it matches the per-pixel decode.
+    """
+    return _create_depth_recovery_table(d_min, d_max, inverse_transform, codec.ENABLE_FAST_MATH)
+
+
+class HueLookupEngine:
+    """
+    Table driven implementation of the hue colorization codec. The palette and the per-range depth tables
+    are calculated once, which reduces the per-pixel work to a lookup.
+    """
+
+    def __init__(self, inverse_transform: bool = False):
+        self.inverse_transform = inverse_transform
+        self.palette = create_hue_palette()
+
+    @staticmethod
+    def supports(depth: np.ndarray) -> bool:
+        return depth.dtype == np.uint16
+
+    @staticmethod
+    def supports_decode(frame: np.ndarray) -> bool:
+        return frame.dtype == np.uint8 and frame.ndim == 3 and frame.shape[2] >= 3
+
+    def color_table(self, d_min: float, d_max: float) -> np.ndarray:
+        return create_depth_color_table(float(d_min), float(d_max), self.inverse_transform)
+
+    def encode(self, depth: np.ndarray, result: np.ndarray, d_min: float, d_max: float):
+        index_table = create_depth_index_table(float(d_min), float(d_max), self.inverse_transform)
+        self._lookup_encode(depth, result, index_table, self.palette)
+
+    @staticmethod
+    @CodecKernel
+    def _lookup_encode(depth: np.ndarray, result: np.ndarray, index_table: np.ndarray, palette: np.ndarray):
+        h, w = depth.shape[:2]
+
+        for y in prange(h):
+            for x in range(w):
+                index = index_table[depth[y, x]]
+
+                result[y, x, 0] = palette[index, 0]
+                result[y, x, 1] = palette[index, 1]
+                result[y, x, 2] = palette[index, 2]
+
+    def decode(self, frame: np.ndarray, result: np.ndarray, d_min: float, d_max: float):
+        color_table = create_color_index_table()
+        recovery_table = create_depth_recovery_table(float(d_min), float(d_max), self.inverse_transform)
+        self._lookup_decode(frame, result, color_table, recovery_table)
+
+    @staticmethod
+    @CodecKernel
+    def _lookup_decode(frame: np.ndarray, result: np.ndarray, color_table: np.ndarray, recovery_table: np.ndarray):
+        h, w = frame.shape[:2]
+
+        for y in prange(h):
+            for x in range(w):
+                key = (np.int32(frame[y, x, 0]) << 16) | (np.int32(frame[y, x, 1]) << 8) | np.int32(frame[y, x, 2])
+                result[y, x] = recovery_table[color_table[key]]
@@ -1,20 +1,52 @@
+from functools import lru_cache
+from typing import Optional
+
 import numpy as np
-from numba import njit, prange
+from numba import prange
 
-from spacestream.codec import ENABLE_FAST_MATH, ENABLE_PARALLEL
+from spacestream.codec.CodecKernel import CodecKernel
 from spacestream.codec.DepthCodec import DepthCodec
 
 INDEPENDENT_VALUES = pow(2, 16) - 1
+DEPTH_TABLE_SIZE = pow(2, 16)
+
+
+@lru_cache(maxsize=16)
+def create_linear_color_table(d_min: float, d_max: float) -> np.ndarray:
+    """
+    Creates a lookup table which maps every uint16 depth value onto the same bgr output as _pencode.
+    """
+    d = np.arange(DEPTH_TABLE_SIZE, dtype=np.float64)
+
+    # set 0 (no-data points) to max value
+    d[0] = d_max
+
+    d = np.clip(d, d_min, d_max)
+
+    d = (d - d_min) * INDEPENDENT_VALUES
+    d = INDEPENDENT_VALUES - d
+    d = np.trunc(d / (d_max - d_min)).astype(np.int64)
+
+    table = np.zeros(shape=(DEPTH_TABLE_SIZE, 3), dtype=np.uint8)
+    table[:, 2] = d // 256 & 0xFF
+    table[:, 1] = (d >> 8) & 0xFF
+    table[:, 0] = d & 0xFF
+
+    table.setflags(write=False)
+    return table
 
 
 class LinearCodec(DepthCodec):
-    def encode(self, depth: np.ndarray, d_min: float, d_max: float) -> np.ndarray:
-        super().prepare_encode_buffer(depth)
-        self._pencode(depth, self.encode_buffer, d_min, d_max)
-        return self.encode_buffer
+    def color_table(self, d_min: float, d_max: float) -> Optional[np.ndarray]:
+        return create_linear_color_table(float(d_min), float(d_max))
+
+    def encode(self, depth: np.ndarray, d_min: float, d_max: float, out: Optional[np.ndarray] = None) -> np.ndarray:
+        result = super().prepare_encode_buffer(depth, out)
+        self._pencode(depth, result, d_min, d_max)
+        return result
 
     @staticmethod
-    @njit(parallel=ENABLE_PARALLEL, fastmath=ENABLE_FAST_MATH)
+    @CodecKernel
     def _pencode(depth: np.ndarray, result: np.ndarray, d_min: float, d_max: float):
         h, w = depth.shape[:2]
 
@@ -56,7 +88,7 @@ class LinearCodec(DepthCodec):
             self.decode_buffer[:, :] = (g << 8 | b)
 
         # stretch buffer
-        norm_depth = 1.0 - (self.decode_buffer.astype(np.float) / INDEPENDENT_VALUES)
+        norm_depth = 1.0 - (self.decode_buffer.astype(np.float64) / INDEPENDENT_VALUES)
         self.decode_buffer[:, :] = ((d_max * norm_depth) + d_min).astype(np.uint16)
 
         return self.decode_buffer
@@ -0,0 +1,228 @@
+import struct
+from typing import Optional
+
+import numpy as np
+from numba import njit
+
+from spacestream.codec import InvalidDataException
+
+MAGIC = b"RVLD"
+VERSION = 1
+
+# magic, version, flags, reserved, width, height, payload size (bytes)
+HEADER_FORMAT = "<4sBBHIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# frame contains the difference to the previous frame instead of the depth values
+FLAG_DELTA = 1
+
+
+@njit(inline="always")
+def _write_vle(output: np.ndarray, nibble_index: int, value: int) -> int:
+    # variable length encoding with 3 data bits and 1 continuation bit per nibble
+    while True:
+        nibble = value & 0x7
+        value >>= 3
+
+        if value != 0:
+            nibble |= 0x8
+
+        if nibble_index & 1 == 0:
+            output[nibble_index >> 1] = nibble
+        else:
+            output[nibble_index >> 1] |= nibble << 4
+
+        nibble_index += 1
+
+        if value == 0:
+            return nibble_index
+
+
+@njit(inline="always")
+def _read_vle(data: np.ndarray, nibble_index: int) -> (int, int):
+    value = 0
+    shift = 0
+
+    while True:
+        if nibble_index >> 1 >= data.shape[0]:
+            raise ValueError("RVL data ended unexpectedly")
+
+        nibble = (data[nibble_index >> 1] >> ((nibble_index & 1) * 4)) & 0xF
+        nibble_index += 1
+
+        value |= (nibble & 0x7) << shift
+        shift += 3
+
+        if nibble & 0x8 == 0:
+            return value, nibble_index
+
+
+@njit(cache=True)
+def _rvl_encode(depth: np.ndarray, previous: np.ndarray, use_previous: bool, output: np.ndarray) -> int:
+    n = depth.shape[0]
+    nibble_index = 0
+    last_value = 0
+
+    i = 0
+    while i < n:
+        # zero values are no-data points (key frame) or unchanged points (delta frame)
+        zeros = 0
+        while i < n and (depth[i] == previous[i] if use_previous else depth[i] == 0):
+            zeros += 1
+            i += 1
+
+        j = i
+        while j < n and (depth[j] != previous[j] if use_previous else depth[j] != 0):
+            j += 1
+
+        nibble_index = _write_vle(output, nibble_index, zeros)
+        nibble_index = _write_vle(output, nibble_index, j - i)
+
+        for k in range(i, j):
+            if use_previous:
+                # temporal residual
+                delta = np.int32(depth[k]) - np.int32(previous[k])
+            else:
+                # spatial delta to the last valid value
+                value = np.int32(depth[k])
+                delta = value - last_value
+                last_value = value
+
+            # zigzag encoding of the signed delta
+            nibble_index = _write_vle(output, nibble_index, (delta << 1) ^ (delta >> 31))
+
+        i = j
+
+    return (nibble_index + 1) >> 1
+
+
+@njit(cache=True)
+def _rvl_decode(data: np.ndarray, result: np.ndarray, use_previous: bool):
+    n = result.shape[0]
+    nibble_index = 0
+    last_value = 0
+
+    i = 0
+    while i < n:
+        zeros, nibble_index = _read_vle(data, nibble_index)
+        count, nibble_index = _read_vle(data, nibble_index)
+
+        if zeros + count > n - i:
+            raise ValueError("RVL data exceeds the frame size")
+
+        # result already contains the previous frame in delta mode
+        if not use_previous:
+            for k in range(i, i + zeros):
+                result[k] = 0
+        i += zeros
+
+        for k in range(i, i + count):
+            zigzag, nibble_index = _read_vle(data, nibble_index)
+            delta = (zigzag >> 1) ^ -(zigzag & 1)
+
+            if use_previous:
+                result[k] = np.int32(result[k]) + delta
+            else:
+                last_value += delta
+                result[k] = last_value
+        i += count
+
+
+class RVLCodec:
+    """
+    Lossless run-length / variable-length compression of uint16 depth buffers, based on
+    A. Wilson, "Fast Lossless Depth Image Compression" (RVL). Runs of no-data points are stored as counts and
+    valid points as zigzag encoded deltas in 4-bit variable length codes.
+
+    With temporal_delta enabled, frames between key frames only store the difference to the previous frame,
+    which makes static parts of the scene almost free. The decoder has to receive every frame in order then
+    (call reset to force a new key frame, e.g. after a dropped frame).
+
+    The returned arrays are reused by the next call.
+    """
+
+    def __init__(self, temporal_delta: bool = False, key_frame_interval: int = 30):
+        self.temporal_delta = temporal_delta
+        self.key_frame_interval = key_frame_interval
+
+        self.encode_buffer: Optional[np.ndarray] = None
+        self.decode_buffer: Optional[np.ndarray] = None
+
+        self._previous: Optional[np.ndarray] = None
+        self._frames_since_key_frame = 0
+        self._has_decoded_frame = False
+
+    def reset(self):
+        self._previous = None
+        self._has_decoded_frame = False
+
+    def encode(self, depth: np.ndarray) -> np.ndarray:
+        if depth.dtype != np.uint16 or depth.ndim != 2:
+            raise InvalidDataException(f"RVL Codec: only 2D uint16 depth buffers are supported ({depth.dtype}).")
+
+        h, w = depth.shape
+        n = w * h
+
+        # worst case: two run lengths and a 17-bit delta (6 nibbles) per pixel
+        max_size = HEADER_SIZE + n * 5 + 8
+        if self.encode_buffer is None or self.encode_buffer.shape[0] < max_size:
+            self.encode_buffer = np.empty(max_size, dtype=np.uint8)
+
+        depth = np.ascontiguousarray(depth)
+
+        use_previous = self.temporal_delta and self._previous is not None \
+                       and self._previous.shape == depth.shape and self._frames_since_key_frame < self.key_frame_interval
+        previous = self._previous if use_previous else depth
+
+        payload_size = _rvl_encode(depth.reshape(-1), previous.reshape(-1), use_previous,
+                                   self.encode_buffer[HEADER_SIZE:])
+
+        flags = FLAG_DELTA if use_previous else 0
+        struct.pack_into(HEADER_FORMAT, self.encode_buffer, 0, MAGIC, VERSION, flags, 0, w, h, payload_size)
+
+        if self.temporal_delta:
+            if self._previous is None or self._previous.shape != depth.shape:
+                self._previous = np.empty_like(depth)
+            self._previous[:] = depth
+            self._frames_since_key_frame = self._frames_since_key_frame + 1 if use_previous else 1
+
+        return self.encode_buffer[:HEADER_SIZE + payload_size]
+
+    def decode(self, data: np.ndarray) -> np.ndarray:
+        if data.shape[0] < HEADER_SIZE:
+            raise InvalidDataException("RVL Codec: data is too short to contain a header.")
+
+        magic, version, flags, _, w, h, payload_size = struct.unpack_from(HEADER_FORMAT, data, 0)
+
+        if magic != MAGIC or version != VERSION:
+            raise InvalidDataException(f"RVL Codec: unsupported data ({magic}, version {version}).")
+
+        if data.shape[0] < HEADER_SIZE + payload_size:
+            raise InvalidDataException("RVL Codec: data is shorter than the payload size.")
+
+        use_previous = flags & FLAG_DELTA != 0
+
+        if self.decode_buffer is None or self.decode_buffer.shape != (h, w):
+            if use_previous:
+                raise InvalidDataException("RVL Codec: delta frame received without a previous key frame.")
+            self.decode_buffer = np.zeros(shape=(h, w), dtype=np.uint16)
+
+        if use_previous and not self._has_decoded_frame:
+            raise InvalidDataException("RVL Codec: delta frame received without a previous key frame.")
+
+        try:
+            _rvl_decode(data[HEADER_SIZE:HEADER_SIZE + payload_size], self.decode_buffer.reshape(-1), use_previous)
+        except (ValueError, IndexError) as ex:
+            self._has_decoded_frame = False
+            raise InvalidDataException(f"RVL Codec: corrupted data ({ex}).")
+
+        self._has_decoded_frame = True
+        return self.decode_buffer
+
+    def warmup(self):
+        depth = np.linspace(0, 7000, 64).astype(np.uint16).reshape(8, 8)
+        depth[0, :4] = 0
+
+        codec = RVLCodec(temporal_delta=True)
+        codec.decode(codec.encode(depth))
+        codec.decode(codec.encode(depth))
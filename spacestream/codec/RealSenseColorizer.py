@@ -1,3 +1,5 @@
+from typing import Optional
+
 import cv2
 import numpy as np
 
@@ -12,7 +14,11 @@ class RealSenseColorizer(DepthCodec):
         self.colorizer.set_option(rs.option.color_scheme, 9.0)
         self.colorizer.set_option(rs.option.histogram_equalization_enabled, 0)
 
-    def encode(self, depth: rs.depth_frame, d_min: float, d_max: float) -> np.ndarray:
+    def warmup(self, decode: bool = False):
+        # colorizer works on realsense frames and does not need to be compiled
+        pass
+
+    def encode(self, depth: rs.depth_frame, d_min: float, d_max: float, out: Optional[np.ndarray] = None) -> np.ndarray:
         self.colorizer.set_option(rs.option.min_distance, d_min / 1000)
         self.colorizer.set_option(rs.option.max_distance, d_max / 1000)
 
@@ -22,6 +28,10 @@ class RealSenseColorizer(DepthCodec):
 
         # replace red color
         result[np.all(result == (0, 0, 255), axis=-1)] = (0, 0, 0)
+
+        if out is not None:
+            np.copyto(out, result)
+            return out
         return result
 
     def decode(self, depth: np.ndarray, d_min: float, d_max: float) -> np.ndarray:
@@ -0,0 +1,148 @@
+import math
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from numba import prange
+
+from spacestream.codec.CodecKernel import CodecKernel
+from spacestream.codec.DepthCodec import DepthCodec
+
+INDEPENDENT_VALUES = pow(2, 16)
+DEPTH_TABLE_SIZE = pow(2, 16)
+
+# period of the triangle waves in depth levels (of INDEPENDENT_VALUES)
+DEFAULT_PERIOD = 4096
+
+
+class TriangleWaveCodec(DepthCodec):
+    """
+    This codec implements the multi-wave encoding of Pece et al.:
+    Adapting Standard Video Codecs for Depth Streaming (https://doi.org/10.2312/EGVE/JVRC11/059-066)
+
+    The normalized depth L is stored in the green channel and two phase shifted triangle waves (Ha, Hb) of L
+    in the red and blue channel. Other than the byte split of the linear codec, all channels are continuous
+    functions of the depth, which keeps the error small if video compression or chroma subsampling smooths them.
+    L only has to select the period (it may be off by period / 8), the precise depth comes from the waves.
+
+    No-data points (0) are encoded as d_max, the same as in the linear codec.
+    """
+
+    def __init__(self, period: int = DEFAULT_PERIOD):
+        super().__init__()
+        self.period = period
+
+    def color_table(self, d_min: float, d_max: float) -> Optional[np.ndarray]:
+        return create_triangle_wave_color_table(float(d_min), float(d_max), self.period)
+
+    def encode(self, depth: np.ndarray, d_min: float, d_max: float, out: Optional[np.ndarray] = None) -> np.ndarray:
+        result = super().prepare_encode_buffer(depth, out)
+
+        # the color table is exact for uint16 depth buffers and avoids the per-pixel wave calculation
+        if depth.dtype == np.uint16:
+            self._table_encode(depth, result, self.color_table(d_min, d_max))
+        else:
+            self._pencode(depth, result, d_min, d_max, self.period / INDEPENDENT_VALUES)
+        return result
+
+    @staticmethod
+    @CodecKernel
+    def _table_encode(depth: np.ndarray, result: np.ndarray, color_table: np.ndarray):
+        h, w = depth.shape[:2]
+
+        for y in prange(h):
+            for x in range(w):
+                d = depth[y, x]
+
+                result[y, x, 0] = color_table[d, 0]
+                result[y, x, 1] = color_table[d, 1]
+                result[y, x, 2] = color_table[d, 2]
+
+    @staticmethod
+    @CodecKernel
+    def _pencode(depth: np.ndarray, result: np.ndarray, d_min: float, d_max: float, p: float):
+        h, w = depth.shape[:2]
+
+        d_value = d_max - d_min
+
+        for y in prange(h):
+            for x in range(w):
+                d = depth[y, x]
+
+                # set 0 (no-data points) to max value
+                if d == 0:
+                    d = d_max
+
+                d = min(max(d, d_min), d_max)
+
+                # normalized depth (centered inside its level)
+                level = math.floor((d - d_min) / d_value * (INDEPENDENT_VALUES - 1))
+                l_value = (level + 0.5) / INDEPENDENT_VALUES
+
+                # triangle waves with period p, hb is shifted by a quarter period
+                ha = (l_value / (p / 2)) % 2
+                if ha > 1:
+                    ha = 2 - ha
+
+                hb = ((l_value - p / 4) / (p / 2)) % 2
+                if hb > 1:
+                    hb = 2 - hb
+
+                # bgr output encoding
+                result[y, x, 2] = round(ha * 255)
+                result[y, x, 1] = round(l_value * 255)
+                result[y, x, 0] = round(hb * 255)
+
+    def decode(self, depth: np.ndarray, d_min: float, d_max: float) -> np.ndarray:
+        super().prepare_decode_buffer(depth)
+        self._pdecode(depth, self.decode_buffer, d_min, d_max, self.period / INDEPENDENT_VALUES)
+        return self.decode_buffer
+
+    @staticmethod
+    @CodecKernel
+    def _pdecode(depth: np.ndarray, result: np.ndarray, d_min: float, d_max: float, p: float):
+        h, w = depth.shape[:2]
+
+        half_period = p / 2
+        quarter_scale = 4 / p / 255
+        scale = (d_max - d_min) / (INDEPENDENT_VALUES - 1)
+
+        for y in prange(h):
+            for x in range(w):
+                # frame comes in as RGB (R=ha, G=l, B=hb)
+                ha = depth[y, x, 0] / 255
+                hb = depth[y, x, 2] / 255
+
+                # quarter period in which one of the waves is linear (l0 = start of the quarter)
+                quarter = math.floor(depth[y, x, 1] * quarter_scale - 0.5)
+                m = quarter & 3
+                l0 = quarter * (p / 4)
+
+                if m == 0:
+                    delta = half_period * ha
+                elif m == 1:
+                    delta = half_period * hb
+                elif m == 2:
+                    delta = half_period * (1 - ha)
+                else:
+                    delta = half_period * (1 - hb)
+
+                level = (l0 + delta) * INDEPENDENT_VALUES - 0.5
+                level = min(max(level, 0.0), INDEPENDENT_VALUES - 1.0)
+
+                result[y, x] = round(d_min + level * scale)
+
+
+@lru_cache(maxsize=16)
+def create_triangle_wave_color_table(d_min: float, d_max: float, period: int) -> np.ndarray:
+    """
+    Creates a lookup table which maps every uint16 depth value onto the same bgr output as _pencode.
+    """
+    depth = np.arange(DEPTH_TABLE_SIZE, dtype=np.uint16).reshape(1, -1)
+    table = np.zeros(shape=(1, DEPTH_TABLE_SIZE, 3), dtype=np.uint8)
+
+    TriangleWaveCodec._pencode(depth, table, d_min, d_max, period / INDEPENDENT_VALUES)
+
+    table = table.reshape(DEPTH_TABLE_SIZE, 3)
+    table.setflags(write=False)
+    return table
@@ -1,12 +1,15 @@
+from typing import Optional
+
 import numpy as np
-from numba import njit, prange
+from numba import prange
 
-from spacestream.codec import ENABLE_FAST_MATH, ENABLE_PARALLEL, InvalidRangeException
+from spacestream.codec import InvalidRangeException
+from spacestream.codec.CodecKernel import CodecKernel
 from spacestream.codec.DepthCodec import DepthCodec
+from spacestream.codec.HueLookupEngine import HueLookupEngine
 
 INDEPENDENT_VALUES = 1529
 
-print(f"PARALLEL FLAG: {ENABLE_PARALLEL}")
 
 class UniformHueColorization(DepthCodec):
     """
@@ -14,22 +17,39 @@ class UniformHueColorization(DepthCodec):
     https://dev.intelrealsense.com/docs/depth-image-compression-by-colorization-for-intel-realsense-depth-cameras
     """
 
-    def __init__(self, inverse_transform: bool = False):
+    def __init__(self, inverse_transform: bool = False, use_lookup_table: bool = True):
         super().__init__()
         self.inverse_transform = inverse_transform
+        self.use_lookup_table = use_lookup_table
+
+        self.lookup_engine = HueLookupEngine(inverse_transform)
+
+    def encode(self, depth: np.ndarray, d_min: float, d_max: float, out: Optional[np.ndarray] = None) -> np.ndarray:
+        result = super().prepare_encode_buffer(depth, out)
+
+        # check divide by zero
+        if self.inverse_transform and (d_min == 0 or d_max == 0):
+            raise InvalidRangeException(f"Hue Codec: d_min ({d_min}) and d_max ({d_max}) are not allowed to be 0.")
+
+        # lookup tables are only available for uint16 depth buffers
+        if self.use_lookup_table and self.lookup_engine.supports(depth):
+            self.lookup_engine.encode(depth, result, d_min, d_max)
+        else:
+            self._pencode(depth, result, d_min, d_max, self.inverse_transform)
+        return result
 
-    def encode(self, depth: np.ndarray, d_min: float, d_max: float) -> np.ndarray:
-        super().prepare_encode_buffer(depth)
+    def color_table(self, d_min: float, d_max: float) -> Optional[np.ndarray]:
+        if not self.use_lookup_table:
+            return None
 
         # check divide by zero
         if self.inverse_transform and (d_min == 0 or d_max == 0):
             raise InvalidRangeException(f"Hue Codec: d_min ({d_min}) and d_max ({d_max}) are not allowed to be 0.")
 
-        self._pencode(depth, self.encode_buffer, d_min, d_max, self.inverse_transform)
-        return self.encode_buffer
+        return self.lookup_engine.color_table(d_min, d_max)
 
     @staticmethod
-    @njit(parallel=ENABLE_PARALLEL, fastmath=ENABLE_FAST_MATH)
+    @CodecKernel
     def _pencode(depth: np.ndarray, result: np.ndarray, d_min: float, d_max: float, inverse_transform: bool):
         h, w = depth.shape[:2]
 
@@ -98,11 +118,14 @@ class UniformHueColorization(DepthCodec):
         if self.inverse_transform and (d_min == 0 or d_max == 0):
             raise InvalidRangeException(f"Hue Codec: d_min ({d_min}) and d_max ({d_max}) are not allowed to be 0.")
 
-        self._pdecode(depth.astype(np.uint16), self.decode_buffer, d_min, d_max, self.inverse_transform)
+        if self.use_lookup_table and self.lookup_engine.supports_decode(depth):
+            self.lookup_engine.decode(depth, self.decode_buffer, d_min, d_max)
+        else:
+            self._pdecode(depth.astype(np.uint16), self.decode_buffer, d_min, d_max, self.inverse_transform)
         return self.decode_buffer
 
     @staticmethod
-    @njit(parallel=ENABLE_PARALLEL, fastmath=ENABLE_FAST_MATH)
+    @CodecKernel
     def _pdecode(depth: np.ndarray, result: np.ndarray, d_min: float, d_max: float, inverse_transform: bool):
         h, w = depth.shape[:2]
 
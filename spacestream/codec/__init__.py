@@ -1,6 +1,16 @@
+from typing import Optional
+
 ENABLE_PARALLEL = False
 ENABLE_FAST_MATH = True
+ENABLE_CACHE = True
+
+# number of threads used for parallel kernels (None uses the numba default)
+NUM_THREADS: Optional[int] = None
 
 
 class InvalidRangeException(Exception):
     pass
+
+
+class InvalidDataException(Exception):
+    pass
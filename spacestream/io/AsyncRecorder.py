@@ -0,0 +1,113 @@
+import logging
+import threading
+from typing import Any, Callable, Optional, Tuple, Union
+
+import numpy as np
+from visiongraph import vg
+
+from spacestream.io.RawRecordingWriter import RawRecordingWriter
+from spacestream.pipeline.BufferPool import BufferPool
+from spacestream.pipeline.DropPolicy import DropPolicy
+from spacestream.pipeline.RingBuffer import RingBuffer
+
+
+class AsyncRecorder:
+    """
+    Writes the frames of a video recorder on a separate thread, so a slow disk or a stalled encoder does not
+    slow down the live output. Frames are passed through a bounded queue, the drop policy decides what happens
+    if the writer can not keep up (only the block policy lets the caller wait for the writer).
+
+    Pooled frames are retained while they are queued and released after they have been written.
+    Video recorders receive images (add_image), the raw recording writer depth and color frames (add_frame).
+    """
+
+    def __init__(self, recorder: Union[vg.VidGearVideoRecorder, RawRecordingWriter], queue_size: int = 30,
+                 policy: DropPolicy = DropPolicy.DropNewest, buffer_pool: Optional[BufferPool] = None,
+                 poll_timeout: float = 0.1):
+        self.recorder = recorder
+        self.buffer_pool = buffer_pool
+        self.poll_timeout = poll_timeout
+
+        self.queue: RingBuffer[Tuple[Callable, Tuple[Any, ...]]] = RingBuffer(queue_size, policy, self._release)
+        self.written = 0
+
+        self._thread: Optional[threading.Thread] = None
+
+    def open(self):
+        # the recorder is opened by the writer, because starting the encoder may take a while
+        self._thread = threading.Thread(target=self._loop, name="SpaceStream-Recorder", daemon=True)
+        self._thread.start()
+
+    def add_image(self, image: np.ndarray):
+        self._submit(self.recorder.add_image, image)
+
+    def add_frame(self, depth: np.ndarray, color: np.ndarray, *args):
+        self._submit(self.recorder.add_frame, depth, color, *args)
+
+    def close(self, wait: bool = False):
+        """
+        Stops accepting frames, the queued frames are still written before the recorder is closed.
+        """
+        self.queue.close()
+
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    @property
+    def is_writing(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def queued(self) -> int:
+        return len(self.queue)
+
+    @property
+    def dropped(self) -> int:
+        return self.queue.dropped
+
+    def _loop(self):
+        try:
+            self.recorder.open()
+        except Exception as ex:
+            logging.error(f"Could not open recorder: {ex}")
+            self.queue.close()
+            self.queue.clear()
+            return
+
+        while True:
+            item = self.queue.pop(self.poll_timeout)
+
+            if item is None:
+                if self.queue.closed:
+                    break
+                continue
+
+            write, args = item
+            try:
+                write(*args)
+                self.written += 1
+            except Exception as ex:
+                logging.warning(f"Could not write frame: {ex}")
+            finally:
+                self._release(item)
+
+        self.recorder.close()
+
+    def _submit(self, write: Callable, *args):
+        if self.buffer_pool is not None:
+            for arg in args:
+                if isinstance(arg, np.ndarray):
+                    self.buffer_pool.retain(arg)
+
+        self.queue.push((write, args))
+
+    def _release(self, item: Tuple[Callable, Tuple[Any, ...]]):
+        if self.buffer_pool is None:
+            return
+
+        for arg in item[1]:
+            if isinstance(arg, np.ndarray):
+                self.buffer_pool.release(arg)
+
+    def __str__(self):
+        return f"{self.queued} queued / {self.written} written / {self.dropped} dropped"
@@ -0,0 +1,12 @@
+from dataclasses import dataclass, field
+from typing import Dict
+
+
+@dataclass
+class Metric:
+    name: str
+    value: float
+    labels: Dict[str, str] = field(default_factory=dict)
+    # prometheus metric type (gauge, counter or summary, _sum and _count belong to the summary)
+    kind: str = "gauge"
+    help: str = ""
@@ -0,0 +1,168 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+from pythonosc.osc_bundle_builder import OscBundleBuilder, IMMEDIATELY
+from pythonosc.osc_message_builder import OscMessageBuilder
+from pythonosc.udp_client import UDPClient
+
+from spacestream.io.Metric import Metric
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsExporter:
+    """
+    Publishes metrics as prometheus text over http (/metrics) and as osc telemetry (one bundle per update).
+    The metrics are collected on the exporter thread once per interval, so exporting never runs on the frame
+    thread and scrapes are answered from the last collected text.
+    """
+
+    def __init__(self, collect: Callable[[], List[Metric]], interval: float = 1.0, prefix: str = "spacestream",
+                 http_host: str = "0.0.0.0", http_port: Optional[int] = None,
+                 osc_host: str = "127.0.0.1", osc_port: Optional[int] = None,
+                 osc_address: str = "/space-stream/telemetry"):
+        self.collect = collect
+        self.interval = interval
+        self.prefix = prefix
+
+        self.http_host = http_host
+        self.http_port = http_port
+        self.osc_host = osc_host
+        self.osc_port = osc_port
+        self.osc_address = osc_address
+
+        self.text = ""
+
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._server_thread: Optional[threading.Thread] = None
+        self._osc_client: Optional[UDPClient] = None
+
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self.http_port is not None:
+            self._server = ThreadingHTTPServer((self.http_host, self.http_port), self._create_handler())
+            self._server.daemon_threads = True
+            self._server_thread = threading.Thread(target=self._server.serve_forever,
+                                                   name="SpaceStream-Metrics-HTTP", daemon=True)
+            self._server_thread.start()
+            logging.info(f"Metrics are available on http://{self.http_host}:{self._server.server_port}/metrics")
+
+        if self.osc_port is not None:
+            self._osc_client = UDPClient(self.osc_host, self.osc_port)
+            logging.info(f"Sending telemetry to {self.osc_host}:{self.osc_port}")
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name="SpaceStream-Metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+        if self._osc_client is not None:
+            self._osc_client.close()
+            self._osc_client = None
+
+    @property
+    def port(self) -> Optional[int]:
+        return None if self._server is None else self._server.server_port
+
+    def _loop(self):
+        while True:
+            self.update()
+
+            if self._stopped.wait(self.interval):
+                break
+
+    def update(self):
+        try:
+            metrics = self.collect()
+        except Exception as ex:
+            logging.warning(f"Could not collect metrics: {ex}")
+            return
+
+        self.text = self.format_prometheus(metrics)
+
+        if self._osc_client is not None:
+            try:
+                self._osc_client.send(self._create_bundle(metrics))
+            except OSError as ex:
+                logging.warning(f"Could not send telemetry: {ex}")
+
+    def format_prometheus(self, metrics: List[Metric]) -> str:
+        lines = []
+        described = set()
+
+        for metric in metrics:
+            name = f"{self.prefix}_{metric.name}"
+            family = _family(name, metric.kind)
+
+            if family not in described:
+                described.add(family)
+                if metric.help:
+                    lines.append(f"# HELP {family} {metric.help}")
+                lines.append(f"# TYPE {family} {metric.kind}")
+
+            if metric.labels:
+                labels = ",".join(f'{k}="{_escape(str(v))}"' for k, v in metric.labels.items())
+                lines.append(f"{name}{{{labels}}} {metric.value}")
+            else:
+                lines.append(f"{name} {metric.value}")
+
+        return "\n".join(lines) + "\n"
+
+    def _create_bundle(self, metrics: List[Metric]):
+        bundle = OscBundleBuilder(IMMEDIATELY)
+
+        for metric in metrics:
+            address = "/".join([self.osc_address, metric.name, *metric.labels.values()])
+            message = OscMessageBuilder(address=address)
+            message.add_arg(float(metric.value))
+            bundle.add_content(message.build())
+
+        return bundle.build()
+
+    def _create_handler(self):
+        exporter = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                data = exporter.text.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return MetricsRequestHandler
+
+
+def _family(name: str, kind: str) -> str:
+    if kind == "summary":
+        for suffix in ("_sum", "_count"):
+            if name.endswith(suffix):
+                return name[:-len(suffix)]
+    return name
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
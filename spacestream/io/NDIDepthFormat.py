@@ -0,0 +1,10 @@
+from enum import Enum
+
+
+class NDIDepthFormat(Enum):
+    # encoded rgb-d frame (converted to yuv by the ndi sdk)
+    BGRA = "bgra"
+    # 8-bit luma depth, 4:2:2 color
+    UYVY = "uyvy"
+    # 16-bit luma depth, 4:2:2 color
+    P216 = "p216"
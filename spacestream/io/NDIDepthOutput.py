@@ -0,0 +1,45 @@
+import numpy as np
+from cyndilib import FourCC
+from visiongraph_ndi.NDIVideoOutput import NDIVideoOutput
+
+from spacestream.io.NDIDepthFormat import NDIDepthFormat
+
+FOURCC_FORMATS = {
+    NDIDepthFormat.BGRA: FourCC.BGRA,
+    NDIDepthFormat.UYVY: FourCC.UYVY,
+    NDIDepthFormat.P216: FourCC.P216,
+}
+
+
+class NDIDepthOutput(NDIVideoOutput):
+    """
+    NDI output which additionally accepts frames that are already packed in a yuv format (see YUVDepthPacker),
+    which are handed to the sender without any color conversion.
+    """
+
+    def send_packed(self, data: np.ndarray, width: int, height: int, depth_format: NDIDepthFormat):
+        fourcc = FOURCC_FORMATS[depth_format]
+        x_res, y_res = self.video_send_frame.get_resolution()
+
+        if x_res != width or y_res != height or self.fourcc != fourcc:
+            self.width = width
+            self.height = height
+            self.fourcc = fourcc
+
+            # reset sender
+            self._reset_sender()
+
+        self.video_send_frame.write_data(data[:self.video_send_frame.get_data_size()])
+        self.sender.send_video_async()
+
+    def send(self, frame: np.ndarray, flip_texture: bool = False):
+        # switch back to bgra if packed frames have been sent before
+        if self.fourcc != FourCC.BGRA:
+            self.fourcc = FourCC.BGRA
+            self._reset_sender()
+
+        super().send(frame, flip_texture)
+
+    @staticmethod
+    def create(name: str) -> "NDIDepthOutput":
+        return NDIDepthOutput(name)
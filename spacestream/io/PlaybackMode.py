@@ -0,0 +1,10 @@
+from enum import Enum
+
+
+class PlaybackMode(Enum):
+    # frames are played at the recorded timing, frames are skipped if the pipeline is too slow
+    Realtime = "realtime"
+    # every frame is played as fast as the pipeline can process it
+    Fast = "fast"
+    # the current frame is repeated until the next one is requested (step)
+    Step = "step"
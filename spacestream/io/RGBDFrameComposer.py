@@ -0,0 +1,54 @@
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from spacestream.pipeline.BufferPool import BufferPool
+
+
+class RGBDFrameComposer:
+    """
+    Composes the rgb-d frame (depth | color) in pooled output buffers. The codecs encode directly into the depth
+    region and the color frame is copied into the color region, which avoids allocating new frames every update.
+
+    The frames are leased from the buffer pool and return to it when every consumer (preview, sender, recorder)
+    has released them. The channel swapped version (for spout / syphon and the preview) is created at most once
+    per frame and lives as long as the frame.
+    """
+
+    def __init__(self, buffer_pool: Optional[BufferPool] = None):
+        self.buffer_pool = buffer_pool if buffer_pool is not None else BufferPool()
+
+    def next_frame(self, width: int, height: int) -> np.ndarray:
+        """
+        Returns a new rgb-d buffer with the size (2 * width, height) for the given color resolution,
+        which has to be released by the caller.
+        """
+        return self.buffer_pool.acquire((height, width * 2, 3), np.uint8)
+
+    @staticmethod
+    def depth_region(rgbd: np.ndarray) -> np.ndarray:
+        return rgbd[:, :rgbd.shape[1] // 2]
+
+    @staticmethod
+    def color_region(rgbd: np.ndarray) -> np.ndarray:
+        return rgbd[:, rgbd.shape[1] // 2:]
+
+    def compose(self, rgbd: np.ndarray, color: np.ndarray):
+        np.copyto(self.color_region(rgbd), color)
+
+    def swapped(self, rgbd: np.ndarray) -> np.ndarray:
+        """
+        Returns the rgb-d frame with swapped red and blue channels.
+        """
+        swapped = self.buffer_pool.attachment(rgbd, "swapped")
+        if swapped is not None:
+            return swapped
+
+        # frame has not been created by the composer
+        if not self.buffer_pool.owns(rgbd):
+            return cv2.cvtColor(rgbd, cv2.COLOR_RGB2BGR)
+
+        swapped = self.buffer_pool.acquire(rgbd.shape, rgbd.dtype)
+        cv2.cvtColor(rgbd, cv2.COLOR_RGB2BGR, dst=swapped)
+        return self.buffer_pool.attach(rgbd, "swapped", swapped)
@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class RawDepthCompression(Enum):
+    Uncompressed = "uncompressed"
+    # lossless rvl compression (key frames only, to keep every frame seekable)
+    RVL = "rvl"
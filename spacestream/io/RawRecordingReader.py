@@ -0,0 +1,106 @@
+import json
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+from spacestream.codec import InvalidDataException
+from spacestream.codec.RVLCodec import RVLCodec
+from spacestream.io.RawRecordingWriter import METADATA_FILE_NAME, INDEX_FILE_NAME, CHUNK_FILE_NAME, \
+    INDEX_DTYPE, FORMAT_VERSION, FLAG_DEPTH_RVL
+
+
+class RawRecordingReader:
+    """
+    Reads recordings of the RawRecordingWriter. The chunks are memory mapped, uncompressed frames are returned
+    as read-only views into the mapped files (no copy), rvl compressed depth is decoded into a reused buffer.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+        with open(self.path / METADATA_FILE_NAME, "r") as f:
+            self.metadata: dict = json.load(f)
+
+        if self.metadata.get("version") != FORMAT_VERSION:
+            raise InvalidDataException(f"Unsupported recording version {self.metadata.get('version')}.")
+
+        # the index is the reference, it also contains the frames of recordings which have not been closed
+        index_path = self.path / INDEX_FILE_NAME
+        record_count = index_path.stat().st_size // INDEX_DTYPE.itemsize
+        self.index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=record_count)
+
+        self.depth_shape = tuple(self.metadata["depth"]["shape"])
+        self.depth_dtype = np.dtype(self.metadata["depth"]["dtype"])
+        self.color_shape = tuple(self.metadata["color"]["shape"])
+        self.color_dtype = np.dtype(self.metadata["color"]["dtype"])
+
+        self._chunks: Dict[int, np.memmap] = {}
+        self._rvl = RVLCodec()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def fps(self) -> float:
+        return self.metadata.get("fps", 30)
+
+    @property
+    def depth_units(self) -> float:
+        return self.metadata.get("depth_units", 0.001)
+
+    @property
+    def stream_information(self) -> dict:
+        return self.metadata.get("stream_information", {})
+
+    def read(self, frame: int) -> Tuple[np.ndarray, np.ndarray, np.void]:
+        """
+        Returns depth, color and the index record of a frame. The arrays are only valid until the next read
+        (compressed depth) or until the reader is closed (memory mapped).
+        """
+        record = self.index[frame]
+        chunk = self._chunk(int(record["chunk"]))
+
+        color = self._view(chunk, int(record["color_offset"]), int(record["color_size"]),
+                           self.color_dtype, self.color_shape)
+
+        depth_offset, depth_size = int(record["depth_offset"]), int(record["depth_size"])
+        if record["flags"] & FLAG_DEPTH_RVL:
+            depth = self._rvl.decode(chunk[depth_offset:depth_offset + depth_size])
+        else:
+            depth = self._view(chunk, depth_offset, depth_size, self.depth_dtype, self.depth_shape)
+
+        return depth, color, record
+
+    def find_frame(self, timestamp: int) -> int:
+        """
+        Returns the index of the last frame which has been captured at or before the timestamp.
+        """
+        position = int(np.searchsorted(self.index["timestamp"], timestamp, side="right")) - 1
+        return min(max(position, 0), len(self) - 1)
+
+    def close(self):
+        self._chunks.clear()
+
+    def _chunk(self, chunk: int) -> np.memmap:
+        data = self._chunks.get(chunk)
+        if data is None:
+            data = np.memmap(self.path / CHUNK_FILE_NAME.format(chunk), dtype=np.uint8, mode="r")
+            self._chunks[chunk] = data
+        return data
+
+    @staticmethod
+    def _view(chunk: np.ndarray, offset: int, size: int, dtype: np.dtype, shape: Tuple[int, ...]) -> np.ndarray:
+        if size != dtype.itemsize * int(np.prod(shape)):
+            raise InvalidDataException(f"Frame size {size} does not match the recording format {shape}.")
+        return chunk[offset:offset + size].view(dtype).reshape(shape)
+
+    @staticmethod
+    def is_recording(path: Union[str, Path]) -> bool:
+        return (Path(path) / METADATA_FILE_NAME).exists()
+
+    def __enter__(self) -> "RawRecordingReader":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
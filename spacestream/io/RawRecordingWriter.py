@@ -0,0 +1,161 @@
+import json
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+import numpy as np
+
+from spacestream.codec.RVLCodec import RVLCodec
+from spacestream.io.EnhancedJSONEncoder import EnhancedJSONEncoder
+from spacestream.io.RawDepthCompression import RawDepthCompression
+from spacestream.io.StreamInformation import StreamInformation
+
+FORMAT_VERSION = 1
+
+METADATA_FILE_NAME = "recording.json"
+INDEX_FILE_NAME = "index.bin"
+CHUNK_FILE_NAME = "chunk-{:06d}.bin"
+
+# payloads start at aligned offsets, so they can be viewed as uint16 arrays without copying
+PAYLOAD_ALIGNMENT = 64
+
+# one record per frame (seek index), appended after the frame data has been written
+INDEX_DTYPE = np.dtype([
+    ("frame", "<u8"),
+    ("timestamp", "<i8"),
+    ("chunk", "<u4"),
+    ("flags", "<u4"),
+    ("depth_offset", "<u8"),
+    ("depth_size", "<u8"),
+    ("color_offset", "<u8"),
+    ("color_size", "<u8"),
+    ("min_distance", "<f4"),
+    ("max_distance", "<f4"),
+])
+
+# depth payload of the frame is rvl compressed
+FLAG_DEPTH_RVL = 1
+
+
+class RawRecordingWriter:
+    """
+    Writes raw uint16 depth and color frames (lossless) into an append-only recording directory:
+
+    - recording.json: frame sizes, depth units, compression and the stream information (intrinsics)
+    - chunk-000000.bin, ...: frame payloads (depth, color), a new chunk is started every chunk_frames frames
+    - index.bin: fixed size record per frame (INDEX_DTYPE) with the timestamp, the min / max distance (m)
+      and the position of the payloads, which is used as seek index
+
+    Uncompressed payloads are stored as they are in memory, so a reader can memory map the chunks.
+    The chunk is flushed before the index record of a frame is written and the index is flushed after it,
+    so a recording which has not been closed (e.g. after a crash of the app) is still readable up to the last
+    indexed frame. The files are not synced, data in the os cache is lost on a power failure.
+    """
+
+    def __init__(self, path: Union[str, Path],
+                 compression: RawDepthCompression = RawDepthCompression.Uncompressed,
+                 stream_information: Optional[StreamInformation] = None,
+                 depth_units: float = 0.001, fps: float = 30, chunk_frames: int = 300):
+        self.path = Path(path)
+        self.compression = compression
+        self.stream_information = stream_information if stream_information is not None else StreamInformation()
+        self.depth_units = depth_units
+        self.fps = fps
+        self.chunk_frames = chunk_frames
+
+        self.frame_count = 0
+
+        self._rvl = RVLCodec()
+        self._record = np.zeros(1, dtype=INDEX_DTYPE)
+        self._metadata: Optional[dict] = None
+
+        self._index_file: Optional[BinaryIO] = None
+        self._chunk_file: Optional[BinaryIO] = None
+        self._chunk = -1
+        self._chunk_offset = 0
+
+    def open(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._index_file = open(self.path / INDEX_FILE_NAME, "wb")
+
+    def add_frame(self, depth: np.ndarray, color: np.ndarray, timestamp: int = 0,
+                  min_distance: float = 0.0, max_distance: float = 0.0):
+        if self._metadata is None:
+            self._write_metadata(depth, color)
+
+        if self.frame_count % self.chunk_frames == 0:
+            self._next_chunk()
+
+        flags = 0
+        if self.compression == RawDepthCompression.RVL:
+            depth_data = self._rvl.encode(depth)
+            flags |= FLAG_DEPTH_RVL
+        else:
+            depth_data = np.ascontiguousarray(depth)
+
+        record = self._record[0]
+        record["frame"] = self.frame_count
+        record["timestamp"] = timestamp
+        record["chunk"] = self._chunk
+        record["flags"] = flags
+        record["depth_offset"], record["depth_size"] = self._write_payload(depth_data)
+        record["color_offset"], record["color_size"] = self._write_payload(np.ascontiguousarray(color))
+        record["min_distance"] = min_distance
+        record["max_distance"] = max_distance
+
+        # the index never points at payload bytes which are still in the write buffer
+        self._chunk_file.flush()
+        self._index_file.write(self._record.tobytes())
+        self._index_file.flush()
+        self.frame_count += 1
+
+    def close(self):
+        if self._chunk_file is not None:
+            self._chunk_file.close()
+            self._chunk_file = None
+
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+        if self._metadata is not None:
+            self._metadata["frames"] = self.frame_count
+            self._save_metadata()
+
+    def _write_payload(self, data: np.ndarray) -> (int, int):
+        offset = self._chunk_offset
+        size = data.nbytes
+
+        self._chunk_file.write(memoryview(data).cast("B"))
+
+        padding = -size % PAYLOAD_ALIGNMENT
+        if padding > 0:
+            self._chunk_file.write(bytes(padding))
+
+        self._chunk_offset += size + padding
+        return offset, size
+
+    def _next_chunk(self):
+        if self._chunk_file is not None:
+            self._chunk_file.close()
+
+        self._chunk += 1
+        self._chunk_offset = 0
+        self._chunk_file = open(self.path / CHUNK_FILE_NAME.format(self._chunk), "wb")
+
+    def _write_metadata(self, depth: np.ndarray, color: np.ndarray):
+        self._metadata = {
+            "version": FORMAT_VERSION,
+            "fps": self.fps,
+            "depth_units": self.depth_units,
+            "compression": self.compression.value,
+            "chunk_frames": self.chunk_frames,
+            "depth": {"shape": list(depth.shape), "dtype": depth.dtype.str},
+            "color": {"shape": list(color.shape), "dtype": color.dtype.str},
+            "stream_information": self.stream_information,
+            "frames": 0,
+        }
+        self._save_metadata()
+
+    def _save_metadata(self):
+        with open(self.path / METADATA_FILE_NAME, "w") as f:
+            json.dump(self._metadata, f, cls=EnhancedJSONEncoder, indent=4)
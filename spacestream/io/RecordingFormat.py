@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class RecordingFormat(Enum):
+    # encoded rgb-d frames as mp4 video (lossy) with a json sidecar
+    Video = "video"
+    # raw depth and color frames (lossless), see RawRecordingWriter
+    Raw = "raw"
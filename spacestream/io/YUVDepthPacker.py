@@ -0,0 +1,196 @@
+from typing import Optional, Tuple
+
+import numpy as np
+from numba import prange
+
+from spacestream.codec.CodecKernel import CodecKernel
+from spacestream.io.NDIDepthFormat import NDIDepthFormat
+
+# video (limited) range of the luma channel, 8-bit and 16-bit
+LUMA_MIN_8 = 16
+LUMA_MAX_8 = 235
+LUMA_MIN_16 = LUMA_MIN_8 << 8
+LUMA_MAX_16 = LUMA_MAX_8 << 8
+
+
+class YUVDepthPacker:
+    """
+    Packs raw depth and a bgr color frame side by side (depth | color) into a yuv 4:2:2 buffer (UYVY or P216).
+    The quantized depth is written directly into the luma channel of the left half (neutral chroma), which keeps
+    it out of chroma subsampling. Only the color half is converted (BT.709, limited range).
+
+    No-data, masked and out of range points are stored as black (minimal luma), valid depth uses the rest of the
+    luma range (218 levels for UYVY, 56063 levels for P216).
+
+    The color width has to be even, so the color half starts at a chroma pair and has no unpaired last pixel.
+    """
+
+    def __init__(self):
+        self._buffer: Optional[np.ndarray] = None
+
+        self._map_key: Optional[Tuple[int, int, int, int]] = None
+        self._x_map: Optional[np.ndarray] = None
+        self._y_map: Optional[np.ndarray] = None
+
+        # numba needs a typed array even if masking is disabled
+        self._empty_mask = np.zeros(shape=(1, 1), dtype=np.uint8)
+
+    @staticmethod
+    def supports(depth, width: Optional[int] = None) -> bool:
+        return isinstance(depth, np.ndarray) and depth.dtype == np.uint16 and depth.ndim == 2 \
+               and (width is None or width % 2 == 0)
+
+    @staticmethod
+    def frame_size(width: int, height: int, depth_format: NDIDepthFormat) -> int:
+        if depth_format == NDIDepthFormat.P216:
+            # 16-bit luma plane and 16-bit interleaved chroma plane
+            return width * height * 4
+        return width * height * 2
+
+    def pack(self, depth: np.ndarray, color: np.ndarray, d_min: float, d_max: float,
+             depth_format: NDIDepthFormat, mask: Optional[np.ndarray] = None,
+             out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Returns the packed frame (flat uint8 buffer) with the size (2 * color width, color height).
+        It is written into out (see frame_size) if provided, otherwise a new buffer is returned for every frame.
+        """
+        h, w = color.shape[:2]
+        if w % 2 != 0:
+            raise ValueError(f"Width of the color frame ({w}) has to be even for 4:2:2 packing.")
+
+        self._prepare_maps(depth, w, h)
+
+        use_mask = mask is not None
+        mask = mask if use_mask else self._empty_mask
+
+        data = out if out is not None else np.empty(self.frame_size(w * 2, h, depth_format), dtype=np.uint8)
+
+        if depth_format == NDIDepthFormat.P216:
+            planes = data.view(np.uint16).reshape(2, h, w * 2)
+            self._pack_p216(depth, color, planes[0], planes[1], self._x_map, self._y_map,
+                            mask, use_mask, float(d_min), float(d_max))
+        elif depth_format == NDIDepthFormat.UYVY:
+            self._pack_uyvy(depth, color, data.reshape(h, w * 4), self._x_map, self._y_map,
+                            mask, use_mask, float(d_min), float(d_max))
+        else:
+            raise ValueError(f"{depth_format} is not a yuv format.")
+
+        return data
+
+    @staticmethod
+    def unpack_depth(data: np.ndarray, width: int, height: int, depth_format: NDIDepthFormat,
+                     d_min: float, d_max: float) -> np.ndarray:
+        """
+        Recovers the depth of a packed frame (width and height of the whole frame), mainly for receivers and tests.
+        """
+        w = width // 2
+
+        if depth_format == NDIDepthFormat.P216:
+            luma = data.view(np.uint16).reshape(2, height, width)[0, :, :w].astype(np.float64)
+            luma_min, luma_max = LUMA_MIN_16, LUMA_MAX_16
+        else:
+            luma = data.reshape(height, width * 2)[:, 1:w * 2:2].astype(np.float64)
+            luma_min, luma_max = LUMA_MIN_8, LUMA_MAX_8
+
+        depth = d_min + (luma - luma_min - 1) / (luma_max - luma_min - 1) * (d_max - d_min)
+        depth[luma <= luma_min] = 0
+        return np.round(depth).astype(np.uint16)
+
+    def warmup(self):
+        depth = np.linspace(0, 7000, 64).astype(np.uint16).reshape(8, 8)
+        color = np.zeros(shape=(8, 8, 3), dtype=np.uint8)
+        mask = np.ones(shape=(8, 8), dtype=np.uint8)
+
+        for depth_format in (NDIDepthFormat.UYVY, NDIDepthFormat.P216):
+            self.pack(depth, color, 500, 6000, depth_format)
+            self.pack(depth, color, 500, 6000, depth_format, mask)
+
+    def _prepare_maps(self, depth: np.ndarray, w: int, h: int):
+        dh, dw = depth.shape[:2]
+        map_key = (dw, dh, w, h)
+
+        if self._map_key != map_key:
+            # nearest neighbour sampling positions (pixel centers) of the output inside the depth buffer
+            self._x_map = np.minimum(((np.arange(w) + 0.5) * dw / w).astype(np.int32), dw - 1)
+            self._y_map = np.minimum(((np.arange(h) + 0.5) * dh / h).astype(np.int32), dh - 1)
+            self._map_key = map_key
+
+    @staticmethod
+    @CodecKernel
+    def _pack_p216(depth: np.ndarray, color: np.ndarray, luma: np.ndarray, chroma: np.ndarray,
+                   x_map: np.ndarray, y_map: np.ndarray, mask: np.ndarray, use_mask: bool,
+                   d_min: float, d_max: float):
+        h, w = color.shape[:2]
+        scale = (LUMA_MAX_16 - LUMA_MIN_16 - 1) / (d_max - d_min)
+
+        for y in prange(h):
+            row = depth[y_map[y]]
+
+            # depth region
+            for x in range(w):
+                d = row[x_map[x]]
+
+                if d == 0 or d < d_min or d > d_max or (use_mask and mask[y, x] == 0):
+                    luma[y, x] = LUMA_MIN_16
+                else:
+                    luma[y, x] = LUMA_MIN_16 + 1 + round((d - d_min) * scale)
+
+                chroma[y, x] = 32768
+
+            # color region (4:2:2, chroma of a pixel pair is averaged)
+            for x in range(0, w - 1, 2):
+                u = 0.0
+                v = 0.0
+
+                for i in range(2):
+                    b = color[y, x + i, 0] / 255
+                    g = color[y, x + i, 1] / 255
+                    r = color[y, x + i, 2] / 255
+
+                    luma[y, w + x + i] = round((16 + 219 * (0.2126 * r + 0.7152 * g + 0.0722 * b)) * 256)
+                    u += -0.1146 * r - 0.3854 * g + 0.5 * b
+                    v += 0.5 * r - 0.4542 * g - 0.0458 * b
+
+                chroma[y, w + x] = round((128 + 224 * u / 2) * 256)
+                chroma[y, w + x + 1] = round((128 + 224 * v / 2) * 256)
+
+    @staticmethod
+    @CodecKernel
+    def _pack_uyvy(depth: np.ndarray, color: np.ndarray, result: np.ndarray,
+                   x_map: np.ndarray, y_map: np.ndarray, mask: np.ndarray, use_mask: bool,
+                   d_min: float, d_max: float):
+        h, w = color.shape[:2]
+        scale = (LUMA_MAX_8 - LUMA_MIN_8 - 1) / (d_max - d_min)
+
+        for y in prange(h):
+            row = depth[y_map[y]]
+            out = result[y]
+
+            # depth region (u y0 v y1)
+            for x in range(w):
+                d = row[x_map[x]]
+
+                if d == 0 or d < d_min or d > d_max or (use_mask and mask[y, x] == 0):
+                    out[x * 2 + 1] = LUMA_MIN_8
+                else:
+                    out[x * 2 + 1] = LUMA_MIN_8 + 1 + round((d - d_min) * scale)
+
+                out[x * 2] = 128
+
+            # color region (4:2:2, chroma of a pixel pair is averaged)
+            offset = w * 2
+            for x in range(0, w - 1, 2):
+                u = 0.0
+                v = 0.0
+
+                for i in range(2):
+                    b = color[y, x + i, 0] / 255
+                    g = color[y, x + i, 1] / 255
+                    r = color[y, x + i, 2] / 255
+
+                    out[offset + (x + i) * 2 + 1] = round(16 + 219 * (0.2126 * r + 0.7152 * g + 0.0722 * b))
+                    u += -0.1146 * r - 0.3854 * g + 0.5 * b
+                    v += 0.5 * r - 0.4542 * g - 0.0458 * b
+
+                out[offset + x * 2] = round(128 + 224 * u / 2)
+                out[offset + x * 2 + 2] = round(128 + 224 * v / 2)
@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class DepthRegistrationMode(Enum):
+    # depth is aligned to the color image by the camera sdk (k4a transformation)
+    SDK = "sdk"
+    # depth is reprojected into the color image with precomputed ray directions (DepthRegistrationNode)
+    Lookup = "lookup"
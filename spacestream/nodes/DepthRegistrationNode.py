@@ -0,0 +1,217 @@
+import math
+from argparse import ArgumentParser, Namespace
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from numba import njit, prange
+from visiongraph import vg
+
+from spacestream.codec.CodecKernel import CodecKernel
+from spacestream.pipeline.BufferPool import BufferPool
+
+# opencv distortion model (k1, k2, p1, p2, k3, k4, k5, k6)
+DISTORTION_COEFFICIENTS = 8
+
+
+class DepthRegistrationNode(vg.GraphNode[np.ndarray, np.ndarray]):
+    """
+    Reprojects depth maps into the color image (depth to color registration) without the camera sdk.
+    The undistorted ray direction of every depth pixel is calculated once per depth resolution, so a frame
+    only needs a multiply, a rigid transform and the projection into the color camera per pixel.
+
+    The projection runs in a parallel kernel, the registered depth is written in a second (serial) pass,
+    which keeps the nearest depth if several points hit the same color pixel (z-buffer). Every point covers
+    a block of splat x splat color pixels to close the holes of a color image with a higher resolution.
+    """
+
+    def __init__(self, depth_matrix: np.ndarray, depth_distortion: np.ndarray,
+                 color_matrix: np.ndarray, color_distortion: np.ndarray,
+                 rotation: np.ndarray, translation: np.ndarray,
+                 buffer_pool: Optional[BufferPool] = None, splat: Optional[int] = None):
+        self.depth_matrix = np.asarray(depth_matrix, dtype=np.float64)[:3, :3]
+        self.depth_distortion = self._distortion(depth_distortion)
+        self.color_matrix = np.asarray(color_matrix, dtype=np.float64)[:3, :3]
+        self.color_distortion = self._distortion(color_distortion)
+
+        # depth to color camera, translation in depth units
+        self.rotation = np.ascontiguousarray(rotation, dtype=np.float64).reshape(3, 3)
+        self.translation = np.ascontiguousarray(translation, dtype=np.float64).reshape(3)
+
+        # registered depth maps are leased from the pool if set (released by the caller)
+        self.buffer_pool = buffer_pool
+
+        if splat is None:
+            scale = max(self.color_matrix[0, 0] / self.depth_matrix[0, 0],
+                        self.color_matrix[1, 1] / self.depth_matrix[1, 1])
+            splat = math.ceil(scale - 0.05)
+        self.splat = max(1, int(splat))
+
+        # ray directions (x / z, y / z) per depth resolution
+        self._rays: Dict[Tuple[int, int], np.ndarray] = {}
+
+        # projected color pixel and depth of every depth pixel (reused between frames)
+        self._targets: Optional[np.ndarray] = None
+        self._values: Optional[np.ndarray] = None
+
+    def setup(self):
+        pass
+
+    def process(self, depth: np.ndarray, color_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        h, w = depth.shape[:2]
+        rays = self.get_rays((w, h))
+
+        if self._targets is None or len(self._targets) != w * h:
+            self._targets = np.empty((w * h, 2), dtype=np.int32)
+            self._values = np.empty(w * h, dtype=np.uint16)
+
+        cw, ch = color_size or (w, h)
+        if self.buffer_pool is not None:
+            registered = self.buffer_pool.acquire((ch, cw), np.uint16)
+            registered.fill(0)
+        else:
+            registered = np.zeros((ch, cw), dtype=np.uint16)
+
+        self._project(depth, rays, self.rotation, self.translation, self.color_matrix, self.color_distortion,
+                      float(self.splat), self._targets, self._values)
+        self._scatter(self._targets, self._values, self.splat, registered)
+        return registered
+
+    def release(self):
+        pass
+
+    def warmup(self):
+        """
+        Runs the kernels on a small synthetic frame to compile (or load the cached) kernels
+        before the first camera frame arrives.
+        """
+        depth = np.linspace(0, 7000, 64).astype(np.uint16).reshape(8, 8)
+        rays = self.calculate_rays(self.depth_matrix, self.depth_distortion, (8, 8))
+        targets = np.empty((64, 2), dtype=np.int32)
+        values = np.empty(64, dtype=np.uint16)
+
+        self._project(depth, rays, self.rotation, self.translation, self.color_matrix, self.color_distortion,
+                      float(self.splat), targets, values)
+        self._scatter(targets, values, self.splat, np.zeros((8, 8), dtype=np.uint16))
+
+    def get_rays(self, size: Tuple[int, int]) -> np.ndarray:
+        rays = self._rays.get(size)
+        if rays is None:
+            rays = self.calculate_rays(self.depth_matrix, self.depth_distortion, size)
+            self._rays[size] = rays
+        return rays
+
+    @staticmethod
+    def calculate_rays(matrix: np.ndarray, distortion: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+        """
+        Undistorted ray direction (x / z, y / z) of every pixel center, shape (h, w, 2).
+        """
+        w, h = size
+        xs, ys = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+        points = np.stack((xs, ys), axis=-1).reshape(-1, 1, 2)
+
+        rays = cv2.undistortPoints(points, matrix, distortion)
+        return np.ascontiguousarray(rays.reshape(h, w, 2), dtype=np.float32)
+
+    @staticmethod
+    def from_azure_kinect(cam: vg.AzureKinectInput, depth_units: float = 0.001,
+                          buffer_pool: Optional[BufferPool] = None) -> "DepthRegistrationNode":
+        from pyk4a import CalibrationType
+
+        calibration = cam.device.calibration
+        rotation, translation = calibration.get_extrinsic_parameters(CalibrationType.DEPTH, CalibrationType.COLOR)
+
+        # extrinsics are in meters
+        return DepthRegistrationNode(calibration.get_camera_matrix(CalibrationType.DEPTH),
+                                     calibration.get_distortion_coefficients(CalibrationType.DEPTH),
+                                     calibration.get_camera_matrix(CalibrationType.COLOR),
+                                     calibration.get_distortion_coefficients(CalibrationType.COLOR),
+                                     rotation, np.asarray(translation) / depth_units,
+                                     buffer_pool=buffer_pool)
+
+    @staticmethod
+    def _distortion(coefficients: Optional[np.ndarray]) -> np.ndarray:
+        distortion = np.zeros(DISTORTION_COEFFICIENTS, dtype=np.float64)
+        if coefficients is not None:
+            values = np.asarray(coefficients, dtype=np.float64).ravel()[:DISTORTION_COEFFICIENTS]
+            distortion[:len(values)] = values
+        return distortion
+
+    @staticmethod
+    @CodecKernel
+    def _project(depth: np.ndarray, rays: np.ndarray, rotation: np.ndarray, translation: np.ndarray,
+                 color_matrix: np.ndarray, distortion: np.ndarray, splat: float,
+                 targets: np.ndarray, values: np.ndarray):
+        h, w = depth.shape[:2]
+
+        fx, fy = color_matrix[0, 0], color_matrix[1, 1]
+        cx, cy = color_matrix[0, 2], color_matrix[1, 2]
+        k1, k2, p1, p2, k3, k4, k5, k6 = distortion
+
+        # top left pixel of the splat block
+        offset = (splat - 1) * 0.5
+
+        for i in prange(w * h):
+            x = i % w
+            y = i // w
+
+            d = depth[y, x]
+            values[i] = 0
+
+            # no-data points
+            if d == 0:
+                continue
+
+            px = rays[y, x, 0] * d
+            py = rays[y, x, 1] * d
+            pz = float(d)
+
+            # depth to color camera
+            qx = rotation[0, 0] * px + rotation[0, 1] * py + rotation[0, 2] * pz + translation[0]
+            qy = rotation[1, 0] * px + rotation[1, 1] * py + rotation[1, 2] * pz + translation[1]
+            qz = rotation[2, 0] * px + rotation[2, 1] * py + rotation[2, 2] * pz + translation[2]
+
+            if qz <= 0:
+                continue
+
+            a = qx / qz
+            b = qy / qz
+
+            # rational distortion model of the color camera
+            r2 = a * a + b * b
+            r4 = r2 * r2
+            r6 = r4 * r2
+            radial = (1 + k1 * r2 + k2 * r4 + k3 * r6) / (1 + k4 * r2 + k5 * r4 + k6 * r6)
+            xd = a * radial + 2 * p1 * a * b + p2 * (r2 + 2 * a * a)
+            yd = b * radial + p1 * (r2 + 2 * b * b) + 2 * p2 * a * b
+
+            targets[i, 0] = int(math.floor(fx * xd + cx - offset + 0.5))
+            targets[i, 1] = int(math.floor(fy * yd + cy - offset + 0.5))
+            values[i] = min(int(qz + 0.5), 65535)
+
+    @staticmethod
+    @njit(cache=True)
+    def _scatter(targets: np.ndarray, values: np.ndarray, splat: int, registered: np.ndarray):
+        h, w = registered.shape[:2]
+
+        # serial, several points can hit the same pixel (nearest wins)
+        for i in range(len(values)):
+            z = values[i]
+            if z == 0:
+                continue
+
+            u = targets[i, 0]
+            v = targets[i, 1]
+
+            for y in range(max(v, 0), min(v + splat, h)):
+                for x in range(max(u, 0), min(u + splat, w)):
+                    current = registered[y, x]
+                    if current == 0 or z < current:
+                        registered[y, x] = z
+
+    def configure(self, args: Namespace):
+        pass
+
+    @staticmethod
+    def add_params(parser: ArgumentParser):
+        pass
@@ -1,51 +1,200 @@
+import hashlib
+import logging
+import time
 from argparse import ArgumentParser, Namespace
-from typing import Optional
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 
 import cv2
 import numpy as np
 from visiongraph import vg
 
+from spacestream.pipeline.BufferPool import BufferPool
+
+# interval in which the intrinsics are read again to detect changes (seconds)
+INTRINSICS_CHECK_INTERVAL = 1.0
+
+# normalized region of interest (x, y, width, height)
+ROI = Tuple[float, float, float, float]
+FULL_ROI: ROI = (0.0, 0.0, 1.0, 1.0)
+
+# stream type, input size, output size, roi, nearest neighbour and intrinsics hash
+MapKey = Tuple[vg.CameraStreamType, Tuple[int, int], Tuple[int, int], ROI, bool, str]
+
+# fixed-point positions (CV_16SC2) and interpolation table (CV_16UC1, None for nearest neighbour)
+RectificationMaps = Tuple[np.ndarray, Optional[np.ndarray]]
+
 
 class ImageRectificationNode(vg.GraphNode[np.ndarray, np.ndarray]):
+    """
+    Undistorts images with precomputed fixed-point maps (CV_16SC2), which are cached per stream type,
+    resolution and intrinsics, so depth and color images of different sizes can share the node. The intrinsics
+    are read again once per interval and the maps are recalculated if they have changed. If a cache path is
+    set, the maps are stored on disk and loaded instead of being recalculated on the next start.
+
+    The maps can also crop a region of interest of the undistorted image and scale it to an output size,
+    so undistortion, crop and resize are a single remap (use nearest neighbour for depth).
+    """
 
     def __init__(self, cam: vg.BaseCamera,
                  stream_type: vg.CameraStreamType = vg.CameraStreamType.Color,
-                 interpolation_method: int = cv2.INTER_NEAREST):
+                 interpolation_method: int = cv2.INTER_NEAREST,
+                 buffer_pool: Optional[BufferPool] = None,
+                 cache_path: Optional[str] = None):
         self.cam = cam
         self.stream_type = stream_type
         self.interpolation_method = interpolation_method
 
-        self.map_x: Optional[np.ndarray] = None
-        self.map_y: Optional[np.ndarray] = None
+        # rectified images are leased from the pool if set (released by the caller)
+        self.buffer_pool = buffer_pool
+        self.cache_path = cache_path
+
+        self._maps: Dict[MapKey, RectificationMaps] = {}
+
+        # time of the last read, intrinsics and their hash per stream type
+        self._intrinsics: Dict[vg.CameraStreamType, Tuple[float, vg.CameraIntrinsics, str]] = {}
 
     def setup(self):
         pass
 
-    def process(self, image: np.ndarray) -> np.ndarray:
+    def process(self, image: np.ndarray, stream_type: Optional[vg.CameraStreamType] = None,
+                output_size: Optional[Tuple[int, int]] = None, roi: Optional[ROI] = None,
+                interpolation: Optional[int] = None) -> np.ndarray:
         h, w = image.shape[:2]
+        roi = roi or FULL_ROI
+        output_size = output_size or self.roi_size((w, h), roi)
+        interpolation = self.interpolation_method if interpolation is None else interpolation
 
-        if self.map_x is None or self.map_y is None:
-            self.calculate_map(w, h)
+        map_xy, map_interpolation = self.get_maps(stream_type or self.stream_type, (w, h), output_size, roi,
+                                                  interpolation == cv2.INTER_NEAREST)
 
-        rectified_image = cv2.remap(image, self.map_x, self.map_y, self.interpolation_method)
+        ow, oh = output_size
+        shape = (oh, ow) + image.shape[2:]
+        dst = self.buffer_pool.acquire(shape, image.dtype) if self.buffer_pool is not None else None
+        rectified_image = cv2.remap(image, map_xy, map_interpolation, interpolation, dst=dst)
         return rectified_image
 
     def release(self):
         pass
 
-    def calculate_map(self, width: int, height: int):
-        size = (width, height)
-        calib = self.cam.get_intrinsics(self.stream_type)
+    def get_maps(self, stream_type: vg.CameraStreamType, size: Tuple[int, int],
+                 output_size: Optional[Tuple[int, int]] = None, roi: ROI = FULL_ROI,
+                 nearest: bool = True) -> RectificationMaps:
+        intrinsics, intrinsics_hash = self._read_intrinsics(stream_type)
+        key = (stream_type, size, output_size or size, roi, nearest, intrinsics_hash)
 
+        maps = self._maps.get(key)
+        if maps is None:
+            maps = self._load_maps(key)
+
+            if maps is None:
+                maps = self.calculate_maps(intrinsics, size, output_size or size, roi, nearest)
+                self._store_maps(key, maps)
+
+            self._maps[key] = maps
+
+        return maps
+
+    @staticmethod
+    def calculate_maps(intrinsics: vg.CameraIntrinsics, size: Tuple[int, int], output_size: Tuple[int, int],
+                       roi: ROI = FULL_ROI, nearest: bool = True) -> RectificationMaps:
         # optimal mat not currently used
         # optimal_cam_mat, roi = cv2.getOptimalNewCameraMatrix(calib.intrinsic_matrix, calib.distortion_coefficients, size, 1, size)
 
-        self.map_x, self.map_y = cv2.initUndistortRectifyMap(calib.intrinsic_matrix,
-                                                             calib.distortion_coefficients,
-                                                             None,
-                                                             calib.intrinsic_matrix,
-                                                             size,
-                                                             5)
+        # the output camera sees the roi of the undistorted image, scaled to the output size (pixel centers)
+        w, h = size
+        ow, oh = output_size
+        rx, ry, rw, rh = roi
+        sx = ow / (rw * w)
+        sy = oh / (rh * h)
+
+        camera_matrix = np.asarray(intrinsics.intrinsic_matrix, dtype=np.float64)[:3, :3]
+        output_matrix = camera_matrix.copy()
+        output_matrix[0, 0] *= sx
+        output_matrix[1, 1] *= sy
+        output_matrix[0, 2] = (camera_matrix[0, 2] + 0.5 - rx * w) * sx - 0.5
+        output_matrix[1, 2] = (camera_matrix[1, 2] + 0.5 - ry * h) * sy - 0.5
+
+        map_x, map_y = cv2.initUndistortRectifyMap(camera_matrix,
+                                                   intrinsics.distortion_coefficients,
+                                                   None,
+                                                   output_matrix,
+                                                   output_size,
+                                                   cv2.CV_32FC1)
+
+        # nearest neighbour maps are rounded and do not need the interpolation table
+        return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2, nninterpolation=nearest)
+
+    @staticmethod
+    def roi_size(size: Tuple[int, int], roi: Optional[ROI]) -> Tuple[int, int]:
+        """
+        Size of the region of interest in pixels.
+        """
+        if roi is None:
+            return size
+
+        w, h = size
+        return max(1, round(roi[2] * w)), max(1, round(roi[3] * h))
+
+    def _read_intrinsics(self, stream_type: vg.CameraStreamType) -> Tuple[vg.CameraIntrinsics, str]:
+        now = time.monotonic()
+        cached = self._intrinsics.get(stream_type)
+
+        if cached is not None and now - cached[0] < INTRINSICS_CHECK_INTERVAL:
+            return cached[1], cached[2]
+
+        intrinsics = self.cam.get_intrinsics(stream_type)
+        intrinsics_hash = self._hash(intrinsics)
+
+        if cached is not None and cached[2] != intrinsics_hash:
+            logging.info(f"Intrinsics of the {stream_type.name.lower()} stream have changed")
+            self._maps = {key: maps for key, maps in self._maps.items()
+                          if key[0] != stream_type or key[-1] == intrinsics_hash}
+
+        self._intrinsics[stream_type] = (now, intrinsics, intrinsics_hash)
+        return intrinsics, intrinsics_hash
+
+    def _map_file(self, key: MapKey) -> Optional[Path]:
+        if self.cache_path is None:
+            return None
+
+        stream_type, (w, h), (ow, oh), roi, nearest, intrinsics_hash = key
+        geometry_hash = hashlib.sha1(f"{intrinsics_hash}{roi}".encode()).hexdigest()[:16]
+        suffix = "-nearest" if nearest else ""
+        return Path(self.cache_path) / f"{stream_type.name.lower()}-{w}x{h}-{ow}x{oh}-{geometry_hash}{suffix}.npz"
+
+    def _load_maps(self, key: MapKey) -> Optional[RectificationMaps]:
+        path = self._map_file(key)
+        if path is None or not path.exists():
+            return None
+
+        try:
+            with np.load(path) as data:
+                return data["map_xy"], data["map_interpolation"] if "map_interpolation" in data else None
+        except Exception as ex:
+            logging.warning(f"Could not load rectification maps {path}: {ex}")
+            return None
+
+    def _store_maps(self, key: MapKey, maps: RectificationMaps):
+        path = self._map_file(key)
+        if path is None:
+            return
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if maps[1] is None:
+                np.savez(path, map_xy=maps[0])
+            else:
+                np.savez(path, map_xy=maps[0], map_interpolation=maps[1])
+        except Exception as ex:
+            logging.warning(f"Could not store rectification maps {path}: {ex}")
+
+    @staticmethod
+    def _hash(intrinsics: vg.CameraIntrinsics) -> str:
+        digest = hashlib.sha1()
+        digest.update(np.ascontiguousarray(intrinsics.intrinsic_matrix, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(intrinsics.distortion_coefficients, dtype=np.float64).tobytes())
+        return digest.hexdigest()[:16]
 
     def configure(self, args: Namespace):
         pass
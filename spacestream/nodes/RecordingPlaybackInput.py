@@ -0,0 +1,274 @@
+import json
+import logging
+import threading
+import time
+from argparse import ArgumentParser, Namespace, ArgumentError
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from visiongraph import vg
+from visiongraph.util import CommonArgs
+from visiongraph.util.ArgUtils import add_enum_choice_argument
+
+from spacestream.codec.DepthCodec import DepthCodec
+from spacestream.codec.DepthCodecType import DepthCodecType
+from spacestream.io.PlaybackMode import PlaybackMode
+from spacestream.io.RawRecordingReader import RawRecordingReader
+from spacestream.io.RawRecordingWriter import FLAG_DEPTH_RVL
+
+# longest wait for the next frame in realtime mode, longer gaps (e.g. a paused recording) are skipped
+MAX_FRAME_WAIT_MS = 1000
+
+
+class RecordingPlaybackInput(vg.BaseDepthInput):
+    """
+    Replays a recording as depth input, either a raw recording (see RawRecordingWriter) or an mp4 recording
+    with its json sidecar. Raw chunks are memory mapped, so uncompressed frames are passed on without copying.
+    The depth of mp4 recordings is decoded with the codec which has been used for the recording (lossy).
+    """
+
+    def __init__(self, path: Optional[str] = None, mode: PlaybackMode = PlaybackMode.Realtime, loop: bool = True,
+                 codec_type: DepthCodecType = DepthCodecType.UniformHue):
+        super().__init__()
+        self.path = path
+        self.mode = mode
+        self.loop = loop
+        self.codec_type = codec_type
+        self.start_frame = 0
+
+        self.depth_units: float = 0.001
+        self.stream_information: dict = {}
+
+        self._reader: Optional[RawRecordingReader] = None
+        self._capture: Optional[cv2.VideoCapture] = None
+        self._capture_position = 0
+        self._codec: Optional[DepthCodec] = None
+        self._depth_range: Tuple[float, float] = (0.0, 0.0)
+
+        self._frame_count = 0
+        self._position = 0
+        self._steps = 0
+        self._lock = threading.Lock()
+
+        # timestamp, depth and color of the current frame
+        self._current: Optional[Tuple[int, np.ndarray, np.ndarray]] = None
+
+        # difference between the wall clock (ms) and the recording timestamps in realtime mode
+        self._clock_offset: Optional[float] = None
+
+    def setup(self):
+        path = Path(self.path)
+
+        if RawRecordingReader.is_recording(path):
+            self._reader = RawRecordingReader(path)
+            self._frame_count = len(self._reader)
+            self.fps = self._reader.fps
+            self.depth_units = self._reader.depth_units
+            self.stream_information = self._reader.stream_information
+            self.height, self.width = self._reader.color_shape[:2]
+        else:
+            self._capture = cv2.VideoCapture(str(path))
+            if not self._capture.isOpened():
+                raise Exception(f"Could not open recording {path}, please check path.")
+
+            self._frame_count = int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.fps = self._capture.get(cv2.CAP_PROP_FPS) or self.fps
+            self.width = int(self._capture.get(cv2.CAP_PROP_FRAME_WIDTH)) // 2
+            self.height = int(self._capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+            sidecar_path = path.with_suffix(".json")
+            if sidecar_path.exists():
+                with open(sidecar_path, "r") as f:
+                    self.stream_information = json.load(f)
+            else:
+                logging.warning(f"No recording parameters found ({sidecar_path.name}), depth can not be decoded.")
+
+            distance = self.stream_information.get("distance", {})
+            self._depth_range = (distance.get("min", 0.0) / self.depth_units,
+                                 distance.get("max", 0.0) / self.depth_units)
+            self._codec = self.codec_type.value()
+
+        if self._frame_count <= 0:
+            raise Exception(f"Recording {path} does not contain any frames.")
+
+        self.seek(self.start_frame)
+
+    def release(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+        self._current = None
+
+    def read(self) -> Tuple[int, Optional[np.ndarray]]:
+        with self._lock:
+            if self.mode == PlaybackMode.Step:
+                if self._current is not None and self._steps == 0:
+                    return self._post_process(self._current[0], self._current[2])
+                self._steps = max(0, self._steps - 1)
+
+            frame = self._position
+            if frame >= self._frame_count:
+                if not self.loop:
+                    return self._post_process(vg.current_millis(), None)
+
+                frame = 0
+                self._clock_offset = None
+
+            if self.mode == PlaybackMode.Realtime:
+                frame = self._realtime_frame(frame)
+
+            self._current = self._load(frame)
+            self._position = frame + 1
+
+            return self._post_process(self._current[0], self._current[2])
+
+    def step(self, frames: int = 1):
+        """
+        Requests the next frames in step mode.
+        """
+        with self._lock:
+            self._steps += frames
+
+    def seek(self, frame: int):
+        """
+        Continues the playback at the frame (frame accurate), in step mode the frame is shown by the next read.
+        """
+        with self._lock:
+            self._position = min(max(frame, 0), self._frame_count - 1)
+            self._clock_offset = None
+            self._steps = max(self._steps, 1)
+
+    def seek_time(self, milliseconds: float):
+        """
+        Continues the playback at the last frame which has been recorded at or before the time (relative
+        to the first frame).
+        """
+        if self._reader is not None:
+            first_timestamp = int(self._reader.index["timestamp"][0])
+            self.seek(self._reader.find_frame(first_timestamp + round(milliseconds)))
+        else:
+            self.seek(int(milliseconds * self.fps / 1000))
+
+    @property
+    def frame_count(self) -> int:
+        return self._frame_count
+
+    @property
+    def position(self) -> int:
+        """
+        Index of the next frame.
+        """
+        return self._position
+
+    def _realtime_frame(self, frame: int) -> int:
+        now = time.perf_counter() * 1000
+        timestamp = self._timestamp(frame)
+
+        if self._clock_offset is None:
+            self._clock_offset = now - timestamp
+            return frame
+
+        wait_time = timestamp - (now - self._clock_offset)
+
+        if wait_time > MAX_FRAME_WAIT_MS:
+            self._clock_offset = now - timestamp
+            return frame
+
+        if wait_time > 0:
+            time.sleep(wait_time / 1000)
+            return frame
+
+        # the pipeline is too slow, skip to the frame of the current playback time (like a camera would)
+        return max(frame, self._find_frame(now - self._clock_offset))
+
+    def _timestamp(self, frame: int) -> int:
+        if self._reader is not None:
+            return int(self._reader.index["timestamp"][frame])
+        return round(frame * 1000 / self.fps)
+
+    def _find_frame(self, timestamp: float) -> int:
+        if self._reader is not None:
+            return self._reader.find_frame(int(timestamp))
+        return min(int(timestamp * self.fps / 1000), self._frame_count - 1)
+
+    def _load(self, frame: int) -> Tuple[int, np.ndarray, np.ndarray]:
+        if self._reader is not None:
+            depth, color, record = self._reader.read(frame)
+
+            # compressed depth is decoded into a reused buffer, the pipeline may still use the previous frame
+            if record["flags"] & FLAG_DEPTH_RVL:
+                depth = depth.copy()
+
+            return int(record["timestamp"]), depth, color
+
+        # sequential frames are read without seeking, skipped frames are only grabbed (not retrieved)
+        if frame < self._capture_position or frame - self._capture_position > self.fps:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, frame)
+            self._capture_position = frame
+
+        while self._capture_position < frame:
+            self._capture.grab()
+            self._capture_position += 1
+
+        success, image = self._capture.read()
+        self._capture_position += 1
+
+        if not success:
+            raise Exception(f"Could not read frame {frame} of recording {self.path}.")
+
+        # rgb-d frames contain the encoded depth on the left and the color image on the right
+        w = image.shape[1] // 2
+        encoded = np.ascontiguousarray(image[:, :w, ::-1])
+        depth = self._codec.decode(encoded, *self._depth_range).copy()
+        return self._timestamp(frame), depth, image[:, w:]
+
+    def distance(self, x: float, y: float) -> float:
+        depth = self.depth_buffer
+        h, w = depth.shape[:2]
+        ix = min(max(int(x * w), 0), w - 1)
+        iy = min(max(int(y * h), 0), h - 1)
+        return float(depth[iy, ix]) * self.depth_units
+
+    @property
+    def depth_buffer(self) -> np.ndarray:
+        return self._current[1]
+
+    @property
+    def depth_map(self) -> np.ndarray:
+        return self._current[1]
+
+    def configure(self, args: Namespace):
+        super().configure(args)
+
+        if args.source is not None:
+            self.path = args.source
+
+        self.mode = args.playback_mode
+        self.loop = not args.no_playback_loop
+        self.start_frame = args.playback_start
+        self.codec_type = args.playback_codec
+
+    @staticmethod
+    def add_params(parser: ArgumentParser):
+        super(RecordingPlaybackInput, RecordingPlaybackInput).add_params(parser)
+
+        try:
+            add_enum_choice_argument(parser, PlaybackMode, "--playback-mode",
+                                     help="Playback timing of the recording")
+            parser.add_argument("--playback-start", type=int, default=0, help="First frame of the playback.")
+            parser.add_argument("--no-playback-loop", action="store_true", help="Stop at the end of the recording.")
+            add_enum_choice_argument(parser, DepthCodecType, "--playback-codec",
+                                     help="Depth codec of mp4 recordings", default=DepthCodecType.UniformHue)
+        except ArgumentError as ex:
+            if ex.message.startswith("conflicting"):
+                return
+            raise ex
+
+        CommonArgs.add_source_argument(parser)
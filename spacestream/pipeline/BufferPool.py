@@ -0,0 +1,143 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BufferKey = Tuple[Tuple[int, ...], str]
+
+
+@dataclass
+class _Lease:
+    array: np.ndarray
+    key: BufferKey
+    count: int
+    # buffers which are derived from this one and live as long as it (e.g. a color converted version)
+    attachments: Dict[str, np.ndarray] = field(default_factory=dict)
+
+
+class BufferPool:
+    """
+    Thread-safe pool of reference counted numpy buffers (keyed by shape and dtype). A buffer is acquired with
+    a reference count of one, every additional consumer (e.g. preview, recorder) retains it and it returns to
+    the pool when the last consumer has released it. Arrays which do not belong to the pool are ignored by
+    retain and release, so consumers do not have to know where a frame comes from.
+    """
+
+    def __init__(self, max_free_per_key: int = 8):
+        self.max_free_per_key = max_free_per_key
+
+        self._free: Dict[BufferKey, List[np.ndarray]] = {}
+        self._leases: Dict[int, _Lease] = {}
+        self._lock = threading.Lock()
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.high_water = 0
+
+    def acquire(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        key = (tuple(shape), np.dtype(dtype).str)
+
+        with self._lock:
+            free = self._free.get(key)
+
+            if free:
+                array = free.pop()
+                self.hits += 1
+            else:
+                array = np.empty(shape, dtype=dtype)
+                self.misses += 1
+
+            self._leases[id(array)] = _Lease(array, key, 1)
+            self.high_water = max(self.high_water, len(self._leases))
+
+        return array
+
+    def retain(self, array: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        if array is None:
+            return array
+
+        with self._lock:
+            lease = self._lease(array)
+            if lease is not None:
+                lease.count += 1
+
+        return array
+
+    def release(self, array: Optional[np.ndarray]):
+        if array is None:
+            return
+
+        with self._lock:
+            self._release(array)
+
+    def attach(self, parent: np.ndarray, name: str, array: np.ndarray) -> np.ndarray:
+        """
+        Attaches a pooled buffer to a leased parent buffer, it is released together with the parent.
+        If there is already an attachment with this name, the new buffer is released and the existing one returned.
+        """
+        with self._lock:
+            lease = self._lease(parent)
+            if lease is None:
+                return array
+
+            existing = lease.attachments.get(name)
+            if existing is not None:
+                self._release(array)
+                return existing
+
+            lease.attachments[name] = array
+            return array
+
+    def attachment(self, parent: np.ndarray, name: str) -> Optional[np.ndarray]:
+        with self._lock:
+            lease = self._lease(parent)
+            return None if lease is None else lease.attachments.get(name)
+
+    def owns(self, array: np.ndarray) -> bool:
+        with self._lock:
+            return self._lease(array) is not None
+
+    def clear(self):
+        """
+        Removes all free buffers, leased buffers are not affected.
+        """
+        with self._lock:
+            self._free.clear()
+
+    def _lease(self, array: np.ndarray) -> Optional[_Lease]:
+        lease = self._leases.get(id(array))
+        if lease is None or lease.array is not array:
+            return None
+        return lease
+
+    def _release(self, array: np.ndarray):
+        lease = self._lease(array)
+        if lease is None:
+            return
+
+        lease.count -= 1
+        if lease.count > 0:
+            return
+
+        del self._leases[id(array)]
+
+        for attachment in lease.attachments.values():
+            self._release(attachment)
+
+        free = self._free.setdefault(lease.key, [])
+        if len(free) < self.max_free_per_key:
+            free.append(array)
+
+    @property
+    def in_use(self) -> int:
+        return len(self._leases)
+
+    @property
+    def free(self) -> int:
+        return sum(len(f) for f in self._free.values())
+
+    def __str__(self):
+        return f"{self.in_use} used / {self.free} free / {self.high_water} max " \
+               f"({self.hits} hits, {self.misses} misses)"
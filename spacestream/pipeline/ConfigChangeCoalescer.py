@@ -0,0 +1,85 @@
+import logging
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from duit.model.DataField import DataField
+
+
+class ConfigChangeCoalescer:
+    """
+    Decouples the change events of the settings (ui and osc, any thread) from the graph. Changes are collected
+    and the handler of a field is called with the latest value only, when the graph applies the changes at
+    the frame boundary. Handlers with a debounce interval (e.g. camera writes) are called at most once per
+    interval. Changes which are replaced by a newer value before they have been applied are counted as folded.
+    """
+
+    def __init__(self):
+        # handler and debounce interval (seconds) of the subscriptions
+        self._handlers: List[Tuple[Callable[[Any], None], float]] = []
+        self._last_applied: List[float] = []
+
+        # latest value of the subscriptions with pending changes (in order of the first change)
+        self._pending: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+        self.received = 0
+        self.applied = 0
+        self.folded = 0
+
+    def subscribe(self, field: DataField, handler: Callable[[Any], None], debounce: float = 0.0,
+                  ignore: Optional[Callable[[], bool]] = None):
+        """
+        Calls the handler with the latest value of the field when the changes are applied. Changes are
+        dropped while ignore returns true (evaluated when the change happens, e.g. while settings are loaded).
+        """
+        index = len(self._handlers)
+        self._handlers.append((handler, debounce))
+        self._last_applied.append(-math.inf)
+
+        def _on_changed(value: Any):
+            if ignore is not None and ignore():
+                return
+            self._submit(index, value)
+
+        field.on_changed += _on_changed
+
+    def apply(self) -> int:
+        """
+        Calls the handlers of the pending changes on the caller thread and returns the number of calls.
+        """
+        if not self._pending:
+            return 0
+
+        now = time.perf_counter()
+        with self._lock:
+            ready = [(index, value) for index, value in self._pending.items()
+                     if now - self._last_applied[index] >= self._handlers[index][1]]
+
+            for index, _ in ready:
+                del self._pending[index]
+                self._last_applied[index] = now
+
+        for index, value in ready:
+            try:
+                self._handlers[index][0](value)
+            except Exception as ex:
+                logging.warning(f"Could not apply setting change ({value}): {ex}")
+
+        self.applied += len(ready)
+        return len(ready)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _submit(self, index: int, value: Any):
+        with self._lock:
+            self.received += 1
+            if index in self._pending:
+                self.folded += 1
+            self._pending[index] = value
+
+    def __str__(self):
+        return f"{self.applied} applied / {self.folded} folded"
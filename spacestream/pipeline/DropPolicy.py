@@ -0,0 +1,10 @@
+from enum import Enum
+
+
+class DropPolicy(Enum):
+    # producer waits until the consumer has taken a frame
+    Block = "block"
+    # oldest queued frame is replaced by the new one (lowest latency)
+    DropOldest = "drop-oldest"
+    # new frame is discarded if the queue is full
+    DropNewest = "drop-newest"
@@ -0,0 +1,57 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from spacestream.io.NDIDepthFormat import NDIDepthFormat
+
+# depth in the luma plane for ndi (frame data, width, height, format)
+PackedFrame = Tuple[np.ndarray, int, int, NDIDepthFormat]
+
+
+@dataclass
+class FramePacket:
+    """
+    State of a single frame while it travels through the pipeline stages (capture, encode, output).
+    """
+    # time of capture (time.perf_counter) and timestamp of the input
+    timestamp: float
+    input_timestamp: int
+    frame: np.ndarray
+
+    # raw depth (np.ndarray or rs.depth_frame) and encoding range in depth units
+    depth: Optional[Any] = None
+    min_value: int = 0
+    max_value: int = 0
+
+    # union of the segmentation masks at frame size (see SegmentationMask), None if the frame is not masked
+    mask: Optional[Any] = None
+
+    # unprocessed depth and color frames for raw recordings
+    raw_depth: Optional[np.ndarray] = None
+    raw_frame: Optional[np.ndarray] = None
+
+    # results of the encode stage
+    rgbd: Optional[np.ndarray] = None
+    packed_frame: Optional[PackedFrame] = None
+
+    # pooled buffers which are released when the packet has been sent
+    buffers: List[np.ndarray] = field(default_factory=list)
+
+    # compiled decisions of the graph the packet has been captured with (see FramePlan)
+    plan: Optional[Any] = None
+
+    # processing time of the stages in ms (see StageTracer)
+    trace: Dict[str, float] = field(default_factory=dict)
+
+    # packet has been sent (dropped packets are not traced)
+    completed: bool = False
+
+    def stamp(self, stage: str, start: float) -> float:
+        """
+        Adds the time since start to the stage and returns the current time (start of the next stage).
+        """
+        now = time.perf_counter()
+        self.trace[stage] = self.trace.get(stage, 0.0) + (now - start) * 1000
+        return now
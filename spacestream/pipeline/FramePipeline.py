@@ -0,0 +1,99 @@
+import time
+from typing import Callable, List, Optional
+
+from spacestream.pipeline.DropPolicy import DropPolicy
+from spacestream.pipeline.FramePacket import FramePacket
+from spacestream.pipeline.RingBuffer import RingBuffer
+from spacestream.pipeline.StageStatistics import StageStatistics
+from spacestream.pipeline.StageWorker import StageWorker
+
+
+class FramePipeline:
+    """
+    Pipelined execution of the graph: the capture stage runs on the graph thread and submits packets,
+    encoding (and composition) and the output (recording, preview, sending) run on their own workers.
+    The stages are connected by bounded ring buffers, so the throughput is limited by the slowest stage
+    instead of the sum of all stages.
+
+    If the frame buffer sharing has to stay on the graph thread (spout / syphon on the main thread), the output
+    stage passes its packets into a send buffer, from which the graph thread takes the latest one. The send
+    buffer always drops the older packets (a blocking send buffer could dead-lock the graph thread, which
+    also submits the packets), they have been output but not sent and are counted as skipped, not dropped.
+
+    Packets which are dropped or finished (not passed on) are handed to release.
+    """
+
+    def __init__(self, encode: Callable[[FramePacket], Optional[FramePacket]],
+                 output: Callable[[FramePacket], Optional[FramePacket]],
+                 capacity: int = 2, policy: DropPolicy = DropPolicy.DropOldest,
+                 send_on_caller: bool = False,
+                 release: Optional[Callable[[FramePacket], None]] = None):
+        self.capacity = capacity
+        self.policy = policy
+        self.send_on_caller = send_on_caller
+
+        self.encode_buffer: RingBuffer[FramePacket] = RingBuffer(capacity, policy, release)
+        self.output_buffer: RingBuffer[FramePacket] = RingBuffer(capacity, policy, release)
+        self.send_buffer: Optional[RingBuffer[FramePacket]] = None
+
+        if send_on_caller:
+            # the sender only needs the latest frame and must never stall the output stage
+            self.send_buffer = RingBuffer(capacity, DropPolicy.DropOldest, release)
+
+        self.capture_statistics = StageStatistics("capture")
+        self.send_statistics = StageStatistics("send")
+
+        self.workers: List[StageWorker] = [
+            StageWorker("encode", encode, self.encode_buffer, self.output_buffer, release),
+            StageWorker("output", output, self.output_buffer, self.send_buffer, release),
+        ]
+
+    @property
+    def buffers(self) -> List[RingBuffer[FramePacket]]:
+        return [b for b in (self.encode_buffer, self.output_buffer, self.send_buffer) if b is not None]
+
+    @property
+    def statistics(self) -> List[StageStatistics]:
+        stats = [self.capture_statistics] + [w.statistics for w in self.workers]
+        if self.send_on_caller:
+            stats.append(self.send_statistics)
+        return stats
+
+    @property
+    def dropped(self) -> int:
+        """
+        Packets dropped by the stage buffers according to the drop policy.
+        """
+        return self.encode_buffer.dropped + self.output_buffer.dropped
+
+    @property
+    def skipped(self) -> int:
+        """
+        Packets which have been output (recorded, previewed) but not sent, because a newer one was ready.
+        """
+        return self.send_buffer.dropped if self.send_buffer is not None else 0
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        for buffer in self.buffers:
+            buffer.close()
+
+        for worker in self.workers:
+            worker.stop()
+
+        # release packets which have not been processed
+        for buffer in self.buffers:
+            buffer.clear()
+
+    def submit(self, packet: FramePacket) -> bool:
+        elapsed = (time.perf_counter() - packet.timestamp) * 1000
+        self.capture_statistics.add(elapsed, elapsed)
+        return self.encode_buffer.push(packet)
+
+    def latest_output(self) -> Optional[FramePacket]:
+        if self.send_buffer is None:
+            return None
+        return self.send_buffer.pop_latest()
@@ -0,0 +1,60 @@
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from visiongraph import vg
+
+from spacestream.codec.DepthCodec import DepthCodec
+from spacestream.io.NDIDepthFormat import NDIDepthFormat
+from spacestream.pipeline.FramePacket import FramePacket
+
+
+@dataclass
+class FramePlan:
+    """
+    Decisions of the graph which only change with the settings or the input resolution. The plan is compiled
+    by the graph when a setting has changed and executed for every frame as a flat list of capture steps.
+    Packets keep the plan they have been captured with, so the encode stage uses the same decisions even if
+    a new plan has been compiled in the meantime (pipelined mode).
+    """
+    # frame size (w, h) of the input
+    resolution: Tuple[int, int]
+
+    # capture steps after the input has been read (masking, depth, rectification)
+    steps: List[Callable[[FramePacket], None]] = field(default_factory=list)
+
+    # depth encoding, range in depth units
+    depth_codec: Optional[DepthCodec] = None
+    depth_units: float = 0.001
+    min_value: int = 0
+    max_value: int = 0
+
+    masking: bool = False
+
+    # intrinsics of the depth map for the rectification (color if the depth is aligned to the color image)
+    depth_stream_type: vg.CameraStreamType = vg.CameraStreamType.Color
+
+    # size (w, h) of the rectified depth and color images
+    output_size: Optional[Tuple[int, int]] = None
+    median_filter: bool = False
+
+    # lookup table of the fused encoder (None if the fused encoder is not used)
+    color_table: Optional[np.ndarray] = None
+
+    # depth is encoded straight into the output frame (if the frame is not masked)
+    direct_encode: bool = False
+
+    # depth is packed into the ndi frame and the rgb-d frame is only composed for the preview and the recording
+    packed_format: Optional[NDIDepthFormat] = None
+    compose: bool = True
+
+    record_raw: bool = False
+
+    # depth of the input is copied into a pooled buffer (pipelined mode, the color frame by a step)
+    copy_depth: bool = False
+
+    def run(self, packet: FramePacket) -> FramePacket:
+        packet.plan = self
+        for step in self.steps:
+            step(packet)
+        return packet
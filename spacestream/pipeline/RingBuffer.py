@@ -0,0 +1,139 @@
+import threading
+from typing import Callable, Generic, List, Optional, TypeVar
+
+from spacestream.pipeline.DropPolicy import DropPolicy
+
+T = TypeVar("T")
+
+
+class RingBuffer(Generic[T]):
+    """
+    Bounded single-producer / single-consumer queue between two pipeline stages. The slots are preallocated and
+    reused, the drop policy decides what happens if the producer is faster than the consumer.
+
+    Dropped items are handed to on_drop (e.g. to release their buffers).
+    """
+
+    def __init__(self, capacity: int = 2, policy: DropPolicy = DropPolicy.DropOldest,
+                 on_drop: Optional[Callable[[T], None]] = None):
+        if capacity < 1:
+            raise ValueError("Capacity of ring buffer has to be at least 1.")
+
+        self.capacity = capacity
+        self.policy = policy
+        self.on_drop = on_drop
+
+        self._slots: List[Optional[T]] = [None] * capacity
+        self._head = 0
+        self._size = 0
+        self._closed = False
+
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+        # statistics
+        self.pushed = 0
+        self.popped = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def push(self, item: T, timeout: Optional[float] = None) -> bool:
+        """
+        Adds an item to the buffer, returns False if the item (not an older one) has been dropped.
+        """
+        dropped: Optional[T] = None
+        accepted = True
+
+        with self._lock:
+            if self._size == self.capacity and not self._closed:
+                if self.policy == DropPolicy.Block:
+                    self._not_full.wait_for(lambda: self._size < self.capacity or self._closed, timeout)
+                elif self.policy == DropPolicy.DropOldest:
+                    dropped = self._take()
+
+            if self._closed or self._size == self.capacity:
+                dropped = item
+                accepted = False
+            else:
+                self._slots[(self._head + self._size) % self.capacity] = item
+                self._size += 1
+                self.pushed += 1
+                self.high_water = max(self.high_water, self._size)
+                self._not_empty.notify()
+
+            if dropped is not None:
+                self.dropped += 1
+
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+        return accepted
+
+    def pop(self, timeout: Optional[float] = None) -> Optional[T]:
+        """
+        Returns the oldest item or None if the buffer is still empty after the timeout or has been closed.
+        """
+        with self._lock:
+            if self._size == 0 and not self._not_empty.wait_for(lambda: self._size > 0 or self._closed, timeout):
+                return None
+
+            if self._size == 0:
+                return None
+
+            item = self._take()
+            self.popped += 1
+            self._not_full.notify()
+            return item
+
+    def pop_latest(self) -> Optional[T]:
+        """
+        Returns the newest item without waiting, all older items are dropped.
+        """
+        with self._lock:
+            items = [self._take() for _ in range(self._size)]
+            self._not_full.notify()
+
+            if len(items) == 0:
+                return None
+
+            self.popped += 1
+            self.dropped += len(items) - 1
+
+        if self.on_drop is not None:
+            for item in items[:-1]:
+                self.on_drop(item)
+
+        return items[-1]
+
+    def clear(self):
+        with self._lock:
+            items = [self._take() for _ in range(self._size)]
+            self._not_full.notify()
+
+        if self.on_drop is not None:
+            for item in items:
+                self.on_drop(item)
+
+    def close(self):
+        """
+        Wakes up waiting producers and consumers, items which are still queued can be popped.
+        """
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _take(self) -> T:
+        item = self._slots[self._head]
+        self._slots[self._head] = None
+        self._head = (self._head + 1) % self.capacity
+        self._size -= 1
+        return item
@@ -0,0 +1,42 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+class RollingLatency:
+    """
+    Rolling window of the last samples (in milliseconds) of a stage, the percentiles are only calculated
+    when they are requested. The sum and count of all samples are kept as well (prometheus summary).
+    """
+
+    def __init__(self, window: int = 300):
+        self.window = window
+
+        self._samples = np.zeros(window, dtype=np.float64)
+        self._index = 0
+        self._count = 0
+
+        self.total = 0.0
+        self.total_count = 0
+
+    def add(self, value: float):
+        self._samples[self._index] = value
+        self._index = (self._index + 1) % self.window
+        self._count = min(self._count + 1, self.window)
+
+        self.total += value
+        self.total_count += 1
+
+    def percentiles(self, q: Sequence[float] = (50, 95, 99)) -> Tuple[float, ...]:
+        if self._count == 0:
+            return tuple(0.0 for _ in q)
+        return tuple(np.percentile(self._samples[:self._count], q).tolist())
+
+    def reset(self):
+        self._index = 0
+        self._count = 0
+        self.total = 0.0
+        self.total_count = 0
+
+    def __len__(self) -> int:
+        return self._count
@@ -0,0 +1,13 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class SegmentationMask:
+    """
+    Union of the segmentation masks of a frame (0: masked, 255: visible). The single channel mask is used by
+    the kernels as validity flag, the color mask masks bgr images with a single bitwise and (no allocation).
+    """
+    mask: np.ndarray
+    color_mask: np.ndarray
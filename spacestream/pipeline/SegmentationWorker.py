@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from visiongraph import vg
+
+from spacestream.pipeline.SegmentationMask import SegmentationMask
+
+
+class SegmentationWorker:
+    """
+    Runs the segmentation network either inline (synchronous) or on its own thread at the rate of the model
+    (asynchronous). Frames are segmented at the inference size (longest side) and only every nth frame
+    (cadence), the frames in between reuse the latest masks. In asynchronous mode only the latest submitted
+    frame is segmented (frames are skipped while the network is busy), so the stream keeps the camera rate.
+    The segmentation results are merged into one union mask at the inference size, which is scaled to the
+    frame size only once per result.
+
+    Masks which are older than max_age (ms) are not applied. Optionally the masks are warped to the current
+    frame with the optical flow between the segmented and the current frame (at the inference size).
+    """
+
+    def __init__(self, network: vg.InstanceSegmentationEstimator, cadence: int = 1, inference_size: int = 0,
+                 max_age: float = 500.0, warp: bool = False, poll_timeout: float = 0.1):
+        self.network = network
+        self.cadence = cadence
+        self.inference_size = inference_size
+        self.max_age = max_age
+        self.warp = warp
+        self.poll_timeout = poll_timeout
+
+        # running average of the inference time and age of the last applied masks (ms)
+        self.inference_time = 0.0
+        self.age = 0.0
+        self.segmented = 0
+
+        self._frame_index = 0
+
+        # latest frame to segment and latest result (timestamp, union mask, gray image for the optical flow)
+        self._request: Optional[Tuple[float, np.ndarray]] = None
+        self._result: Optional[Tuple[float, Optional[np.ndarray], Optional[np.ndarray]]] = None
+        self._condition = threading.Condition()
+
+        # mask of the latest result scaled to the frame size
+        self._scaled: Optional[Tuple[tuple, Tuple[int, int], SegmentationMask]] = None
+        self._optical_flow: Optional[cv2.DISOpticalFlow] = None
+
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="SpaceStream-Segmentation", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 1.0):
+        self._running = False
+
+        with self._condition:
+            self._request = None
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, frame: np.ndarray, timestamp: float):
+        """
+        Segments the frame (inline or on the worker) if it is due according to the cadence.
+        """
+        index = self._frame_index
+        self._frame_index += 1
+
+        if index % max(1, self.cadence) != 0:
+            return
+
+        image = self._inference_image(frame)
+
+        if not self.is_running:
+            self._segment(timestamp, image)
+            return
+
+        # the input may reuse its frame buffer
+        if image is frame:
+            image = frame.copy()
+
+        with self._condition:
+            self._request = (timestamp, image)
+            self._condition.notify()
+
+    def latest(self, frame: np.ndarray, timestamp: float) -> Optional[SegmentationMask]:
+        """
+        Returns the latest union mask at the frame size (None if nothing has been segmented or the mask
+        is older than max_age).
+        """
+        result = self._result
+        if result is None:
+            return None
+
+        result_timestamp, mask, gray = result
+        self.age = (timestamp - result_timestamp) * 1000
+
+        if self.age > self.max_age or mask is None:
+            return None
+
+        h, w = frame.shape[:2]
+
+        if self.warp and gray is not None and self.age > 0:
+            return self._scale(self._warp(mask, gray, frame), (w, h))
+
+        scaled = self._scaled
+        if scaled is not None and scaled[0] is result and scaled[1] == (w, h):
+            return scaled[2]
+
+        segmentation_mask = self._scale(mask, (w, h))
+        self._scaled = (result, (w, h), segmentation_mask)
+        return segmentation_mask
+
+    def _loop(self):
+        while self._running:
+            with self._condition:
+                if self._request is None:
+                    self._condition.wait(self.poll_timeout)
+
+                request = self._request
+                self._request = None
+
+            if request is None:
+                continue
+
+            try:
+                self._segment(*request)
+            except Exception as ex:
+                logging.exception(f"Segmentation failed: {ex}")
+
+    def _segment(self, timestamp: float, image: np.ndarray):
+        start = time.perf_counter()
+        segmentations = self.network.process(image)
+        mask = self._union(segmentations)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if self.warp else None
+        elapsed = (time.perf_counter() - start) * 1000
+
+        self.inference_time = elapsed if self.segmented == 0 else self.inference_time * 0.9 + elapsed * 0.1
+        self.segmented += 1
+
+        # results are replaced, not modified, so the readers do not need a lock
+        self._result = (timestamp, mask, gray)
+
+    def _inference_image(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        longest_side = max(w, h)
+
+        if self.inference_size <= 0 or longest_side <= self.inference_size:
+            return frame
+
+        scale = self.inference_size / longest_side
+        return cv2.resize(frame, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+
+    def _warp(self, mask: np.ndarray, gray: np.ndarray, frame: np.ndarray) -> np.ndarray:
+        if self._optical_flow is None:
+            self._optical_flow = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_ULTRAFAST)
+
+        h, w = gray.shape[:2]
+        current = cv2.cvtColor(self._inference_image(frame), cv2.COLOR_BGR2GRAY)
+        if current.shape != gray.shape:
+            current = cv2.resize(current, (w, h), interpolation=cv2.INTER_AREA)
+
+        # flow from the current to the segmented frame, every pixel looks up its mask value in the segmented frame
+        flow = self._optical_flow.calc(current, gray, None)
+        flow[:, :, 0] += np.arange(w, dtype=np.float32)
+        flow[:, :, 1] += np.arange(h, dtype=np.float32)[:, np.newaxis]
+
+        if mask.shape != gray.shape:
+            mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
+        return cv2.remap(mask, flow, None, cv2.INTER_NEAREST)
+
+    @staticmethod
+    def _union(segmentations: List[vg.InstanceSegmentationResult]) -> Optional[np.ndarray]:
+        if len(segmentations) == 0:
+            return None
+
+        mask = cv2.compare(segmentations[0].mask, 0, cv2.CMP_GT)
+        for segmentation in segmentations[1:]:
+            cv2.bitwise_or(mask, cv2.compare(segmentation.mask, 0, cv2.CMP_GT), dst=mask)
+        return mask
+
+    @staticmethod
+    def _scale(mask: np.ndarray, size: Tuple[int, int]) -> SegmentationMask:
+        if mask.shape[1::-1] != size:
+            mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+        return SegmentationMask(mask, cv2.merge((mask, mask, mask)))
+
+    def __str__(self):
+        return f"{self.age:.0f} ms age / {self.inference_time:.1f} ms inference"
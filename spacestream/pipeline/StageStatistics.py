@@ -0,0 +1,31 @@
+class StageStatistics:
+    """
+    Running averages (exponential moving average) of the processing time of a stage and of the latency
+    between frame capture and the end of the stage, both in milliseconds.
+    """
+
+    def __init__(self, name: str, smoothing: float = 0.1):
+        self.name = name
+        self.smoothing = smoothing
+
+        self.frames = 0
+        self.processing_time = 0.0
+        self.latency = 0.0
+
+    def add(self, processing_time: float, latency: float):
+        if self.frames == 0:
+            self.processing_time = processing_time
+            self.latency = latency
+        else:
+            self.processing_time += (processing_time - self.processing_time) * self.smoothing
+            self.latency += (latency - self.latency) * self.smoothing
+
+        self.frames += 1
+
+    def reset(self):
+        self.frames = 0
+        self.processing_time = 0.0
+        self.latency = 0.0
+
+    def __str__(self):
+        return f"{self.name} {self.processing_time:.1f} ms"
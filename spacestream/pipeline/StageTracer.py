@@ -0,0 +1,107 @@
+import csv
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Sequence, TextIO, Tuple, Union
+
+from spacestream.pipeline.FramePacket import FramePacket
+from spacestream.pipeline.RollingLatency import RollingLatency
+
+
+class StageTracer:
+    """
+    Collects the stage times of every finished frame (FramePacket.trace) in rolling windows to provide
+    p50 / p95 / p99 per stage. Frames can finish on different threads (pipelined mode), so adding is locked.
+
+    If a trace file is opened, the trace of every frame is written as a row (csv) or an object per line (jsonl).
+    """
+
+    def __init__(self, stages: Sequence[str], window: int = 300):
+        self.stages = list(stages)
+        self.latencies: Dict[str, RollingLatency] = {stage: RollingLatency(window) for stage in self.stages}
+        self.frames = 0
+
+        self._lock = threading.Lock()
+        self._file: Optional[TextIO] = None
+        self._csv_writer: Optional[csv.writer] = None
+
+    def add(self, packet: FramePacket):
+        if len(packet.trace) == 0:
+            return
+
+        with self._lock:
+            for stage, value in packet.trace.items():
+                latency = self.latencies.get(stage)
+                if latency is not None:
+                    latency.add(value)
+
+            if self._file is not None:
+                self._write(packet)
+
+            self.frames += 1
+
+    def add_sample(self, stage: str, value: float):
+        """
+        Adds the time of a stage which is not part of a packet (e.g. sending on the ui thread).
+        """
+        with self._lock:
+            self.latencies[stage].add(value)
+
+    def percentiles(self, stage: str) -> Tuple[float, float, float]:
+        with self._lock:
+            return self.latencies[stage].percentiles()
+
+    def totals(self, stage: str) -> Tuple[float, int]:
+        """
+        Sum (ms) and count of all samples of a stage since the last reset.
+        """
+        with self._lock:
+            latency = self.latencies[stage]
+            return latency.total, latency.total_count
+
+    def open(self, path: Union[str, Path]):
+        path = Path(path)
+
+        with self._lock:
+            self._close()
+
+            file = open(path, "w", newline="")
+
+            csv_writer = None
+            if path.suffix.lower() == ".csv":
+                csv_writer = csv.writer(file)
+                csv_writer.writerow(["frame", "timestamp"] + self.stages)
+
+            # the file is published after its writer, add() checks the file only
+            self._csv_writer = csv_writer
+            self._file = file
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+
+        self._file = None
+        self._csv_writer = None
+
+    def reset(self):
+        with self._lock:
+            for latency in self.latencies.values():
+                latency.reset()
+            self.frames = 0
+
+    def _write(self, packet: FramePacket):
+        if self._csv_writer is not None:
+            values = [_format(packet.trace.get(stage)) for stage in self.stages]
+            self._csv_writer.writerow([self.frames, packet.input_timestamp] + values)
+        else:
+            data = {"frame": self.frames, "timestamp": packet.input_timestamp}
+            data.update(packet.trace)
+            self._file.write(json.dumps(data) + "\n")
+
+
+def _format(value: Optional[float]) -> str:
+    return "" if value is None else f"{value:.3f}"
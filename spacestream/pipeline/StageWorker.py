@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from spacestream.pipeline.FramePacket import FramePacket
+from spacestream.pipeline.RingBuffer import RingBuffer
+from spacestream.pipeline.StageStatistics import StageStatistics
+
+
+class StageWorker:
+    """
+    Runs one pipeline stage on its own thread. Packets are taken from the input buffer, processed and handed
+    to the output buffer (if there is one). If the stage function returns None, the packet is not passed on
+    and handed to on_done (e.g. to release its buffers).
+    """
+
+    def __init__(self, name: str, stage: Callable[[FramePacket], Optional[FramePacket]],
+                 input_buffer: RingBuffer[FramePacket], output_buffer: Optional[RingBuffer[FramePacket]] = None,
+                 on_done: Optional[Callable[[FramePacket], None]] = None,
+                 poll_timeout: float = 0.1):
+        self.name = name
+        self.stage = stage
+        self.input_buffer = input_buffer
+        self.output_buffer = output_buffer
+        self.on_done = on_done
+        self.poll_timeout = poll_timeout
+
+        self.statistics = StageStatistics(name)
+
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name=f"SpaceStream-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 1.0):
+        self._running = False
+        self.input_buffer.close()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _loop(self):
+        while self._running:
+            packet = self.input_buffer.pop(self.poll_timeout)
+
+            if packet is None:
+                if self.input_buffer.closed:
+                    break
+                continue
+
+            start = time.perf_counter()
+            try:
+                result = self.stage(packet)
+            except Exception as ex:
+                logging.exception(f"Pipeline stage {self.name} failed: {ex}")
+                self._done(packet)
+                continue
+            end = time.perf_counter()
+
+            self.statistics.add((end - start) * 1000, (end - packet.timestamp) * 1000)
+
+            # blocks only if the output uses the block policy (until the consumer continues or is closed)
+            if result is not None and self.output_buffer is not None:
+                self.output_buffer.push(result)
+            else:
+                self._done(packet)
+
+    def _done(self, packet: FramePacket):
+        if self.on_done is not None:
+            self.on_done(packet)
@@ -1,7 +1,8 @@
 import logging
 import signal
 import traceback
-from typing import Sequence
+import time
+from typing import Optional, Sequence
 
 import cv2
 import numpy as np
@@ -9,12 +10,12 @@ import open3d as o3d
 import pyrealsense2 as rs
 from open3d.visualization import gui
 from visiongraph import vg
-from visiongraph_ndi.NDIVideoOutput import NDIVideoOutput
 from visiongui.ui.VisiongraphUserInterface import VisiongraphUserInterface
 
 from spacestream.SpaceStreamApp import SpaceStreamApp
 from spacestream.SpaceStreamConfig import SpaceStreamConfig
 from spacestream.WatchDog import HealthStatus, WatchDog
+from spacestream.pipeline.FramePacket import PackedFrame
 
 
 class MainWindow(VisiongraphUserInterface[SpaceStreamApp, SpaceStreamConfig]):
@@ -173,13 +174,17 @@ class MainWindow(VisiongraphUserInterface[SpaceStreamApp, SpaceStreamConfig]):
 
         return container
 
-    def on_frame_ready(self, frame: np.ndarray):
+    def on_frame_ready(self, frame: np.ndarray, packed_frame: Optional[PackedFrame] = None):
         self.watch_dog.reset()
 
         if self.config.disable_preview.value:
             return
 
-        bgrd = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        # keep the frame (and its swapped version) and the packed frame until they have been sent by the gui thread
+        packed_data = packed_frame[0] if packed_frame is not None else None
+        self.graph.buffer_pool.retain(frame)
+        self.graph.buffer_pool.retain(packed_data)
+        bgrd = self.graph.composer.swapped(frame)
         preview_image = bgrd
 
         if self.config.display_vertical_stack.value:
@@ -208,10 +213,11 @@ class MainWindow(VisiongraphUserInterface[SpaceStreamApp, SpaceStreamConfig]):
 
         def update():
             # send stream
-            if isinstance(self.graph.fbs_client, NDIVideoOutput):
-                self.graph.fbs_client.send(frame)
-            else:
-                self.graph.fbs_client.send(bgrd)
+            start = time.perf_counter()
+            self.graph.send_output(frame, bgrd, packed_frame)
+            self.graph.tracer.add_sample("send", (time.perf_counter() - start) * 1000)
+            self.graph.buffer_pool.release(frame)
+            self.graph.buffer_pool.release(packed_data)
 
             # update image
             self.image_view.update_image(image)